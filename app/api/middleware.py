@@ -0,0 +1,71 @@
+"""
+ASGI middleware for the Messenger API.
+
+Written as plain ASGI rather than BaseHTTPMiddleware so streamed request
+and response bodies (e.g. POST /api/messages/bulk) pass through untouched.
+"""
+import time
+
+from app.db.metrics import metrics, track_queries
+
+
+class MetricsMiddleware:
+    """Records latency and 5xx errors per route in the metrics registry."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; label by its
+            # template so path parameters do not create new series
+            route = scope.get("route")
+            metrics.requests.observe(
+                (scope["method"], getattr(route, "path", "unmatched")),
+                time.perf_counter() - start,
+                status_code >= 500
+            )
+
+
+class QueryStatsMiddleware:
+    """
+    Reports the storage round trips and DB time of each request in the
+    X-DB-Queries and X-DB-Time-ms response headers.
+
+    Headers are sent before a streamed body, so for streaming responses they
+    only cover the work done up to the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-queries", str(stats.queries).encode()))
+                    headers.append((b"x-db-time-ms", f"{stats.db_time_ms:.2f}".encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,32 @@
+"""
+JSON responses that skip FastAPI's response_model validation and encoder.
+
+For payloads built from trusted storage rows, such as message pages. Uses
+orjson when it is installed and pydantic-core's serializer otherwise; both
+encode datetimes the same way pydantic does.
+"""
+from typing import Any
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    from pydantic_core import to_json
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain dicts, lists and scalars (including datetimes) to JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return to_json(content)
+
+
+class FastJSONResponse(Response):
+    """A JSONResponse that serializes with dumps()."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,2 +1,4 @@
 from app.api.routes.message_routes import router as message_router
-from app.api.routes.conversation_routes import router as conversation_router 
\ No newline at end of file
+from app.api.routes.conversation_routes import router as conversation_router 
+from app.api.routes.push_routes import router as push_router
+from app.api.routes.sync_routes import router as sync_router
@@ -11,8 +11,8 @@ router = APIRouter(prefix="/api/conversations", tags=["Conversations"])
 @router.get("/user/{user_id}", response_model=PaginatedConversationResponse)
 async def get_user_conversations(
     user_id: int = Path(..., description="ID of the user"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of conversations per page"),
+    page: int = Query(1, ge=1, description="Page number"),
+    limit: int = Query(20, ge=1, le=500, description="Number of conversations per page"),
     conversation_controller: ConversationController = Depends()
 ) -> PaginatedConversationResponse:
     """
@@ -32,4 +32,15 @@ async def get_conversation(
     """
     Get a specific conversation by ID
     """
-    return await conversation_controller.get_conversation(conversation_id=conversation_id) 
\ No newline at end of file
+    return await conversation_controller.get_conversation(conversation_id=conversation_id)
+
+@router.post("/{conversation_id}/read", status_code=204)
+async def mark_conversation_read(
+    conversation_id: int = Path(..., description="ID of the conversation"),
+    user_id: int = Query(..., description="ID of the user who read the conversation"),
+    conversation_controller: ConversationController = Depends()
+) -> None:
+    """
+    Mark every message in a conversation as read for a user
+    """
+    await conversation_controller.mark_read(conversation_id=conversation_id, user_id=user_id) 
\ No newline at end of file
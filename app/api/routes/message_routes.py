@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, Query, Path, Body
+from fastapi import APIRouter, Depends, Query, Path, Body, Request, Header, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional
 from datetime import datetime
 
@@ -11,6 +12,18 @@ from app.schemas.message import (
 
 router = APIRouter(prefix="/api/messages", tags=["Messages"])
 
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose content iterator consumes the request body itself.
+
+    The base class also calls receive() to watch for a disconnect, which would
+    race the iterator for request body chunks. request.stream() already raises
+    ClientDisconnect when the client goes away, so only the response is streamed.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+
 @router.post("/", response_model=MessageResponse, status_code=201)
 async def send_message(
     message: MessageCreate = Body(...),
@@ -21,28 +34,66 @@ async def send_message(
     """
     return await message_controller.send_message(message)
 
+@router.post("/bulk", status_code=200, response_class=RequestStreamingResponse)
+async def bulk_send_messages(
+    request: Request,
+    message_controller: MessageController = Depends()
+) -> RequestStreamingResponse:
+    """
+    Send many messages from a streamed NDJSON body (one MessageCreate per line).
+    Streams back one NDJSON result per input line.
+    """
+    return RequestStreamingResponse(
+        message_controller.bulk_send_messages(request.stream()),
+        media_type="application/x-ndjson"
+    )
+
 @router.get("/conversation/{conversation_id}", response_model=PaginatedMessageResponse)
 async def get_conversation_messages(
+    response: Response,
     conversation_id: int = Path(..., description="ID of the conversation"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of messages per page"),
+    page: int = Query(1, ge=1, description="Page number (ignored when a cursor is given)"),
+    limit: int = Query(20, ge=1, le=500, description="Number of messages per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
+    if_none_match: Optional[str] = Header(None, description="ETag of a cached copy of this page"),
     message_controller: MessageController = Depends()
 ) -> PaginatedMessageResponse:
     """
-    Get all messages in a conversation with pagination
+    Get all messages in a conversation with pagination.
+    Answers 304 Not Modified when If-None-Match holds the page's current ETag.
     """
     return await message_controller.get_conversation_messages(
         conversation_id=conversation_id,
         page=page,
-        limit=limit
+        limit=limit,
+        cursor=cursor,
+        if_none_match=if_none_match,
+        response=response
+    )
+
+@router.get("/conversation/{conversation_id}/export", status_code=200, response_class=StreamingResponse)
+async def export_conversation_messages(
+    conversation_id: int = Path(..., description="ID of the conversation"),
+    message_controller: MessageController = Depends()
+) -> StreamingResponse:
+    """
+    Stream the full message history of a conversation as NDJSON
+    (one MessageResponse per line, newest first).
+    """
+    lines = await message_controller.export_conversation_messages(conversation_id)
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="conversation-{conversation_id}.ndjson"'}
     )
 
 @router.get("/conversation/{conversation_id}/before", response_model=PaginatedMessageResponse)
 async def get_messages_before_timestamp(
     conversation_id: int = Path(..., description="ID of the conversation"),
     before_timestamp: datetime = Query(..., description="Get messages before this timestamp"),
-    page: int = Query(1, description="Page number"),
-    limit: int = Query(20, description="Number of messages per page"),
+    page: int = Query(1, ge=1, description="Page number (ignored when a cursor is given)"),
+    limit: int = Query(20, ge=1, le=500, description="Number of messages per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor"),
     message_controller: MessageController = Depends()
 ) -> PaginatedMessageResponse:
     """
@@ -52,5 +103,6 @@ async def get_messages_before_timestamp(
         conversation_id=conversation_id,
         before_timestamp=before_timestamp,
         page=page,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     ) 
\ No newline at end of file
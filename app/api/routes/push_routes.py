@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Path, WebSocket
+from fastapi.responses import StreamingResponse
+
+from app.controllers.push_controller import PushController
+
+router = APIRouter(prefix="/api/push", tags=["Push"])
+
+@router.websocket("/{user_id}")
+async def push_websocket(
+    websocket: WebSocket,
+    user_id: int = Path(..., description="ID of the user"),
+    push_controller: PushController = Depends()
+) -> None:
+    """
+    Receive new messages for a user as JSON text frames
+    """
+    await push_controller.stream_websocket(websocket, user_id)
+
+@router.get("/{user_id}/events", status_code=200, response_class=StreamingResponse)
+async def push_events(
+    user_id: int = Path(..., description="ID of the user"),
+    push_controller: PushController = Depends()
+) -> StreamingResponse:
+    """
+    Receive new messages for a user as server-sent events
+    """
+    events = await push_controller.event_stream(user_id)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query, Path
+from typing import Optional
+
+from app.controllers.message_controller import MessageController
+from app.schemas.message import SyncResponse
+
+router = APIRouter(prefix="/api/sync", tags=["Sync"])
+
+@router.get("/{user_id}", response_model=SyncResponse)
+async def sync_messages(
+    user_id: int = Path(..., description="ID of the user"),
+    since: Optional[str] = Query(None, description="next_cursor of the previous sync; omit to get a starting cursor"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum number of messages to return"),
+    message_controller: MessageController = Depends()
+) -> SyncResponse:
+    """
+    Get every message a user missed since their last sync, across all conversations
+    """
+    return await message_controller.sync_messages(user_id=user_id, since=since, limit=limit)
@@ -1,8 +1,14 @@
+import asyncio
+import logging
 import uuid
+from typing import Dict, List, Optional
 from fastapi import HTTPException, status
 
 from app.schemas.conversation import ConversationResponse, PaginatedConversationResponse
 from app.models.cassandra_models import ConversationModel
+from app.models.unread import unread_tracker
+
+logger = logging.getLogger(__name__)
 
 class ConversationController:
     """
@@ -17,26 +23,35 @@ class ConversationController:
         limit: int = 20
     ) -> PaginatedConversationResponse:
         try:
-            user_uuid = ConversationModel.get_user_uuid_by_index(user_id)
-            conversations = ConversationModel.get_user_conversations(user_uuid, limit, page)
+            user_uuid = await ConversationModel.get_user_uuid_by_index(user_id)
+            conversations = await ConversationModel.get_user_conversations(user_uuid, limit, page)
+
+            # The ids of every conversation on the page are resolved together,
+            # alongside one read of the user's unread counts
+            conversation_ids = [convo["conversation_id"] for convo in conversations]
+            unread_counts, conversation_indexes, user_indexes = await asyncio.gather(
+                unread_tracker.get_counts(user_uuid, conversation_ids),
+                ConversationModel.get_conversation_indexes_by_uuids(conversation_ids),
+                ConversationModel.get_user_indexes_by_uuids(
+                    {other for convo in conversations for other in _other_participants(convo)}
+                ),
+                return_exceptions=True
+            )
+            if isinstance(unread_counts, Exception):
+                logger.warning(f"Unread counts unavailable: {unread_counts}")
+                unread_counts = {}
+            for lookup in (conversation_indexes, user_indexes):
+                if isinstance(lookup, Exception):
+                    raise lookup
+
+            # A conversation whose ids do not resolve only drops that entry
             formatted = []
             for convo in conversations:
-                try:
-                    convo_index = ConversationModel.get_conversation_index_by_uuid(convo["conversation_id"])
-                    user1_index = ConversationModel.get_user_index_by_uuid(convo["user_id"])
-                    other_user_ids = list(convo["other_participants"])
-                    user2_index = ConversationModel.get_user_index_by_uuid(other_user_ids[0]) if other_user_ids else -1
-
-                    formatted.append(ConversationResponse(
-                        id=convo_index,
-                        user1_id=user1_index,
-                        user2_id=user2_index,
-                        last_message_at=convo["last_updated_at"],
-                        last_message_content=convo.get("last_message", "")
-                    ))
-                except Exception as e:
-                    print(f"Skipping conversation due to error: {e}")
+                result = _format_conversation(convo, int(user_id), conversation_indexes, user_indexes)
+                if result is None:
                     continue
+                result.unread_count = unread_counts.get(convo["conversation_id"])
+                formatted.append(result)
 
             return PaginatedConversationResponse(
                 total=len(formatted),
@@ -53,31 +68,125 @@ class ConversationController:
     
     async def get_conversation(self, conversation_id: str) -> ConversationResponse:
         try:
-            convo_uuid = ConversationModel.get_conversation_uuid_by_index(int(conversation_id))
-            participants = ConversationModel.get_conversation(convo_uuid)
-
-            if not participants:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Conversation not found"
-                )
-
-            user1_index = ConversationModel.get_user_index_by_uuid(participants[0])
-            user2_index = ConversationModel.get_user_index_by_uuid(participants[1]) if len(participants) > 1 else -1
-            convo_index = ConversationModel.get_conversation_index_by_uuid(convo_uuid)
-
-            last_message, last_time = ConversationModel.get_last_message_and_time(convo_uuid)
+            convo_index = int(conversation_id)
+            summary = await ConversationModel.get_conversation_summary(convo_index)
+            if summary is None:
+                # Conversations created before summaries existed are built from
+                # the source tables once and their summary is written back
+                summary = await _build_summary(convo_index)
 
+            # Participants without an index are shown as -1, as in the conversation list
+            participant_indexes = (summary["participant_indexes"] or []) + [-1, -1]
             return ConversationResponse(
                 id=convo_index,
-                user1_id=user1_index,
-                user2_id=user2_index,
-                last_message_at=last_time,
-                last_message_content=last_message
+                user1_id=participant_indexes[0],
+                user2_id=participant_indexes[1],
+                last_message_at=summary["last_message_at"],
+                last_message_content=summary["last_message"]
             )
 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to fetch conversation: {str(e)}"
             )
+
+
+    async def mark_read(self, conversation_id: int, user_id: int) -> None:
+        """Reset a user's unread count for a conversation."""
+        try:
+            user_uuid, convo_uuid = await asyncio.gather(
+                ConversationModel.get_user_uuid_by_index(user_id),
+                ConversationModel.get_conversation_uuid_by_index(conversation_id)
+            )
+            await unread_tracker.mark_read(user_uuid, convo_uuid)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=str(e)
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to mark conversation as read: {str(e)}"
+            )
+
+
+def _other_participants(convo: dict) -> List[uuid.UUID]:
+    return sorted(convo["other_participants"] or [])
+
+
+def _format_conversation(
+    convo: dict,
+    user_index: int,
+    conversation_indexes: Dict[uuid.UUID, int],
+    user_indexes: Dict[uuid.UUID, int]
+) -> Optional[ConversationResponse]:
+    """
+    Build the response for a conversations_by_user row of the user with
+    `user_index`, from ids resolved for the whole page. Returns None when the
+    conversation has no index.
+    """
+    convo_index = conversation_indexes.get(convo["conversation_id"])
+    if convo_index is None:
+        logger.warning(f"Skipping conversation {convo['conversation_id']}, which has no index")
+        return None
+    other_user_ids = _other_participants(convo)
+    user2_index = -1
+    if other_user_ids:
+        user2_index = user_indexes.get(other_user_ids[0], -1)
+        if other_user_ids[0] not in user_indexes:
+            logger.warning(f"No index found for user {other_user_ids[0]} in conversation {convo_index}")
+    return ConversationResponse(
+        id=convo_index,
+        user1_id=user_index,
+        user2_id=user2_index,
+        last_message_at=convo["last_updated_at"],
+        last_message_content=convo.get("last_message", "")
+    )
+
+
+async def _build_summary(convo_index: int) -> dict:
+    """
+    Assemble a conversation summary from the source tables and store it. A
+    conversation without messages is not stored, so its first message
+    writes the summary.
+    """
+    try:
+        convo_uuid = await ConversationModel.get_conversation_uuid_by_index(convo_index)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+    participants, (last_message, last_time) = await asyncio.gather(
+        ConversationModel.get_conversation(convo_uuid),
+        ConversationModel.get_last_message_and_time(convo_uuid)
+    )
+    if not participants:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+
+    indexes = await ConversationModel.get_user_indexes_by_uuids(participants)
+    unresolved = [p for p in participants if p not in indexes]
+    if unresolved:
+        logger.warning(f"No index found for participants {unresolved} of conversation {convo_index}")
+    participant_indexes = [indexes[p] for p in sorted(participants) if p in indexes]
+    if last_time is not None:
+        await ConversationModel.update_conversation_summary(
+            conversation_index=convo_index,
+            conversation_id=convo_uuid,
+            participant_indexes=participant_indexes,
+            last_message=last_message,
+            last_message_at=last_time
+        )
+    return {
+        "conversation_id": convo_uuid,
+        "participant_indexes": participant_indexes,
+        "last_message": last_message,
+        "last_message_at": last_time,
+    }
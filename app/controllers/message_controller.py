@@ -1,10 +1,45 @@
-from typing import Optional
-from datetime import datetime
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Optional, List, Dict, Tuple, AsyncIterator, Union
+from datetime import datetime, timedelta
 import uuid
 from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import ValidationError
 from app.models.cassandra_models import MessageModel,ConversationModel
+from app.models.send_pipeline import send_pipeline
+from app.models.unread import unread_tracker
+from app.realtime.hub import push_hub
+from app.db.paging import InvalidCursorError, encode_sync_cursor, decode_sync_cursor
+from app.api.responses import FastJSONResponse, dumps
 
-from app.schemas.message import MessageCreate, MessageResponse, PaginatedMessageResponse
+from app.schemas.message import (
+    MessageCreate, MessageResponse, PaginatedMessageResponse, BulkMessageResult, SyncResponse
+)
+
+logger = logging.getLogger(__name__)
+
+# NDJSON lines resolved and written together by the bulk endpoint
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+# Changed conversations read together, in one multi-partition read, by a delta sync
+SYNC_READ_BATCH = int(os.getenv("SYNC_READ_BATCH", "16"))
+# Those reads in flight at once
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))
+
+# Seconds a message may take to become readable after its timestamp: in-flight
+# sends, the write buffer's delay and clock skew between workers. A sync reads
+# again this far behind the newest message it delivered.
+SYNC_GRACE_PERIOD = timedelta(seconds=float(os.getenv("SYNC_GRACE_PERIOD", "5")))
+
+# Rows read per storage page by the full-history export
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Serve message pages straight from storage rows, without pydantic validation
+# or FastAPI's JSON encoder (see scripts/benchmark_serialization.py)
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "0") == "1"
 
 class MessageController:
     """
@@ -14,30 +49,39 @@ class MessageController:
     
     async def send_message(self, message_data: MessageCreate) -> MessageResponse:
         try:
-            sender_uuid = ConversationModel.get_user_uuid_by_index(message_data.sender_id)
-            receiver_uuid = ConversationModel.get_user_uuid_by_index(message_data.receiver_id)
-
-            print("Sender UUID:", sender_uuid)
-            print("Receiver UUID:", receiver_uuid)
+            sender_uuid, receiver_uuid = await asyncio.gather(
+                ConversationModel.get_user_uuid_by_index(message_data.sender_id),
+                ConversationModel.get_user_uuid_by_index(message_data.receiver_id)
+            )
 
-            conversation_id = ConversationModel.create_or_get_conversation(
+            conversation_id = await ConversationModel.create_or_get_conversation(
                 user_ids=[sender_uuid, receiver_uuid]
             )
 
-            message = MessageModel.create_message(
+            conversation_index = await ConversationModel.get_conversation_index_by_uuid(conversation_id)
+
+            message = await send_pipeline.send(
                 conversation_id=conversation_id,
                 sender_id=sender_uuid,
                 receiver_id=receiver_uuid,
-                content=message_data.content
+                participants=[sender_uuid, receiver_uuid],
+                content=message_data.content,
+                conversation_index=conversation_index,
+                participant_indexes=_indexes_by_uuid(
+                    {sender_uuid: message_data.sender_id, receiver_uuid: message_data.receiver_id}
+                )
             )
-            return MessageResponse(
+            response = MessageResponse(
                 id=1,
+                message_id=message["message_id"],
                 sender_id=message_data.sender_id,
                 receiver_id=message_data.receiver_id,
                 content=message["content"],
                 created_at=message["timestamp"],
-                conversation_id=message_data.sender_id
+                conversation_id=conversation_index
             )
+            await _publish_message(response)
+            return response
 
         except Exception as e:
             raise HTTPException(
@@ -45,48 +89,80 @@ class MessageController:
                 detail=f"Failed to send message: {str(e)}"
             )
     
+    async def bulk_send_messages(self, body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+        """
+        Ingest an NDJSON stream of MessageCreate objects.
+
+        Lines are processed in chunks of BULK_CHUNK_SIZE. Each chunk resolves
+        its distinct user IDs and conversations once, writes its messages with
+        bounded concurrency and moves each touched conversation to the top of
+        its participants' inboxes. One NDJSON result is yielded per input line
+        as soon as its chunk completes.
+
+        Stored messages are pushed to connected clients like single sends.
+        They bypass the write buffer, since each chunk is already written
+        with bounded concurrency.
+        """
+        async for chunk in _iter_ndjson_chunks(body, BULK_CHUNK_SIZE):
+            for result in await _send_chunk(chunk):
+                yield result.model_dump_json(exclude_none=True) + "\n"
+
     async def get_conversation_messages(
         self,
         conversation_id: int,
         page: int = 1,
-        limit: int = 20
-    ) -> PaginatedMessageResponse:
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+        response: Optional[Response] = None
+    ) -> Union[PaginatedMessageResponse, Response]:
+        """
+        Get one page of messages with an ETag derived from the conversation's
+        newest message time. A matching If-None-Match is answered with 304
+        after a single LIMIT 1 read, without reading or serializing the page.
+        """
         try:
-            print("Fetching UUID for conversation index:", conversation_id)
-            conversation_uuid = ConversationModel.get_conversation_uuid_by_index(conversation_id)
-            print("Found UUID:", conversation_uuid)
+            conversation_uuid = await ConversationModel.get_conversation_uuid_by_index(conversation_id)
+
+            version = None
+            if if_none_match:
+                version = await ConversationModel.get_last_message_time(conversation_uuid)
+                etag = _message_etag(conversation_id, version, page, limit, cursor)
+                if _etag_matches(if_none_match, etag):
+                    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag))
 
-            print(f"Fetching messages: page={page}, limit={limit}")
-            messages = MessageModel.get_conversation_messages(
+            read_page = MessageModel.get_conversation_messages(
                 conversation_id=conversation_uuid,
                 page=page,
-                limit=limit
-            )
-            print(f"Retrieved {len(messages)} messages")
-
-            formatted = []
-            for m in messages:
-                sender_index = ConversationModel.get_user_index_by_uuid(m["sender_id"])
-                receiver_index = ConversationModel.get_user_index_by_uuid(m["receiver_id"])
-                formatted.append(MessageResponse(
-                    id=1,
-                    content=m["content"],
-                    sender_id=sender_index,
-                    receiver_id=receiver_index,
-                    created_at=m["timestamp"],
-                    conversation_id=conversation_id
-                ))
-            print("Formatted all messages")
-
-            return PaginatedMessageResponse(
-                data=formatted,
-                total=len(formatted),
-                page=page,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
+            if if_none_match or (page == 1 and not cursor):
+                messages, next_cursor = await read_page
+                if not if_none_match:
+                    # The first page starts at the newest message
+                    version = messages[0]["timestamp"] if messages else None
+            else:
+                (messages, next_cursor), version = await asyncio.gather(
+                    read_page, ConversationModel.get_last_message_time(conversation_uuid)
+                )
+            etag = _message_etag(conversation_id, version, page, limit, cursor)
 
+            formatted = await _format_messages(messages, conversation_id)
+            result = _message_page(formatted, page, limit, next_cursor)
+            if isinstance(result, Response):
+                result.headers.update(_cache_headers(etag))
+            elif response is not None:
+                response.headers.update(_cache_headers(etag))
+            return result
+
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as e:
-            print("Error in get_conversation_messages:", str(e)) 
+            logger.error(f"Failed to fetch messages for conversation {conversation_id}: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to fetch messages: {str(e)}"
@@ -94,41 +170,435 @@ class MessageController:
 
 
     
+    async def sync_messages(self, user_id: int, since: Optional[str] = None, limit: int = 500) -> SyncResponse:
+        """
+        Return the messages a user missed since a sync cursor, across all of
+        their conversations, oldest first.
+
+        Only conversations whose inbox entry moved past the cursor are read,
+        and from each only the messages newer than the cursor, SYNC_READ_BATCH
+        conversations per storage read. Without a cursor nothing is returned
+        and the cursor starts at the current time.
+
+        A message can become readable after a newer one was already
+        delivered: a send still in flight, the write buffer's delay or clock
+        skew between workers. So the cursor keeps, besides the newest message
+        delivered, a re-read time up to SYNC_GRACE_PERIOD behind it. Messages
+        between the two are sent again (clients deduplicate them by
+        message_id) and do not count towards `limit`.
+        """
+        try:
+            now = datetime.utcnow()
+            if not since:
+                return SyncResponse(
+                    data=[], next_cursor=encode_sync_cursor(now, now - SYNC_GRACE_PERIOD), has_more=False
+                )
+            after, delivered = decode_sync_cursor(since)
+
+            user_uuid = await ConversationModel.get_user_uuid_by_index(user_id)
+            conversation_ids = await ConversationModel.get_conversations_updated_since(user_uuid, after)
+
+            chunks = [
+                conversation_ids[i:i + SYNC_READ_BATCH] for i in range(0, len(conversation_ids), SYNC_READ_BATCH)
+            ]
+            semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+            async def read(chunk: List[uuid.UUID]) -> Tuple[Dict[uuid.UUID, List[dict]], ...]:
+                async with semaphore:
+                    return await asyncio.gather(
+                        MessageModel.get_messages_after_many(chunk, delivered, limit),
+                        _read_overlap(chunk, after, delivered, limit),
+                        ConversationModel.get_conversation_indexes_by_uuids(chunk)
+                    )
+
+            pages = []
+            for messages, overlapping, conversation_indexes in await asyncio.gather(*(read(c) for c in chunks)):
+                for conversation_uuid in messages.keys() | overlapping.keys():
+                    if conversation_uuid not in conversation_indexes:
+                        logger.warning(f"Sync skips conversation {conversation_uuid}, which has no index")
+                        continue
+                    pages.append((
+                        messages.get(conversation_uuid, []),
+                        overlapping.get(conversation_uuid, []),
+                        conversation_indexes[conversation_uuid]
+                    ))
+
+            # One user index lookup for the senders and receivers of every conversation
+            user_indexes = await ConversationModel.get_user_indexes_by_uuids({
+                user
+                for messages, overlap, _ in pages
+                for m in messages + overlap
+                for user in (m["sender_id"], m["receiver_id"])
+            })
+            merged, overlap = [], []
+            for messages, overlapping, conversation_index in pages:
+                merged.extend(_format_rows(messages, conversation_index, user_indexes))
+                overlap.extend(_format_rows(overlapping, conversation_index, user_indexes))
+            merged.sort(key=lambda m: m["created_at"])
+            overlap.sort(key=lambda m: m["created_at"])
+
+            # A conversation that filled its read may have more messages after
+            # its last row, so nothing past that row can be delivered yet
+            horizon = min(
+                (messages[-1]["timestamp"] for messages, _, _ in pages if len(messages) >= limit), default=None
+            )
+            fresh = [m for m in merged if horizon is None or m["created_at"] < horizon]
+            if not fresh and merged:
+                # A full read of one timestamp; deliver it rather than stall
+                fresh = [m for m in merged if m["created_at"] <= horizon]
+            batch, has_more = _cut_sync_batch(fresh, limit)
+            has_more = has_more or horizon is not None
+
+            if batch:
+                delivered = batch[-1]["created_at"]
+            reread_after = max(after, min(delivered, now - SYNC_GRACE_PERIOD))
+            return SyncResponse(
+                data=[MessageResponse(**m) for m in overlap + batch],
+                next_cursor=encode_sync_cursor(delivered, reread_after),
+                has_more=has_more
+            )
+
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except Exception as e:
+            logger.error(f"Sync failed for user {user_id}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to sync messages: {str(e)}"
+            )
+
+    async def export_conversation_messages(self, conversation_id: int) -> AsyncIterator[bytes]:
+        """
+        Resolve a conversation and return an NDJSON stream of all its messages.
+
+        Raises 404 for an unknown conversation before anything is streamed.
+        """
+        try:
+            conversation_uuid = await ConversationModel.get_conversation_uuid_by_index(conversation_id)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to export messages: {str(e)}"
+            )
+        return _export_lines(conversation_uuid, conversation_id)
+
     async def get_messages_before_timestamp(
         self,
         conversation_id: str,
         before_timestamp: datetime,
         page: int = 1,
-        limit: int = 20
-    ) -> PaginatedMessageResponse:
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Union[PaginatedMessageResponse, Response]:
         try:
-            conversation_uuid = ConversationModel.get_conversation_uuid_by_index(conversation_id)
-            messages = MessageModel.get_messages_before_timestamp(
+            conversation_uuid = await ConversationModel.get_conversation_uuid_by_index(conversation_id)
+            messages, next_cursor = await MessageModel.get_messages_before_timestamp(
                 conversation_id=conversation_uuid,
                 before=before_timestamp,
                 page=page,
-                limit=limit
-            )
-            formatted = []
-            for m in messages:
-                formatted.append(MessageResponse(
-                    id=1,
-                    content=m["content"],
-                    sender_id=ConversationModel.get_user_index_by_uuid(m["sender_id"]),
-                    receiver_id=ConversationModel.get_user_index_by_uuid(m["receiver_id"]),
-                    created_at=m["timestamp"],
-                    conversation_id=conversation_id
-                ))
-
-            return PaginatedMessageResponse(
-                data=formatted,
-                total=len(formatted),
-                page=page,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
+            formatted = await _format_messages(messages, conversation_id)
+            return _message_page(formatted, page, limit, next_cursor)
 
+        except InvalidCursorError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to fetch messages before timestamp: {str(e)}"
-            )
\ No newline at end of file
+            )
+
+
+async def _publish_message(message: MessageResponse) -> None:
+    """Push a stored message to the connected clients of both participants."""
+    try:
+        await push_hub.publish(
+            [message.sender_id, message.receiver_id],
+            dumps({"type": "message", "data": message.model_dump()})
+        )
+    except Exception as e:
+        # The message is stored; clients that miss the push see it on their next read
+        logger.warning(f"Failed to publish message to push clients: {str(e)}")
+
+
+async def _format_messages(messages: List[dict], conversation_id: int) -> List[dict]:
+    """
+    Build MessageResponse fields for a page, resolving every distinct sender
+    and receiver UUID in one batch instead of two lookups per message.
+    """
+    user_uuids = set()
+    for m in messages:
+        user_uuids.add(m["sender_id"])
+        user_uuids.add(m["receiver_id"])
+    user_indexes = await ConversationModel.get_user_indexes_by_uuids(user_uuids)
+    return _format_rows(messages, conversation_id, user_indexes)
+
+
+def _format_rows(messages: List[dict], conversation_id: int, user_indexes: Dict[uuid.UUID, int]) -> List[dict]:
+    """
+    MessageResponse fields for storage rows, given their resolved user indexes.
+    A user without an index is shown as -1.
+    """
+    unresolved = {
+        user for m in messages for user in (m["sender_id"], m["receiver_id"]) if user not in user_indexes
+    }
+    if unresolved:
+        logger.warning(f"No index found for users {sorted(map(str, unresolved))} in conversation {conversation_id}")
+    # Keys in MessageResponse field order, so both serialization paths give the same JSON
+    return [
+        {
+            "content": m["content"],
+            "id": 1,
+            "message_id": m["message_id"],
+            "sender_id": user_indexes.get(m["sender_id"], -1),
+            "receiver_id": user_indexes.get(m["receiver_id"], -1),
+            "created_at": m["timestamp"],
+            "conversation_id": conversation_id
+        }
+        for m in messages
+    ]
+
+
+async def _read_overlap(
+    conversation_ids: List[uuid.UUID],
+    after: datetime,
+    delivered: datetime,
+    limit: int
+) -> Dict[uuid.UUID, List[dict]]:
+    """
+    Read the messages of conversations a sync already passed, those between
+    its re-read time and the newest message it delivered. At most `limit` each.
+    """
+    if after >= delivered:
+        return {}
+    return await MessageModel.get_messages_after_many(conversation_ids, after, limit, until=delivered)
+
+
+def _cut_sync_batch(messages: List[dict], limit: int) -> Tuple[List[dict], bool]:
+    """
+    Cut time-ordered messages to a sync batch of about `limit`.
+
+    The next sync resumes strictly after the last message's time, so the cut
+    never splits messages sharing a timestamp: it backs off before them, or
+    includes all of them when they alone exceed the limit.
+
+    Returns:
+        The batch and whether messages were left out
+    """
+    if len(messages) <= limit:
+        return messages, False
+    boundary = messages[limit]["created_at"]
+    end = limit
+    while end > 0 and messages[end - 1]["created_at"] == boundary:
+        end -= 1
+    if end == 0:
+        end = limit
+        while end < len(messages) and messages[end]["created_at"] == boundary:
+            end += 1
+    return messages[:end], True
+
+
+def _message_etag(
+    conversation_id: int,
+    version: Optional[datetime],
+    page: int,
+    limit: int,
+    cursor: Optional[str]
+) -> str:
+    """
+    Weak ETag of a message page: it changes whenever a newer message is
+    written to the conversation, and differs per page of the same version.
+    """
+    key = f"{conversation_id}:{version.isoformat() if version else '-'}:{page}:{limit}:{cursor or ''}"
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=12).hexdigest()}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an ETag against an If-None-Match header value."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    # no-cache lets clients store the page but makes them revalidate every poll
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def _message_page(
+    messages: List[dict],
+    page: int,
+    limit: int,
+    next_cursor: Optional[str]
+) -> Union[PaginatedMessageResponse, Response]:
+    """
+    Wrap formatted messages in a page. With FAST_SERIALIZATION the page is
+    encoded directly, bypassing validation of the trusted storage rows.
+    """
+    if FAST_SERIALIZATION:
+        return FastJSONResponse({
+            "total": len(messages),
+            "page": page,
+            "limit": limit,
+            "data": messages,
+            "next_cursor": next_cursor
+        })
+    return PaginatedMessageResponse(
+        data=[MessageResponse(**m) for m in messages],
+        total=len(messages),
+        page=page,
+        limit=limit,
+        next_cursor=next_cursor
+    )
+
+
+async def _export_lines(conversation_uuid: uuid.UUID, conversation_id: int) -> AsyncIterator[bytes]:
+    """
+    One MessageResponse JSON line per message, newest first, encoded one
+    storage page at a time so memory stays bounded by EXPORT_PAGE_SIZE.
+
+    The status line has already been sent when a read fails, so the failure is
+    reported as a final {"error": ...} line.
+    """
+    try:
+        async for rows in MessageModel.iter_conversation_messages(conversation_uuid, EXPORT_PAGE_SIZE):
+            formatted = await _format_messages(rows, conversation_id)
+            yield b"".join(dumps(m) + b"\n" for m in formatted)
+    except Exception as e:
+        logger.error(f"Export of conversation {conversation_id} failed: {str(e)}")
+        yield dumps({"error": f"Export failed: {str(e)}"}) + b"\n"
+
+
+async def _iter_ndjson_chunks(body: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[List[Tuple[int, bytes]]]:
+    """Split a streamed body into chunks of (line number, line) pairs, skipping blank lines."""
+    buffer = b""
+    line_no = 0
+    chunk = []
+    async for data in body:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                chunk.append((line_no, line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if buffer.strip():
+        chunk.append((line_no + 1, buffer))
+    if chunk:
+        yield chunk
+
+
+def _indexes_by_uuid(indexes: Dict[uuid.UUID, int]) -> List[int]:
+    """Participant indexes ordered by UUID, the order conversation_participants stores them in."""
+    return [indexes[user_uuid] for user_uuid in sorted(indexes)]
+
+
+async def _send_chunk(chunk: List[Tuple[int, bytes]]) -> List[BulkMessageResult]:
+    """Write one chunk of NDJSON lines and return a result per line."""
+    results: Dict[int, BulkMessageResult] = {}
+    parsed: List[Tuple[int, MessageCreate]] = []
+    for line_no, line in chunk:
+        try:
+            parsed.append((line_no, MessageCreate.model_validate_json(line)))
+        except ValidationError as e:
+            results[line_no] = BulkMessageResult(line=line_no, status="error", detail=str(e))
+
+    try:
+        user_uuids = await ConversationModel.get_user_uuids_by_indexes(
+            index for _, m in parsed for index in (m.sender_id, m.receiver_id)
+        )
+
+        valid = []
+        for line_no, m in parsed:
+            missing = [i for i in (m.sender_id, m.receiver_id) if i not in user_uuids]
+            if missing:
+                results[line_no] = BulkMessageResult(line=line_no, status="error", detail=f"No user found for index {missing[0]}")
+            else:
+                valid.append((line_no, m, user_uuids[m.sender_id], user_uuids[m.receiver_id]))
+
+        # One conversation lookup per distinct participant pair in the chunk
+        pairs = list({tuple(sorted((s, r))) for _, _, s, r in valid})
+        conversation_ids = dict(zip(pairs, await asyncio.gather(
+            *(ConversationModel.create_or_get_conversation(list(pair)) for pair in pairs)
+        )))
+        conversation_indexes = dict(zip(conversation_ids.values(), await asyncio.gather(
+            *(ConversationModel.get_conversation_index_by_uuid(c) for c in conversation_ids.values())
+        )))
+        previous_times = dict(zip(conversation_ids.values(), await asyncio.gather(
+            *(ConversationModel.get_last_message_time(c) for c in conversation_ids.values())
+        )))
+
+        rows = []
+        for line_no, m, sender_uuid, receiver_uuid in valid:
+            conversation_id = conversation_ids[tuple(sorted((sender_uuid, receiver_uuid)))]
+            rows.append((conversation_id, sender_uuid, receiver_uuid, m.content, datetime.utcnow()))
+        outcomes = await MessageModel.create_messages(rows)
+
+        latest: Dict[uuid.UUID, Tuple[Dict[uuid.UUID, int], str, datetime]] = {}
+        stored: List[MessageResponse] = []
+        for (line_no, m, sender_uuid, receiver_uuid), row, outcome in zip(valid, rows, outcomes):
+            conversation_id, _, _, content, timestamp = row
+            if isinstance(outcome, Exception):
+                results[line_no] = BulkMessageResult(line=line_no, status="error", detail=str(outcome))
+                continue
+            results[line_no] = BulkMessageResult(
+                line=line_no,
+                status="ok",
+                conversation_id=conversation_indexes[conversation_id],
+                created_at=timestamp
+            )
+            latest[conversation_id] = ({sender_uuid: m.sender_id, receiver_uuid: m.receiver_id}, content, timestamp)
+            stored.append(MessageResponse(
+                id=1,
+                message_id=outcome,
+                sender_id=m.sender_id,
+                receiver_id=m.receiver_id,
+                content=content,
+                created_at=timestamp,
+                conversation_id=conversation_indexes[conversation_id]
+            ))
+            # A message to yourself is not unread, as in SendPipeline
+            if receiver_uuid != sender_uuid:
+                unread_tracker.increment(receiver_uuid, conversation_id)
+
+        await asyncio.gather(*(
+            ConversationModel.update_inbox(
+                conversation_id=conversation_id,
+                participants=list(participants),
+                last_message=content,
+                last_updated_at=timestamp,
+                previous_updated_at=previous_times[conversation_id]
+            )
+            for conversation_id, (participants, content, timestamp) in latest.items()
+        ), *(
+            ConversationModel.update_conversation_summary(
+                conversation_index=conversation_indexes[conversation_id],
+                conversation_id=conversation_id,
+                participant_indexes=_indexes_by_uuid(participants),
+                last_message=content,
+                last_message_at=timestamp
+            )
+            for conversation_id, (participants, content, timestamp) in latest.items()
+        ))
+        # Pushed once the inboxes are updated, like a single send
+        for message in stored:
+            await _publish_message(message)
+    except Exception as e:
+        # A failure shared by the whole chunk is reported on every line not yet settled
+        for line_no, _ in parsed:
+            results.setdefault(line_no, BulkMessageResult(line=line_no, status="error", detail=str(e)))
+
+    return [results[line_no] for line_no, _ in chunk]
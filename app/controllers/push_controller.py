@@ -0,0 +1,96 @@
+import os
+import asyncio
+import logging
+from typing import AsyncIterator
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+
+from app.models.cassandra_models import ConversationModel
+from app.realtime.hub import push_hub
+
+logger = logging.getLogger(__name__)
+
+# Seconds between SSE comment lines that keep idle proxies from closing the stream
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+# WebSocket close code for a connection dropped as a slow consumer ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class PushController:
+    """
+    Controller for real-time delivery of new messages.
+
+    Each connection subscribes to the push hub for one user and receives
+    {"type": "message", "data": MessageResponse} events for every message sent
+    to or by that user.
+    """
+
+    async def stream_websocket(self, websocket: WebSocket, user_id: int) -> None:
+        """Forward a user's events over a WebSocket until either side closes it."""
+        try:
+            await ConversationModel.get_user_uuid_by_index(user_id)
+        except ValueError:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Unknown user")
+            return
+
+        await websocket.accept()
+        subscription = push_hub.subscribe(user_id)
+        # Clients do not send anything; reading only notices the disconnect
+        client_gone = asyncio.ensure_future(_wait_for_disconnect(websocket))
+        try:
+            while True:
+                next_event = asyncio.ensure_future(subscription.get())
+                await asyncio.wait({next_event, client_gone}, return_when=asyncio.FIRST_COMPLETED)
+                if client_gone.done():
+                    next_event.cancel()
+                    return
+                payload = next_event.result()
+                if payload is None:
+                    await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Slow consumer")
+                    return
+                await websocket.send_text(payload.decode())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            client_gone.cancel()
+            push_hub.unsubscribe(subscription)
+
+    async def event_stream(self, user_id: int) -> AsyncIterator[str]:
+        """
+        Resolve a user and return their events as a server-sent event stream.
+
+        Raises 404 for an unknown user before anything is streamed.
+        """
+        try:
+            await ConversationModel.get_user_uuid_by_index(user_id)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        return _sse_events(user_id)
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+async def _sse_events(user_id: int) -> AsyncIterator[str]:
+    subscription = push_hub.subscribe(user_id)
+    try:
+        # Flush the headers so the client knows it is subscribed
+        yield ": subscribed\n\n"
+        while True:
+            try:
+                payload = await subscription.get(SSE_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if payload is None:
+                # Dropped as a slow consumer; the client should reconnect and catch up
+                yield "event: dropped\ndata: {}\n\n"
+                return
+            yield f"event: message\ndata: {payload.decode()}\n\n"
+    finally:
+        push_hub.unsubscribe(subscription)
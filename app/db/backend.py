@@ -0,0 +1,109 @@
+"""
+Storage backend interface for the Messenger models.
+
+The models describe every query as a named CQL statement and run it through
+a StorageBackend. Two implementations exist:
+- CassandraClient (app/db/cassandra_client.py): prepared statements on a live cluster
+- MemoryBackend (app/db/memory_backend.py): the same statements over in-process tables
+
+The backend in use is chosen in app/db/storage.py.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+# fetch_size that turns server-side paging off, so every row comes back in one
+# response. Cassandra requires it for ORDER BY with an IN on the partition key.
+UNPAGED = 0
+
+
+class InvalidPagingStateError(ValueError):
+    """Raised when a statement is resumed from a paging state the backend does not accept."""
+
+
+class StorageBackend(ABC):
+    """Executes registered, named CQL statements."""
+
+    name: str = "storage"
+
+    @abstractmethod
+    def register_statements(self, statements: Dict[str, str]) -> None:
+        """
+        Register named CQL statements.
+
+        Args:
+            statements: Mapping of statement name to CQL text with ? markers
+        """
+
+    @abstractmethod
+    def get_statement_text(self, name: str) -> Optional[str]:
+        """Return the CQL text of a registered statement, or None if unknown."""
+
+    @abstractmethod
+    def prepare_statements(self) -> None:
+        """Prepare every registered statement, connecting first if needed."""
+
+    @abstractmethod
+    def execute_prepared(
+        self,
+        name: str,
+        params: Optional[tuple] = None,
+        fetch_size: Optional[int] = None,
+        paging_state: Optional[bytes] = None
+    ) -> Any:
+        """
+        Execute a registered statement, blocking until it completes.
+
+        Args:
+            fetch_size: Rows per page (backend default if None, no paging if UNPAGED)
+
+        Returns:
+            A result set with `current_rows`, `paging_state`, `one()` and
+            iteration over all rows
+        """
+
+    @abstractmethod
+    async def execute_prepared_aio(
+        self,
+        name: str,
+        params: Optional[tuple] = None,
+        fetch_size: Optional[int] = None,
+        paging_state: Optional[bytes] = None
+    ) -> Any:
+        """
+        Execute a registered statement without blocking the event loop.
+
+        Args:
+            fetch_size: Rows per page (backend default if None, no paging if UNPAGED)
+
+        Returns:
+            A result set holding the first page; use `current_rows` and
+            `paging_state` rather than iterating past it
+        """
+
+    @abstractmethod
+    async def execute_batch_aio(self, statements: List[Tuple[str, tuple]]) -> Any:
+        """
+        Execute registered statements as one unlogged batch.
+
+        Args:
+            statements: (statement name, params) pairs
+        """
+
+    @abstractmethod
+    def execute_concurrent_prepared(
+        self,
+        name: str,
+        params_list: List[tuple],
+        concurrency: int = 100
+    ) -> List[Tuple[bool, Any]]:
+        """
+        Execute a registered statement once per parameter tuple with bounded
+        concurrency, blocking until all complete.
+
+        Returns:
+            (success, result or exception) per parameter tuple, in order
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release connections and other resources."""
@@ -0,0 +1,133 @@
+"""
+In-process caches used in front of Cassandra lookups.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU cache with an optional per-entry TTL.
+
+    Keeps hit, miss and eviction counters so the hit ratio can be observed
+    under real traffic.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        """
+        Args:
+            maxsize: Maximum number of entries before the least recently used is evicted
+            ttl: Seconds an entry stays valid, or None for no expiry
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default on a miss or expired entry."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key without touching recency or counters."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    return value
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Insert or refresh an entry, evicting the least recently used one if full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        """Drop an entry if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss/eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class BidirectionalLookupCache:
+    """
+    Pair of LRU caches for an immutable one-to-one mapping, e.g. integer
+    index <-> UUID. Storing a pair makes it available in both directions.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.by_key = LRUCache(maxsize, ttl)
+        self.by_value = LRUCache(maxsize, ttl)
+
+    def put(self, key: Hashable, value: Hashable) -> None:
+        """Cache the pair key <-> value."""
+        self.by_key.set(key, value)
+        self.by_value.set(value, key)
+
+    def put_many(self, pairs: Iterable[Tuple[Hashable, Hashable]]) -> int:
+        """Cache every (key, value) pair and return how many were stored."""
+        count = 0
+        for key, value in pairs:
+            self.put(key, value)
+            count += 1
+        return count
+
+    def get_value(self, key: Hashable) -> Any:
+        """Return the value mapped to key, or None on a miss."""
+        return self.by_key.get(key)
+
+    def get_key(self, value: Hashable) -> Any:
+        """Return the key mapped to value, or None on a miss."""
+        return self.by_value.get(value)
+
+    def clear(self) -> None:
+        self.by_key.clear()
+        self.by_value.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for both directions."""
+        return {"by_key": self.by_key.stats(), "by_value": self.by_value.stats()}
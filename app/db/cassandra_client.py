@@ -3,20 +3,30 @@ Cassandra client for the Messenger application.
 This provides a connection to the Cassandra database.
 """
 import os
+import time
+import asyncio
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import logging
+import threading
 
-from cassandra.cluster import Cluster, Session
+from app.db.backend import StorageBackend, InvalidPagingStateError
+from app.db.metrics import metrics
+
+from cassandra import InvalidRequest
+from cassandra.cluster import Cluster, Session, ResultSet, ResponseFuture
 from cassandra.auth import PlainTextAuthProvider
-from cassandra.query import SimpleStatement, dict_factory
+from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.query import SimpleStatement, PreparedStatement, BatchStatement, BatchType, dict_factory
 
 logger = logging.getLogger(__name__)
 
-class CassandraClient:
+class CassandraClient(StorageBackend):
     """Singleton Cassandra client for the application."""
     
+    name = "cassandra"
+    
     _instance = None
     
     def __new__(cls):
@@ -36,8 +46,16 @@ class CassandraClient:
         
         self.cluster = None
         self.session = None
-        self.connect()
-        
+
+        # Statement registry: name -> CQL text, and name -> PreparedStatement
+        # for the current session. Prepared statements belong to a cluster
+        # connection, so the prepared map is rebuilt on every connect().
+        self._statements: Dict[str, str] = {}
+        self._prepared: Dict[str, PreparedStatement] = {}
+        self._prepare_lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+
+        # Connect on first use, so importing the app does not need a live cluster
         self._initialized = True
     
     def connect(self) -> None:
@@ -50,12 +68,22 @@ class CassandraClient:
         except Exception as e:
             logger.error(f"Failed to connect to Cassandra: {str(e)}")
             raise
+
+        # Statements prepared against a previous session are not valid here
+        self._prepared = {}
+        if self._statements:
+            self.prepare_statements()
     
     def close(self) -> None:
         """Close the Cassandra connection."""
         if self.cluster:
             self.cluster.shutdown()
             logger.info("Cassandra connection closed")
+        # The next use reconnects and prepares every statement again
+        with self._connect_lock:
+            self.cluster = None
+            self.session = None
+            self._prepared = {}
     
     def execute(self, query: str, params: dict = None) -> List[Dict[str, Any]]:
         """
@@ -100,11 +128,249 @@ class CassandraClient:
             logger.error(f"Async query execution failed: {str(e)}")
             raise
     
+    def register_statements(self, statements: Dict[str, str]) -> None:
+        """
+        Register named CQL statements to be prepared by this client.
+
+        Statements are prepared on the next call to prepare_statements()
+        (done at application startup and after every reconnect) or lazily
+        the first time they are executed.
+
+        Args:
+            statements: Mapping of statement name to CQL text with ? markers
+        """
+        for name, query in statements.items():
+            existing = self._statements.get(name)
+            if existing is not None and existing != query:
+                raise ValueError(f"Statement {name!r} is already registered with different CQL")
+            self._statements[name] = query
+
+    def get_statement_text(self, name: str) -> Optional[str]:
+        """Return the CQL text of a registered statement, or None if unknown."""
+        return self._statements.get(name)
+
+    def prepare_statements(self) -> None:
+        """Prepare every registered statement that is not prepared yet."""
+        for name in list(self._statements):
+            self.get_prepared(name)
+        logger.info(f"Prepared {len(self._prepared)} CQL statements")
+
+    def get_prepared(self, name: str) -> PreparedStatement:
+        """
+        Get the prepared statement registered under a name, preparing it on first use.
+
+        Args:
+            name: The registered statement name
+
+        Returns:
+            The prepared statement for the current session
+        """
+        prepared = self._prepared.get(name)
+        if prepared is not None:
+            return prepared
+
+        if name not in self._statements:
+            raise KeyError(f"Unknown statement {name!r}")
+
+        # Connect outside the lock: connecting prepares every statement itself
+        session = self.get_session()
+        with self._prepare_lock:
+            prepared = self._prepared.get(name)
+            if prepared is None:
+                prepared = session.prepare(self._statements[name])
+                self._prepared[name] = prepared
+        return prepared
+
+    def execute_prepared(
+        self,
+        name: str,
+        params: Optional[tuple] = None,
+        fetch_size: Optional[int] = None,
+        paging_state: Optional[bytes] = None
+    ) -> ResultSet:
+        """
+        Execute a registered statement.
+
+        Args:
+            name: The registered statement name
+            params: Positional values for the statement's bind markers
+            fetch_size: Rows per page for server-side paging (driver default if None, no paging if UNPAGED)
+            paging_state: Paging state of a previous result to resume from
+
+        Returns:
+            The driver result set (rows are dictionaries)
+        """
+        try:
+            statement = self.get_prepared(name).bind(params or ())
+            if fetch_size is not None:
+                # An explicit None turns paging off in the driver
+                statement.fetch_size = fetch_size or None
+            with metrics.time_query(name):
+                return self.get_session().execute(statement, paging_state=paging_state)
+        except InvalidRequest as e:
+            if paging_state is not None:
+                raise InvalidPagingStateError(str(e)) from e
+            logger.error(f"Prepared statement {name} failed: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Prepared statement {name} failed: {str(e)}")
+            raise
+
+    def execute_prepared_async(
+        self,
+        name: str,
+        params: Optional[tuple] = None,
+        fetch_size: Optional[int] = None,
+        paging_state: Optional[bytes] = None
+    ) -> ResponseFuture:
+        """
+        Execute a registered statement asynchronously.
+
+        Args:
+            name: The registered statement name
+            params: Positional values for the statement's bind markers
+            fetch_size: Rows per page for server-side paging (driver default if None, no paging if UNPAGED)
+            paging_state: Paging state of a previous result to resume from
+
+        Returns:
+            The driver response future
+        """
+        try:
+            statement = self.get_prepared(name).bind(params or ())
+            if fetch_size is not None:
+                # An explicit None turns paging off in the driver
+                statement.fetch_size = fetch_size or None
+            return self.get_session().execute_async(statement, paging_state=paging_state)
+        except Exception as e:
+            logger.error(f"Async prepared statement {name} failed: {str(e)}")
+            raise
+
+    async def execute_prepared_aio(
+        self,
+        name: str,
+        params: Optional[tuple] = None,
+        fetch_size: Optional[int] = None,
+        paging_state: Optional[bytes] = None
+    ) -> ResultSet:
+        """
+        Execute a registered statement without blocking the event loop.
+
+        Only the first page is fetched; use `current_rows` and `paging_state`
+        on the result rather than iterating past it, which would block.
+
+        Args:
+            name: The registered statement name
+            params: Positional values for the statement's bind markers
+            fetch_size: Rows per page for server-side paging (driver default if None, no paging if UNPAGED)
+            paging_state: Paging state of a previous result to resume from
+
+        Returns:
+            The driver result set (rows are dictionaries)
+        """
+        try:
+            with metrics.time_query(name):
+                response_future = self.execute_prepared_async(name, params, fetch_size, paging_state)
+                return await wrap_response_future(response_future)
+        except InvalidRequest as e:
+            # The server rejects a paging state that does not fit the statement
+            if paging_state is not None:
+                raise InvalidPagingStateError(str(e)) from e
+            logger.error(f"Prepared statement {name} failed: {str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Prepared statement {name} failed: {str(e)}")
+            raise
+
+    async def execute_batch_aio(
+        self,
+        statements: List[Tuple[str, tuple]],
+        batch_type: BatchType = BatchType.UNLOGGED
+    ) -> ResultSet:
+        """
+        Execute registered statements as one batch without blocking the event loop.
+
+        Unlogged batches are only atomic within a single partition, so callers
+        should group statements by partition key.
+
+        Args:
+            statements: (statement name, params) pairs
+            batch_type: The CQL batch type
+
+        Returns:
+            The driver result set
+        """
+        batch = BatchStatement(batch_type=batch_type)
+        for name, params in statements:
+            batch.add(self.get_prepared(name), params)
+        names = "+".join(sorted({name for name, _ in statements}))
+        try:
+            with metrics.time_query(f"batch:{names}"):
+                return await wrap_response_future(self.get_session().execute_async(batch))
+        except Exception as e:
+            logger.error(f"Batch of {names} failed: {str(e)}")
+            raise
+
+    def execute_concurrent_prepared(
+        self,
+        name: str,
+        params_list: List[tuple],
+        concurrency: int = 100
+    ) -> List[Tuple[bool, Any]]:
+        """
+        Execute a registered statement once per parameter tuple, keeping at
+        most `concurrency` requests in flight. Blocks until all complete.
+
+        Args:
+            name: The registered statement name
+            params_list: One parameter tuple per execution
+            concurrency: Maximum in-flight requests
+
+        Returns:
+            (success, result or exception) per parameter tuple, in order
+        """
+        start = time.perf_counter()
+        results = execute_concurrent_with_args(
+            self.get_session(), self.get_prepared(name), params_list,
+            concurrency=concurrency, raise_on_first_error=False
+        )
+        # One observation per statement, each charged the average latency of the run
+        elapsed = (time.perf_counter() - start) / max(len(results), 1)
+        for success, _ in results:
+            metrics.record_query(name, elapsed, not success)
+        return results
+
     def get_session(self) -> Session:
-        """Get the Cassandra session."""
+        """Get the Cassandra session, connecting on first use."""
         if not self.session:
-            self.connect()
+            with self._connect_lock:
+                if not self.session:
+                    self.connect()
         return self.session
 
+def wrap_response_future(response_future: ResponseFuture) -> "asyncio.Future[ResultSet]":
+    """
+    Bridge a driver ResponseFuture into an awaitable asyncio future.
+
+    The driver completes requests on its own event thread, so results are
+    handed back to the asyncio loop with call_soon_threadsafe.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(_):
+        if not future.done():
+            # The response future is complete here, so result() does not block
+            future.set_result(response_future.result())
+
+    def set_exception(exc):
+        if not future.done():
+            future.set_exception(exc)
+
+    response_future.add_callbacks(
+        callback=lambda rows: loop.call_soon_threadsafe(set_result, rows),
+        errback=lambda exc: loop.call_soon_threadsafe(set_exception, exc)
+    )
+    return future
+
 # Create a global instance
 cassandra_client = CassandraClient() 
\ No newline at end of file
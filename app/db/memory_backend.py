@@ -0,0 +1,612 @@
+"""
+In-memory storage backend.
+
+Runs the models' named CQL statements against in-process tables laid out
+like the Cassandra schema in app/db/schema.py. Rows are grouped by partition
+key, and each partition keeps its rows sorted by clustering key in the
+declared clustering order, so range slices, LIMIT and paging behave the way
+they do against Cassandra. Only the CQL subset used by the models is
+supported; anything else fails when the statement is registered.
+
+Selected with STORAGE_BACKEND=memory, for running and load-testing the API
+on one machine with no database.
+"""
+import re
+import time
+import uuid
+import bisect
+import logging
+import itertools
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.db.backend import StorageBackend, InvalidPagingStateError
+from app.db.cache import LRUCache
+from app.db.metrics import metrics
+from app.db.schema import TABLES, BUCKETED_MESSAGE_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Paging states handed out and not yet resumed (token -> position)
+PAGING_STATE_CACHE_SIZE = 100000
+PAGING_STATE_TTL = 3600
+
+
+class _Desc:
+    """Sort-key wrapper that inverts the ordering of a DESC clustering column."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return isinstance(other, _Desc) and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas that are not nested inside () or <>."""
+    parts, depth, current = [], 0, []
+    for char in text:
+        if char in "(<":
+            depth += 1
+        elif char in ")>":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _now_micros() -> int:
+    return time.time_ns() // 1000
+
+
+def _normalize(cql: str) -> str:
+    return re.sub(r"\s+", " ", cql).strip().rstrip(";").strip()
+
+
+class TableSchema:
+    """Column types and primary key layout of one table."""
+
+    def __init__(self, name: str, columns: Dict[str, str], partition_key: List[str],
+                 clustering: List[str], descending: set):
+        self.name = name
+        self.columns = columns
+        self.partition_key = partition_key
+        self.clustering = clustering
+        self.descending = descending
+
+    @classmethod
+    def from_ddl(cls, ddl: str) -> "TableSchema":
+        """Parse a CREATE TABLE statement."""
+        match = re.match(
+            r"CREATE TABLE (?:IF NOT EXISTS )?(\w+) \((.*?)\)"
+            r"(?: WITH CLUSTERING ORDER BY \((.*)\))?$",
+            _normalize(ddl), re.IGNORECASE
+        )
+        if not match:
+            raise ValueError(f"Unsupported table definition: {ddl.strip()[:80]}")
+        name, body, order = match.groups()
+
+        columns, primary_key = {}, None
+        for part in _split_top_level(body):
+            if part.upper().startswith("PRIMARY KEY"):
+                primary_key = part[part.index("(") + 1:part.rindex(")")]
+            else:
+                column, column_type = part.split(" ", 1)
+                columns[column] = column_type.strip().lower()
+
+        key_parts = _split_top_level(primary_key)
+        partition_key = [c.strip() for c in key_parts[0].strip("()").split(",")]
+        clustering = key_parts[1:]
+
+        descending = set()
+        for item in _split_top_level(order or ""):
+            column, direction = item.split()
+            if direction.upper() == "DESC":
+                descending.add(column)
+
+        return cls(name, columns, partition_key, clustering, descending)
+
+    def coerce(self, column: str, value: Any) -> Any:
+        """Normalize a bound value the way Cassandra stores it."""
+        if value is None:
+            return None
+        column_type = self.columns.get(column, "")
+        if column_type == "timestamp" and isinstance(value, datetime):
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            # Cassandra timestamps have millisecond precision
+            return value.replace(microsecond=value.microsecond // 1000 * 1000)
+        if column_type.startswith("set<") and not value:
+            return None
+        if isinstance(value, list) and column_type.startswith("frozen<"):
+            return tuple(value)
+        return value
+
+    def sort_value(self, column: str, value: Any) -> Any:
+        return _Desc(value) if column in self.descending else value
+
+    def sort_key(self, row: Dict[str, Any]) -> tuple:
+        return tuple(self.sort_value(c, row[c]) for c in self.clustering)
+
+    def partition_of(self, row: Dict[str, Any]) -> tuple:
+        return tuple(row[c] for c in self.partition_key)
+
+
+class Partition:
+    """Rows of one partition, sorted by clustering key."""
+
+    __slots__ = ("keys", "rows", "write_times")
+
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.rows: Dict[tuple, Dict[str, Any]] = {}
+        self.write_times: Dict[tuple, int] = {}
+
+    def upsert(self, sort_key: tuple, values: Dict[str, Any], write_time: Optional[int] = None) -> None:
+        """Write values; like Cassandra, a write older than the row's last write is discarded."""
+        write_time = write_time if write_time is not None else _now_micros()
+        if write_time < self.write_times.get(sort_key, write_time):
+            return
+        self.write_times[sort_key] = write_time
+        row = self.rows.get(sort_key)
+        if row is None:
+            bisect.insort(self.keys, sort_key)
+            self.rows[sort_key] = dict(values)
+        else:
+            row.update(values)
+
+    def delete(self, sort_key: tuple) -> None:
+        if self.rows.pop(sort_key, None) is not None:
+            del self.keys[bisect.bisect_left(self.keys, sort_key)]
+            del self.write_times[sort_key]
+
+
+class Condition:
+    __slots__ = ("column", "op")
+
+    def __init__(self, column: str, op: str):
+        self.column = column
+        self.op = op
+
+
+def _parse_where(where: Optional[str]) -> List[Condition]:
+    if not where:
+        return []
+    conditions = []
+    for clause in re.split(r" AND ", where, flags=re.IGNORECASE):
+        match = re.match(r"(\w+) ?(=|<=|>=|<|>| IN) ?\?$", clause.strip(), re.IGNORECASE)
+        if not match:
+            raise ValueError(f"Unsupported WHERE clause: {clause}")
+        conditions.append(Condition(match.group(1), match.group(2).strip().upper()))
+    return conditions
+
+
+class Statement:
+    """A parsed statement bound to its table schema."""
+
+    def __init__(self, kind: str, schema: TableSchema, **parts):
+        self.kind = kind
+        self.schema = schema
+        self.columns: Optional[List[str]] = parts.get("columns")
+        self.where: List[Condition] = parts.get("where", [])
+        self.order: Optional[Tuple[str, bool]] = parts.get("order")
+        self.limit: Optional[str] = parts.get("limit")
+        self.per_partition_limit: Optional[str] = parts.get("per_partition_limit")
+        self.assignments: List[Tuple[str, str]] = parts.get("assignments", [])
+        self.if_not_exists: bool = parts.get("if_not_exists", False)
+        self.using_timestamp: bool = parts.get("using_timestamp", False)
+        # Column of an UPDATE ... IF column = ? compare-and-set
+        self.if_column: Optional[str] = parts.get("if_column")
+
+
+def parse_statement(cql: str, tables: Dict[str, TableSchema]) -> Statement:
+    """Parse the supported CQL subset into a Statement."""
+    text = _normalize(cql)
+
+    match = re.match(
+        r"SELECT (.+?) FROM (\w+)(?: WHERE (.+?))?(?: ORDER BY (\w+)(?: (ASC|DESC))?)?"
+        r"(?: PER PARTITION LIMIT (\?|\d+))?(?: LIMIT (\?|\d+))?(?: ALLOW FILTERING)?$",
+        text, re.IGNORECASE
+    )
+    if match:
+        columns, table, where, order_column, order_dir, per_partition_limit, limit = match.groups()
+        schema = tables[table]
+        order = None
+        if order_column:
+            order = (order_column, (order_dir or "ASC").upper() == "DESC")
+        return Statement(
+            "select", schema,
+            columns=None if columns.strip() == "*" else [c.strip() for c in columns.split(",")],
+            where=_parse_where(where), order=order, limit=limit, per_partition_limit=per_partition_limit
+        )
+
+    match = re.match(
+        r"INSERT INTO (\w+) ?\((.+?)\) VALUES ?\((.+?)\)( IF NOT EXISTS)?( USING TIMESTAMP \?)?$",
+        text, re.IGNORECASE
+    )
+    if match:
+        table, columns, _, if_not_exists, using_timestamp = match.groups()
+        return Statement(
+            "insert", tables[table],
+            columns=[c.strip() for c in columns.split(",")],
+            if_not_exists=bool(if_not_exists),
+            using_timestamp=bool(using_timestamp)
+        )
+
+    match = re.match(r"UPDATE (\w+) SET (.+?) WHERE (.+?)(?: IF (\w+) ?= ?\?)?$", text, re.IGNORECASE)
+    if match:
+        table, assignments, where, if_column = match.groups()
+        parsed = []
+        for assignment in _split_top_level(assignments):
+            counter = re.match(r"(\w+) ?= ?(\w+) ?([+-]) ?\?$", assignment)
+            plain = re.match(r"(\w+) ?= ?\?$", assignment)
+            if counter and counter.group(1) == counter.group(2):
+                parsed.append((counter.group(1), counter.group(3)))
+            elif plain:
+                parsed.append((plain.group(1), "="))
+            else:
+                raise ValueError(f"Unsupported assignment: {assignment}")
+        return Statement(
+            "update", tables[table], assignments=parsed, where=_parse_where(where), if_column=if_column
+        )
+
+    match = re.match(r"DELETE FROM (\w+) WHERE (.+)$", text, re.IGNORECASE)
+    if match:
+        table, where = match.groups()
+        return Statement("delete", tables[table], where=_parse_where(where))
+
+    raise ValueError(f"Unsupported statement: {text[:80]}")
+
+
+class MemoryResultSet:
+    """Result of a statement: one page of rows plus the state to resume from."""
+
+    def __init__(self, rows: List[Dict[str, Any]], paging_state: Optional[bytes] = None):
+        self.current_rows = rows
+        self.paging_state = paging_state
+
+    @property
+    def has_more_pages(self) -> bool:
+        return self.paging_state is not None
+
+    def one(self) -> Optional[Dict[str, Any]]:
+        return self.current_rows[0] if self.current_rows else None
+
+    def __iter__(self):
+        return iter(self.current_rows)
+
+
+_FLIP = {"<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+_COMPARE = {
+    "=": lambda a, b: a == b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "IN": lambda a, b: a in b,
+}
+
+
+def _matches(row: Dict[str, Any], bound: Dict[str, List[Tuple[str, Any]]]) -> bool:
+    for column, restrictions in bound.items():
+        value = row.get(column)
+        for op, expected in restrictions:
+            if value is None or not _COMPARE[op](value, expected):
+                return False
+    return True
+
+
+class MemoryBackend(StorageBackend):
+    """StorageBackend that keeps every table in process memory."""
+
+    name = "memory"
+
+    def __init__(self, tables: Optional[List[str]] = None):
+        self.tables: Dict[str, TableSchema] = {}
+        for ddl in tables or TABLES + BUCKETED_MESSAGE_TABLES:
+            schema = TableSchema.from_ddl(ddl)
+            self.tables[schema.name] = schema
+        self.data: Dict[str, Dict[tuple, Partition]] = {name: {} for name in self.tables}
+        self._statements: Dict[str, Statement] = {}
+        self._statement_text: Dict[str, str] = {}
+        self._paging_states = LRUCache(PAGING_STATE_CACHE_SIZE, PAGING_STATE_TTL)
+        self._lock = threading.RLock()
+        # Rows visited by SELECTs, including rows a filter then rejected: the
+        # work Cassandra would do reading them
+        self.rows_read = 0
+
+    def register_statements(self, statements: Dict[str, str]) -> None:
+        for name, query in statements.items():
+            self._statements[name] = parse_statement(query, self.tables)
+            self._statement_text[name] = query
+
+    def get_statement_text(self, name: str) -> Optional[str]:
+        return self._statement_text.get(name)
+
+    def prepare_statements(self) -> None:
+        # Statements are parsed when registered
+        logger.info(f"In-memory backend ready with {len(self._statements)} statements")
+
+    def close(self) -> None:
+        pass
+
+    def execute_prepared(
+        self,
+        name: str,
+        params: Optional[tuple] = None,
+        fetch_size: Optional[int] = None,
+        paging_state: Optional[bytes] = None
+    ) -> MemoryResultSet:
+        with metrics.time_query(name), self._lock:
+            return self._execute(name, params, fetch_size, paging_state)
+
+    async def execute_prepared_aio(
+        self,
+        name: str,
+        params: Optional[tuple] = None,
+        fetch_size: Optional[int] = None,
+        paging_state: Optional[bytes] = None
+    ) -> MemoryResultSet:
+        return self.execute_prepared(name, params, fetch_size, paging_state)
+
+    async def execute_batch_aio(self, statements: List[Tuple[str, tuple]]) -> MemoryResultSet:
+        # Recorded as one query, like the single round trip of a Cassandra batch
+        names = "+".join(sorted({name for name, _ in statements}))
+        with metrics.time_query(f"batch:{names}"), self._lock:
+            for name, params in statements:
+                self._execute(name, params)
+        return MemoryResultSet([])
+
+    def execute_concurrent_prepared(
+        self,
+        name: str,
+        params_list: List[tuple],
+        concurrency: int = 100
+    ) -> List[Tuple[bool, Any]]:
+        results = []
+        for params in params_list:
+            try:
+                results.append((True, self.execute_prepared(name, params)))
+            except Exception as e:
+                results.append((False, e))
+        return results
+
+    # Statement execution
+
+    def _execute(self, name: str, params, fetch_size=None, paging_state=None) -> MemoryResultSet:
+        statement = self._statements[name]
+        values = list(params or ())
+        if statement.kind == "select":
+            return self._select(statement, values, fetch_size, paging_state)
+        if statement.kind == "insert":
+            return self._insert(statement, values)
+        if statement.kind == "update":
+            return self._update(statement, values)
+        return self._delete(statement, values)
+
+    def _bind(self, statement: Statement, values: List[Any]) -> Dict[str, List[Tuple[str, Any]]]:
+        """Consume WHERE values in order and group them by column."""
+        bound: Dict[str, List[Tuple[str, Any]]] = {}
+        for condition in statement.where:
+            value = values.pop(0)
+            if condition.op == "IN":
+                value = [statement.schema.coerce(condition.column, v) for v in value]
+            else:
+                value = statement.schema.coerce(condition.column, value)
+            bound.setdefault(condition.column, []).append((condition.op, value))
+        return bound
+
+    def _partition_keys(self, schema: TableSchema, bound) -> Optional[List[tuple]]:
+        """Partition keys addressed by the WHERE clause, or None for a full scan."""
+        if not any(c in bound for c in schema.partition_key):
+            return None
+        choices = []
+        for column in schema.partition_key:
+            restrictions = bound.get(column)
+            if not restrictions or restrictions[0][0] not in ("=", "IN"):
+                raise ValueError(f"{schema.name}: partition key column {column} must be restricted by = or IN")
+            op, value = restrictions[0]
+            choices.append(value if op == "IN" else [value])
+        return [tuple(key) for key in itertools.product(*choices)]
+
+    def _slice(self, schema: TableSchema, partition: Partition, bound) -> Tuple[int, int]:
+        """Index range of the partition's sorted keys matching the clustering restrictions."""
+        lo, hi = 0, len(partition.keys)
+        prefix: List[Any] = []
+        for position, column in enumerate(schema.clustering):
+            restrictions = bound.get(column)
+            if not restrictions:
+                break
+            depth = position + 1
+            key = (lambda k, d=depth: k[:d])
+            if restrictions[0][0] == "=":
+                prefix.append(schema.sort_value(column, restrictions[0][1]))
+                target = tuple(prefix)
+                lo = max(lo, bisect.bisect_left(partition.keys, target, key=key))
+                hi = min(hi, bisect.bisect_right(partition.keys, target, key=key))
+                continue
+            for op, value in restrictions:
+                if column in schema.descending:
+                    op = _FLIP[op]
+                target = tuple(prefix) + (schema.sort_value(column, value),)
+                if op == ">":
+                    lo = max(lo, bisect.bisect_right(partition.keys, target, lo, hi, key=key))
+                elif op == ">=":
+                    lo = max(lo, bisect.bisect_left(partition.keys, target, lo, hi, key=key))
+                elif op == "<":
+                    hi = min(hi, bisect.bisect_left(partition.keys, target, lo, hi, key=key))
+                elif op == "<=":
+                    hi = min(hi, bisect.bisect_right(partition.keys, target, lo, hi, key=key))
+            break
+        return lo, hi
+
+    def _iter_rows(
+        self, statement: Statement, bound, resume, per_partition_limit: Optional[int] = None
+    ) -> Iterator[Tuple[tuple, tuple, Dict[str, Any]]]:
+        """
+        Yield (partition key, sort key, row) in query order, after the resume
+        position, and at most per_partition_limit rows of each partition.
+        """
+        schema = statement.schema
+        partitions = self.data[schema.name]
+        keys = self._partition_keys(schema, bound)
+        if keys is None:
+            keys = list(partitions)
+
+        reverse = False
+        if statement.order:
+            column, descending = statement.order
+            reverse = descending != (column in schema.descending)
+
+        if resume is not None:
+            resume_partition, resume_key = resume
+            if resume_partition in keys:
+                keys = keys[keys.index(resume_partition):]
+
+        for partition_key in keys:
+            partition = partitions.get(partition_key)
+            if partition is None:
+                continue
+            lo, hi = self._slice(schema, partition, bound)
+            if resume is not None and partition_key == resume[0]:
+                if reverse:
+                    hi = min(hi, bisect.bisect_left(partition.keys, resume[1], lo, hi))
+                else:
+                    lo = max(lo, bisect.bisect_right(partition.keys, resume[1], lo, hi))
+            indexes = range(hi - 1, lo - 1, -1) if reverse else range(lo, hi)
+            matched = 0
+            for i in indexes:
+                if per_partition_limit is not None and matched >= per_partition_limit:
+                    break
+                self.rows_read += 1
+                sort_key = partition.keys[i]
+                row = partition.rows[sort_key]
+                # Restrictions the key slice cannot serve (ALLOW FILTERING) are checked per row
+                if _matches(row, bound):
+                    matched += 1
+                    yield partition_key, sort_key, row
+
+    def _select(self, statement: Statement, values: List[Any], fetch_size, paging_state) -> MemoryResultSet:
+        bound = self._bind(statement, values)
+        per_partition_limit = None
+        if statement.per_partition_limit == "?":
+            per_partition_limit = values.pop(0)
+        elif statement.per_partition_limit:
+            per_partition_limit = int(statement.per_partition_limit)
+        limit = None
+        if statement.limit == "?":
+            limit = values.pop(0)
+        elif statement.limit:
+            limit = int(statement.limit)
+
+        resume, returned = None, 0
+        if paging_state:
+            state = self._paging_states.get(paging_state)
+            if state is None:
+                raise InvalidPagingStateError("Invalid paging state")
+            resume, returned = state
+
+        remaining = None if limit is None else max(limit - returned, 0)
+        page_size = fetch_size if fetch_size and fetch_size > 0 else None
+        if remaining is not None:
+            page_size = remaining if page_size is None else min(page_size, remaining)
+
+        columns = statement.columns or list(statement.schema.columns)
+        rows, last, more = [], None, False
+        # The per-partition limit is not carried across pages; the models only use it unpaged
+        for partition_key, sort_key, row in self._iter_rows(statement, bound, resume, per_partition_limit):
+            if page_size is not None and len(rows) >= page_size:
+                more = True
+                break
+            rows.append({c: row.get(c) for c in columns})
+            last = (partition_key, sort_key)
+
+        next_state = None
+        if more and (remaining is None or len(rows) < remaining):
+            next_state = uuid.uuid4().bytes
+            self._paging_states.set(next_state, (last, returned + len(rows)))
+        return MemoryResultSet(rows, next_state)
+
+    def _row_key(self, schema: TableSchema, row: Dict[str, Any]) -> Tuple[tuple, tuple]:
+        missing = [c for c in schema.partition_key + schema.clustering if row.get(c) is None]
+        if missing:
+            raise ValueError(f"{schema.name}: missing primary key column {missing[0]}")
+        return schema.partition_of(row), schema.sort_key(row)
+
+    def _insert(self, statement: Statement, values: List[Any]) -> MemoryResultSet:
+        schema = statement.schema
+        write_time = values[len(statement.columns)] if statement.using_timestamp else None
+        row = {c: schema.coerce(c, v) for c, v in zip(statement.columns, values)}
+        partition_key, sort_key = self._row_key(schema, row)
+        partitions = self.data[schema.name]
+
+        if statement.if_not_exists:
+            partition = partitions.get(partition_key)
+            existing = partition.rows.get(sort_key) if partition else None
+            if existing is not None:
+                return MemoryResultSet([{"[applied]": False, **existing}])
+
+        partitions.setdefault(partition_key, Partition()).upsert(sort_key, row, write_time)
+        return MemoryResultSet([{"[applied]": True}] if statement.if_not_exists else [])
+
+    def _update(self, statement: Statement, values: List[Any]) -> MemoryResultSet:
+        schema = statement.schema
+        assigned = [(column, op, values.pop(0)) for column, op in statement.assignments]
+        expected = schema.coerce(statement.if_column, values.pop()) if statement.if_column else None
+        bound = self._bind(statement, values)
+        key_row = {column: restrictions[0][1] for column, restrictions in bound.items()}
+        partition_key, sort_key = self._row_key(schema, key_row)
+
+        partition = self.data[schema.name].get(partition_key)
+        current = partition.rows.get(sort_key) if partition else None
+        if statement.if_column:
+            # Like Cassandra, a failed condition returns the current value (none for a missing row)
+            if current is None:
+                return MemoryResultSet([{"[applied]": False}])
+            if current.get(statement.if_column) != expected:
+                return MemoryResultSet([{"[applied]": False, statement.if_column: current.get(statement.if_column)}])
+
+        partition = self.data[schema.name].setdefault(partition_key, Partition())
+        current = current or {}
+        updates = dict(key_row)
+        for column, op, value in assigned:
+            if op == "=":
+                updates[column] = schema.coerce(column, value)
+            else:
+                delta = value if op == "+" else -value
+                updates[column] = (current.get(column) or 0) + delta
+        partition.upsert(sort_key, updates)
+        return MemoryResultSet([{"[applied]": True}] if statement.if_column else [])
+
+    def _delete(self, statement: Statement, values: List[Any]) -> MemoryResultSet:
+        schema = statement.schema
+        bound = self._bind(statement, values)
+        partitions = self.data[schema.name]
+        for partition_key in self._partition_keys(schema, bound) or []:
+            partition = partitions.get(partition_key)
+            if partition is None:
+                continue
+            if not any(c in bound for c in schema.clustering):
+                del partitions[partition_key]
+                continue
+            lo, hi = self._slice(schema, partition, bound)
+            for sort_key in partition.keys[lo:hi]:
+                partition.delete(sort_key)
+            if not partition.rows:
+                del partitions[partition_key]
+        return MemoryResultSet([])
@@ -0,0 +1,264 @@
+"""
+In-process latency metrics, exposed in Prometheus text format at GET /metrics.
+
+Every named query run by the storage backend and every HTTP route records a
+count, an error count and a latency histogram. Queries are also attributed
+to the request (or other block) being tracked in the current context, see
+track_queries().
+"""
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    """Cumulative latency histogram with a running sum and error count."""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "errors")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, observations at or below it) per bucket."""
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    return ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs)
+
+
+class LatencyMetric:
+    """A family of histograms keyed by label values, plus a matching error counter."""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str]):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], Histogram] = {}
+
+    def observe(self, label_values: Tuple[str, ...], seconds: float, error: bool = False) -> None:
+        with self._lock:
+            histogram = self._series.get(label_values)
+            if histogram is None:
+                histogram = self._series[label_values] = Histogram()
+            histogram.observe(seconds, error)
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        """Time the enclosed block; an exception counts as an error and is re-raised."""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(label_values, time.perf_counter() - start, error)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict[str, float]]:
+        """Count, error count and total seconds per label set."""
+        with self._lock:
+            return {
+                labels: {"count": h.count, "errors": h.errors, "sum": h.sum}
+                for labels, h in self._series.items()
+            }
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, h.cumulative(), h.count, h.sum, h.errors) for labels, h in self._series.items()]
+
+        duration = f"{self.name}_duration_seconds"
+        errors = f"{self.name}_errors_total"
+        lines = [
+            f"# HELP {duration} {self.description} latency in seconds.",
+            f"# TYPE {duration} histogram",
+        ]
+        for label_values, buckets, count, total, _ in sorted(series):
+            pairs = list(zip(self.label_names, label_values))
+            for bound, cumulative in buckets:
+                lines.append(f"{duration}_bucket{{{_labels(pairs + [('le', repr(bound))])}}} {cumulative}")
+            lines.append(f"{duration}_bucket{{{_labels(pairs + [('le', '+Inf')])}}} {count}")
+            lines.append(f"{duration}_sum{{{_labels(pairs)}}} {total}")
+            lines.append(f"{duration}_count{{{_labels(pairs)}}} {count}")
+
+        lines.append(f"# HELP {errors} {self.description} errors.")
+        lines.append(f"# TYPE {errors} counter")
+        for label_values, _, _, _, error_count in sorted(series):
+            lines.append(f"{errors}{{{_labels(list(zip(self.label_names, label_values)))}}} {error_count}")
+        return lines
+
+
+class RequestStats:
+    """
+    Storage round trips and DB time of one tracked block, usually an HTTP request.
+
+    DB time is the sum of query latencies, so concurrent queries can add up to
+    more than the block's wall time. Nested blocks also count towards every
+    enclosing block.
+    """
+
+    __slots__ = ("queries", "db_time", "statements", "parent")
+
+    def __init__(self, parent: Optional["RequestStats"] = None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: Counter = Counter()
+        self.parent = parent
+
+    @property
+    def db_time_ms(self) -> float:
+        return self.db_time * 1000
+
+    def record(self, name: str, seconds: float) -> None:
+        stats = self
+        while stats is not None:
+            stats.queries += 1
+            stats.db_time += seconds
+            stats.statements[name] += 1
+            stats = stats.parent
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[RequestStats]:
+    """
+    Attribute storage queries issued in the enclosed block (including tasks it
+    starts) to a new RequestStats.
+    """
+    stats = RequestStats(_request_stats.get())
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+class MetricsRegistry:
+    """The application's query and route metrics."""
+
+    def __init__(self):
+        self.queries = LatencyMetric("messenger_query", "Storage query", ("query",))
+        self.requests = LatencyMetric("messenger_http_request", "HTTP request", ("method", "route"))
+        self._caches: Dict[str, object] = {}
+        self._values: Dict[str, Tuple[str, str, Callable[[], float]]] = {}
+        self._histograms: Dict[str, Tuple[str, Histogram]] = {}
+        self._latencies: List[LatencyMetric] = []
+
+    def register_cache(self, name: str, cache) -> None:
+        """Export an LRUCache's size and hit/miss/eviction counters under a name."""
+        self._caches[name] = cache
+
+    def register_value(self, name: str, kind: str, description: str, read: Callable[[], float]) -> None:
+        """Export an unlabelled counter or gauge whose value is read at scrape time."""
+        self._values[name] = (kind, description, read)
+
+    def register_latency(self, metric: LatencyMetric) -> LatencyMetric:
+        """Export another labelled latency family next to the query and route metrics."""
+        self._latencies.append(metric)
+        return metric
+
+    def register_histogram(self, name: str, description: str, histogram: Histogram) -> None:
+        """Export an unlabelled histogram, e.g. of sizes rather than latencies, under its full name."""
+        self._histograms[name] = (description, histogram)
+
+    def record_query(self, name: str, seconds: float, error: bool = False) -> None:
+        """Record one execution of the named query."""
+        self.queries.observe((name,), seconds, error)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.record(name, seconds)
+
+    @contextmanager
+    def time_query(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one execution of the named query."""
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record_query(name, time.perf_counter() - start, error)
+
+    def _render_caches(self) -> List[str]:
+        stats = {name: cache.stats() for name, cache in sorted(self._caches.items())}
+        lines = []
+        for field, metric, kind, description in (
+            ("hits", "messenger_cache_hits_total", "counter", "Cache lookups answered from the cache."),
+            ("misses", "messenger_cache_misses_total", "counter", "Cache lookups that fell through to storage."),
+            ("evictions", "messenger_cache_evictions_total", "counter", "Entries evicted to stay within the size bound."),
+            ("size", "messenger_cache_entries", "gauge", "Entries currently cached."),
+        ):
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, values in stats.items():
+                lines.append(f"{metric}{{{_labels([('cache', name)])}}} {values[field]}")
+        return lines
+
+    def _render_values(self) -> List[str]:
+        lines = []
+        for name, (kind, description, read) in sorted(self._values.items()):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {read()}")
+        return lines
+
+    def _render_histograms(self) -> List[str]:
+        lines = []
+        for name, (description, histogram) in sorted(self._histograms.items()):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} histogram")
+            for bound, cumulative in histogram.cumulative():
+                lines.append(f"{name}_bucket{{{_labels([('le', repr(bound))])}}} {cumulative}")
+            lines.append(f"{name}_bucket{{{_labels([('le', '+Inf')])}}} {histogram.count}")
+            lines.append(f"{name}_sum {histogram.sum}")
+            lines.append(f"{name}_count {histogram.count}")
+        return lines
+
+    def render(self) -> str:
+        """All metrics in Prometheus text exposition format."""
+        return "\n".join(
+            self.queries.render() + self.requests.render()
+            + [line for metric in self._latencies for line in metric.render()]
+            + self._render_caches()
+            + self._render_values() + self._render_histograms()
+        ) + "\n"
+
+
+metrics = MetricsRegistry()
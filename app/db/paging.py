@@ -0,0 +1,178 @@
+"""
+Opaque pagination cursors backed by Cassandra paging state, plus the
+timestamp cursors of the delta-sync endpoint.
+
+Page cursors carry a format version and an HMAC over the query they belong
+to (the "scope") and their contents, so a forged cursor, or one taken from
+another query, is rejected as InvalidCursorError before it reaches storage.
+"""
+import os
+import hmac
+import base64
+import struct
+import binascii
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+# Key of the page cursor signatures. Set the same value on every worker;
+# without it each process signs with a random key of its own, and cursors
+# stop working across workers and restarts.
+CURSOR_SECRET = os.getenv("CURSOR_SECRET", "").encode("utf-8") or os.urandom(32)
+# Bytes of HMAC-SHA256 kept in a cursor
+_SIGNATURE_SIZE = 16
+
+# Paging state cursor header: format version
+_PAGE_CURSOR_VERSION = 1
+
+# Bucketed cursor header: format version, bucket, rows to skip
+_BUCKET_CURSOR = struct.Struct(">Bii")
+_BUCKET_CURSOR_VERSION = 1
+
+# Sync cursor: format version, then milliseconds since the epoch (UTC) of the
+# time reads restart after and of the newest message delivered
+_SYNC_CURSOR = struct.Struct(">Bqq")
+_SYNC_CURSOR_VERSION = 3
+_EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor that was not issued by the API."""
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(cursor: str) -> bytes:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.b64decode(padded.encode("ascii"), altchars=b"-_", validate=True)
+    except (binascii.Error, ValueError, UnicodeEncodeError):
+        raise InvalidCursorError("Invalid pagination cursor")
+
+
+def _signature(scope: str, payload: bytes) -> bytes:
+    message = scope.encode("utf-8") + b"\0" + payload
+    return hmac.new(CURSOR_SECRET, message, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+
+
+def _seal(scope: str, payload: bytes) -> str:
+    """Sign a cursor payload for the query `scope` and encode it as a string."""
+    return _b64encode(payload + _signature(scope, payload))
+
+
+def _unseal(scope: str, cursor: str) -> bytes:
+    """Check and strip the signature of a cursor made by _seal for the same scope."""
+    raw = _b64decode(cursor)
+    payload, signature = raw[:-_SIGNATURE_SIZE], raw[-_SIGNATURE_SIZE:]
+    if not payload or not hmac.compare_digest(signature, _signature(scope, payload)):
+        raise InvalidCursorError("Invalid pagination cursor")
+    return payload
+
+
+def encode_cursor(paging_state: Optional[bytes], scope: str) -> Optional[str]:
+    """
+    Encode a driver paging state as a URL-safe cursor string.
+
+    Args:
+        paging_state: The paging state of a result set, or None on the last page
+        scope: Identifies the query (statement and parameters) the state belongs to
+
+    Returns:
+        The cursor, or None when there are no more pages
+    """
+    if not paging_state:
+        return None
+    return _seal(scope, bytes([_PAGE_CURSOR_VERSION]) + paging_state)
+
+
+def decode_cursor(cursor: Optional[str], scope: str) -> Optional[bytes]:
+    """
+    Decode a cursor produced by encode_cursor back into a paging state.
+
+    Args:
+        cursor: The cursor string sent by the client
+        scope: The scope the cursor must have been issued for
+
+    Returns:
+        The paging state, or None if no cursor was given
+
+    Raises:
+        InvalidCursorError: If the cursor was not issued for this scope
+    """
+    if not cursor:
+        return None
+    payload = _unseal(scope, cursor)
+    if payload[0] != _PAGE_CURSOR_VERSION or len(payload) < 2:
+        raise InvalidCursorError("Invalid pagination cursor")
+    return payload[1:]
+
+
+def encode_bucket_cursor(bucket: int, skip: int, paging_state: Optional[bytes], scope: str) -> str:
+    """
+    Encode a position in a bucketed partition walk as a cursor string.
+
+    Args:
+        bucket: The bucket to resume in
+        skip: Rows to drop from the first page read at paging_state
+        paging_state: Paging state within the bucket, or None for its start
+        scope: Identifies the walk (conversation and bounds) the position belongs to
+    """
+    header = _BUCKET_CURSOR.pack(_BUCKET_CURSOR_VERSION, bucket, skip)
+    return _seal(scope, header + (paging_state or b""))
+
+
+def decode_bucket_cursor(cursor: Optional[str], scope: str) -> Optional[Tuple[int, int, Optional[bytes]]]:
+    """
+    Decode a cursor produced by encode_bucket_cursor for the same scope.
+
+    Returns:
+        (bucket, skip, paging_state), or None if no cursor was given
+    """
+    if not cursor:
+        return None
+    raw = _unseal(scope, cursor)
+    if len(raw) < _BUCKET_CURSOR.size or raw[0] != _BUCKET_CURSOR_VERSION:
+        raise InvalidCursorError("Invalid pagination cursor")
+    _, bucket, skip = _BUCKET_CURSOR.unpack_from(raw)
+    if skip < 0:
+        raise InvalidCursorError("Invalid pagination cursor")
+    return bucket, skip, raw[_BUCKET_CURSOR.size:] or None
+
+
+def encode_sync_cursor(delivered: datetime, reread_after: Optional[datetime] = None) -> str:
+    """
+    Encode a delta-sync cursor string.
+
+    Args:
+        delivered: Naive UTC time of the newest message already delivered
+        reread_after: Naive UTC time the next sync reads after; defaults to `delivered`
+    """
+    if reread_after is None:
+        reread_after = delivered
+    return _b64encode(_SYNC_CURSOR.pack(
+        _SYNC_CURSOR_VERSION,
+        (reread_after - _EPOCH) // timedelta(milliseconds=1),
+        (delivered - _EPOCH) // timedelta(milliseconds=1)
+    ))
+
+
+def decode_sync_cursor(cursor: str) -> Tuple[datetime, datetime]:
+    """
+    Decode a cursor produced by encode_sync_cursor.
+
+    Returns:
+        The naive UTC times the next sync reads after and of the newest message delivered
+    """
+    raw = _b64decode(cursor)
+    if len(raw) == _SYNC_CURSOR.size and raw[0] == _SYNC_CURSOR_VERSION:
+        _, reread_millis, delivered_millis = _SYNC_CURSOR.unpack(raw)
+    else:
+        raise InvalidCursorError("Invalid sync cursor")
+    if reread_millis > delivered_millis:
+        raise InvalidCursorError("Invalid sync cursor")
+    try:
+        return _EPOCH + timedelta(milliseconds=reread_millis), _EPOCH + timedelta(milliseconds=delivered_millis)
+    except OverflowError:
+        raise InvalidCursorError("Invalid sync cursor")
@@ -0,0 +1,81 @@
+"""
+Query budget guard for catching fan-out regressions before deploy.
+
+Wrap an in-process call to an endpoint or model (for example an httpx
+request over ASGITransport, which runs the app in the caller's task) and
+declare how many storage round trips it may take:
+
+    with query_budget(max_queries=3):
+        await client.get("/api/conversations/user/1")
+
+Leaving the block raises QueryBudgetExceeded when the budget was exceeded
+or when any statement used ALLOW FILTERING.
+"""
+import re
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.db.metrics import RequestStats, track_queries
+from app.db.storage import storage
+
+_ALLOW_FILTERING = re.compile(r"\bALLOW\s+FILTERING\b", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block issues more queries than budgeted or a filtering scan."""
+
+
+def filtering_statements(stats: RequestStats) -> list:
+    """Names of the statements issued in stats that use ALLOW FILTERING."""
+    names = []
+    for name in stats.statements:
+        text = storage.get_statement_text(name)
+        if text and _ALLOW_FILTERING.search(text):
+            names.append(name)
+    return sorted(names)
+
+
+def check_query_budget(
+    stats: RequestStats,
+    max_queries: int,
+    max_db_time_ms: Optional[float] = None,
+    allow_filtering: bool = False
+) -> None:
+    """
+    Raise QueryBudgetExceeded if stats break the budget.
+
+    Args:
+        stats: Queries recorded for the block under test
+        max_queries: Maximum storage round trips
+        max_db_time_ms: Maximum summed query latency, or None for no limit
+        allow_filtering: Whether ALLOW FILTERING statements are permitted
+    """
+    problems = []
+    if stats.queries > max_queries:
+        issued = ", ".join(f"{name} x{count}" for name, count in stats.statements.most_common())
+        problems.append(f"{stats.queries} queries over a budget of {max_queries} ({issued})")
+    if max_db_time_ms is not None and stats.db_time_ms > max_db_time_ms:
+        problems.append(f"{stats.db_time_ms:.1f}ms of DB time over a budget of {max_db_time_ms}ms")
+    if not allow_filtering:
+        filtering = filtering_statements(stats)
+        if filtering:
+            problems.append(f"ALLOW FILTERING statements issued: {', '.join(filtering)}")
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
+
+
+@contextmanager
+def query_budget(
+    max_queries: int,
+    max_db_time_ms: Optional[float] = None,
+    allow_filtering: bool = False
+) -> Iterator[RequestStats]:
+    """
+    Track the queries issued in the enclosed block and check them on exit.
+
+    Yields:
+        The RequestStats being recorded
+    """
+    with track_queries() as stats:
+        yield stats
+    check_query_budget(stats, max_queries, max_db_time_ms, allow_filtering)
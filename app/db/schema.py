@@ -0,0 +1,168 @@
+"""
+CQL schema for the Messenger keyspace.
+
+Used by scripts/setup_db.py to create the tables and by the in-memory storage
+backend to lay out its tables the same way.
+
+MESSAGE_BUCKETING selects how messages are partitioned:
+- "none" (default): one messages_by_conversation partition per conversation
+- "day": one partition per conversation per UTC day, in
+  messages_by_conversation_bucket, so long-lived conversations do not grow
+  unbounded partitions. scripts/migrate_message_buckets.py copies existing
+  messages into this layout.
+"""
+import os
+from datetime import datetime, timezone
+
+MESSAGE_BUCKETING = os.getenv("MESSAGE_BUCKETING", "none").lower()
+if MESSAGE_BUCKETING not in ("none", "day"):
+    raise ValueError(f"Unknown MESSAGE_BUCKETING {MESSAGE_BUCKETING!r}; expected 'none' or 'day'")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def day_bucket(timestamp: datetime) -> int:
+    """Bucket number (days since the Unix epoch, UTC) of a message timestamp."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - _EPOCH).days
+
+
+TABLES = [
+    """
+        CREATE TABLE IF NOT EXISTS messages_by_conversation (
+            conversation_id UUID,
+            timestamp TIMESTAMP,
+            message_id UUID,
+            sender_id UUID,
+            receiver_id UUID,
+            content TEXT,
+            PRIMARY KEY ((conversation_id), timestamp, message_id)
+        ) WITH CLUSTERING ORDER BY (timestamp DESC, message_id ASC);
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS conversations_by_user (
+            user_id UUID,
+            conversation_id UUID,
+            last_updated_at TIMESTAMP,
+            last_message TEXT,
+            other_participants SET<UUID>,
+            PRIMARY KEY ((user_id), last_updated_at, conversation_id)
+        ) WITH CLUSTERING ORDER BY (last_updated_at DESC, conversation_id ASC);
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS conversation_participants (
+            conversation_id UUID,
+            user_id UUID,
+            joined_at TIMESTAMP,
+            PRIMARY KEY ((conversation_id), user_id)
+        );
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS user_details (
+            user_id UUID,
+            user_index INT,
+            username TEXT,
+            full_name TEXT,
+            email TEXT,
+            PRIMARY KEY (user_id)
+        );
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS conversation_metadata (
+            conversation_id UUID,
+            conversation_index INT,
+            PRIMARY KEY (conversation_id)
+        );
+    """,
+    # Partition-keyed lookup tables for index -> UUID, so resolving an API id
+    # is a single-partition read instead of a secondary-index fan-out.
+    """
+        CREATE TABLE IF NOT EXISTS users_by_index (
+            user_index INT,
+            user_id UUID,
+            PRIMARY KEY (user_index)
+        );
+    """,
+    """
+        CREATE TABLE IF NOT EXISTS conversations_by_index (
+            conversation_index INT,
+            conversation_id UUID,
+            PRIMARY KEY (conversation_index)
+        );
+    """,
+    # Sorted participant set -> conversation, so sends between the same users
+    # reuse one conversation instead of creating a new one per message. The
+    # row is written last when a conversation is created, carrying its index,
+    # so a conversation found here is complete.
+    """
+        CREATE TABLE IF NOT EXISTS conversations_by_participants (
+            participants FROZEN<LIST<UUID>>,
+            conversation_id UUID,
+            conversation_index INT,
+            PRIMARY KEY (participants)
+        );
+    """,
+    # The next unassigned index per kind of id ('conversation'), advanced with
+    # a compare-and-set so every worker hands out distinct indexes.
+    """
+        CREATE TABLE IF NOT EXISTS index_allocators (
+            name TEXT,
+            next_index INT,
+            PRIMARY KEY (name)
+        );
+    """,
+    # Everything GET /api/conversations/{id} returns, keyed by the API id and
+    # rewritten on every send, so the endpoint is a single-partition read.
+    """
+        CREATE TABLE IF NOT EXISTS conversation_summary_by_index (
+            conversation_index INT,
+            conversation_id UUID,
+            participant_indexes LIST<INT>,
+            last_message TEXT,
+            last_message_at TIMESTAMP,
+            PRIMARY KEY (conversation_index)
+        );
+    """,
+    # Unread messages per conversation for each user, one partition per user
+    # so an inbox page reads all of its counts at once.
+    """
+        CREATE TABLE IF NOT EXISTS unread_counts (
+            user_id UUID,
+            conversation_id UUID,
+            unread COUNTER,
+            PRIMARY KEY ((user_id), conversation_id)
+        );
+    """,
+]
+
+# Columns added to existing tables since they were first created; CREATE
+# TABLE IF NOT EXISTS leaves an existing table as it is.
+ADDED_COLUMNS = [
+    "ALTER TABLE conversations_by_participants ADD conversation_index INT",
+]
+
+# Day-bucketed message layout, created when MESSAGE_BUCKETING=day
+BUCKETED_MESSAGE_TABLES = [
+    """
+        CREATE TABLE IF NOT EXISTS messages_by_conversation_bucket (
+            conversation_id UUID,
+            day_bucket INT,
+            timestamp TIMESTAMP,
+            message_id UUID,
+            sender_id UUID,
+            receiver_id UUID,
+            content TEXT,
+            PRIMARY KEY ((conversation_id, day_bucket), timestamp, message_id)
+        ) WITH CLUSTERING ORDER BY (timestamp DESC, message_id ASC);
+    """,
+    # The buckets that hold messages, newest first, so reads walk only
+    # non-empty days instead of probing every day back in time.
+    """
+        CREATE TABLE IF NOT EXISTS message_buckets_by_conversation (
+            conversation_id UUID,
+            day_bucket INT,
+            PRIMARY KEY ((conversation_id), day_bucket)
+        ) WITH CLUSTERING ORDER BY (day_bucket DESC);
+    """,
+]
@@ -0,0 +1,31 @@
+"""
+Selects the storage backend used by the models.
+
+The backend is chosen with the STORAGE_BACKEND environment variable
+("cassandra", the default, or "memory").
+"""
+import os
+from typing import Optional
+
+from app.db.backend import StorageBackend
+
+
+def create_storage_backend(kind: Optional[str] = None) -> StorageBackend:
+    """
+    Create the storage backend selected by `kind` or the STORAGE_BACKEND variable.
+
+    Args:
+        kind: "cassandra" or "memory"; defaults to STORAGE_BACKEND, then "cassandra"
+    """
+    kind = (kind or os.getenv("STORAGE_BACKEND", "cassandra")).lower()
+    if kind == "cassandra":
+        from app.db.cassandra_client import cassandra_client
+        return cassandra_client
+    if kind == "memory":
+        from app.db.memory_backend import MemoryBackend
+        return MemoryBackend()
+    raise ValueError(f"Unknown STORAGE_BACKEND {kind!r}; expected 'cassandra' or 'memory'")
+
+
+# The backend used by the models
+storage = create_storage_backend()
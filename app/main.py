@@ -1,13 +1,22 @@
+import asyncio
 import logging
 from fastapi import FastAPI, Depends
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
 
-from app.api.routes import message_router, conversation_router
+from app.api.routes import message_router, conversation_router, push_router, sync_router
+from app.api.middleware import MetricsMiddleware, QueryStatsMiddleware
 from app.controllers.message_controller import MessageController
 from app.controllers.conversation_controller import ConversationController
-from app.db.cassandra_client import cassandra_client
+from app.controllers.push_controller import PushController
+from app.db.storage import storage
+from app.db.metrics import metrics
+from app.models.cassandra_models import ConversationModel
+from app.models.unread import unread_tracker
+from app.models.write_buffer import WRITE_BUFFER, message_write_buffer
+from app.realtime.hub import push_hub
 
 # Configure logging
 logging.basicConfig(
@@ -29,8 +38,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Time-ms", "ETag"],
 )
 
+# Storage round trips and DB time per request, as X-DB-* response headers
+app.add_middleware(QueryStatsMiddleware)
+# Per-route latency and error metrics, served at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Dependency injection
 def get_message_controller():
     """Dependency for message controller."""
@@ -40,36 +55,67 @@ def get_conversation_controller():
     """Dependency for conversation controller."""
     return ConversationController()
 
+def get_push_controller():
+    """Dependency for push controller."""
+    return PushController()
+
 # Update the routes with the dependencies
 app.dependency_overrides[MessageController] = get_message_controller
 app.dependency_overrides[ConversationController] = get_conversation_controller
+app.dependency_overrides[PushController] = get_push_controller
 
 
 # Include routers
 app.include_router(message_router)
 app.include_router(conversation_router)
+app.include_router(push_router)
+app.include_router(sync_router)
 
 @app.get("/")
 async def root():
-    return {"message": "FB Messenger API is running with Cassandra backend"}
+    return {"message": f"FB Messenger API is running with {storage.name} backend"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Query and route metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup."""
     logger.info("Initializing application...")
     try:
-        # Ensure Cassandra connection is established
-        cassandra_client.get_session()
-        logger.info("Cassandra connection established")
+        # Connect and prepare every registered model query up front instead of on first request
+        storage.prepare_statements()
+        logger.info(f"Storage backend ready: {storage.name}")
     except Exception as e:
-        logger.error(f"Failed to connect to Cassandra: {str(e)}")
+        logger.error(f"Failed to initialize {storage.name} storage backend: {str(e)}")
         sys.exit(1)
 
+    await push_hub.start()
+    await unread_tracker.start()
+    if WRITE_BUFFER:
+        await message_write_buffer.start()
+    logger.info(f"Push hub ready: {push_hub.backend.name} broadcast")
+
+    try:
+        # The warm-up scan pages synchronously, so keep it off the event loop
+        users, conversations = await asyncio.get_running_loop().run_in_executor(
+            None, ConversationModel.warm_lookup_caches
+        )
+        logger.info(f"Warmed lookup caches with {users} users and {conversations} conversations")
+    except Exception as e:
+        # A cold cache only costs extra lookups, so keep serving
+        logger.warning(f"Failed to warm lookup caches: {str(e)}")
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown."""
     logger.info("Shutting down application...")
-    cassandra_client.close()
+    await push_hub.close()
+    await message_write_buffer.close()
+    await unread_tracker.close()
+    storage.close()
 
 if __name__ == "__main__":
     import uvicorn
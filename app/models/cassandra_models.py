@@ -2,15 +2,232 @@
 Sample models for interacting with Cassandra tables.
 Students should implement these models based on their database schema design.
 """
+import os
+import asyncio
+import logging
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any, Optional,Tuple
+from datetime import datetime, timezone
+from itertools import islice
+from typing import List, Dict, Any, Optional, Tuple, Iterable, AsyncIterator, Union
 
-from app.db.cassandra_client import cassandra_client
-from cassandra.query import  dict_factory
+from app.db.storage import storage
+from app.db.backend import UNPAGED, InvalidPagingStateError
+from app.db.paging import encode_cursor, decode_cursor, InvalidCursorError
+from app.db.cache import BidirectionalLookupCache, LRUCache
+from app.db.metrics import metrics
+from app.db.schema import MESSAGE_BUCKETING
+from app.models import message_buckets
+from app.models.write_buffer import WRITE_BUFFER, message_write_buffer
 
-session = cassandra_client.get_session()
-session.row_factory = dict_factory
+logger = logging.getLogger(__name__)
+
+# Every query the models run, prepared once per session by CassandraClient.
+STATEMENTS = {
+    "insert_message": """
+        INSERT INTO messages_by_conversation (
+            conversation_id, timestamp, message_id, sender_id, receiver_id, content
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    "select_messages_page": """
+        SELECT * FROM messages_by_conversation
+        WHERE conversation_id = ?
+    """,
+    "select_messages_before": """
+        SELECT * FROM messages_by_conversation
+        WHERE conversation_id = ? AND timestamp < ?
+    """,
+    # Unpaged (Cassandra pages neither ORDER BY with IN on the partition key
+    # nor a per-partition limit across partitions the way sync needs)
+    "select_messages_after_in": """
+        SELECT * FROM messages_by_conversation
+        WHERE conversation_id IN ? AND timestamp > ?
+        ORDER BY timestamp ASC
+        PER PARTITION LIMIT ?
+    """,
+    "select_messages_between_in": """
+        SELECT * FROM messages_by_conversation
+        WHERE conversation_id IN ? AND timestamp > ? AND timestamp <= ?
+        ORDER BY timestamp ASC
+        PER PARTITION LIMIT ?
+    """,
+    # Paged by the caller, which reads until it has a page of distinct conversations
+    "select_user_conversations": """
+        SELECT * FROM conversations_by_user
+        WHERE user_id = ?
+    """,
+    "select_conversations_updated_since": """
+        SELECT conversation_id FROM conversations_by_user
+        WHERE user_id = ? AND last_updated_at > ?
+    """,
+    "insert_inbox_entry": """
+        INSERT INTO conversations_by_user (
+            user_id, conversation_id, last_updated_at, last_message, other_participants
+        ) VALUES (?, ?, ?, ?, ?)
+    """,
+    "delete_inbox_entry": """
+        DELETE FROM conversations_by_user
+        WHERE user_id = ? AND last_updated_at = ? AND conversation_id = ?
+    """,
+    "select_conversation_participants": """
+        SELECT user_id FROM conversation_participants
+        WHERE conversation_id = ?
+    """,
+    "insert_conversation_participant": """
+        INSERT INTO conversation_participants (conversation_id, user_id, joined_at)
+        VALUES (?, ?, ?)
+    """,
+    "select_last_message": """
+        SELECT content, timestamp FROM messages_by_conversation
+        WHERE conversation_id = ?
+        ORDER BY timestamp DESC
+        LIMIT 1
+    """,
+    "select_user_uuid_by_index": """
+        SELECT user_id FROM users_by_index WHERE user_index = ?
+    """,
+    "select_user_uuids_by_indexes": """
+        SELECT user_index, user_id FROM users_by_index WHERE user_index IN ?
+    """,
+    "select_user_index_by_uuid": """
+        SELECT user_index FROM user_details WHERE user_id = ?
+    """,
+    "select_conversation_uuid_by_index": """
+        SELECT conversation_id FROM conversations_by_index WHERE conversation_index = ?
+    """,
+    "select_conversation_index_by_uuid": """
+        SELECT conversation_index FROM conversation_metadata WHERE conversation_id = ?
+    """,
+    "select_conversation_indexes_by_uuids": """
+        SELECT conversation_id, conversation_index FROM conversation_metadata WHERE conversation_id IN ?
+    """,
+    "insert_conversation_metadata": """
+        INSERT INTO conversation_metadata (conversation_id, conversation_index)
+        VALUES (?, ?)
+    """,
+    "claim_conversation_metadata": """
+        INSERT INTO conversation_metadata (conversation_id, conversation_index)
+        VALUES (?, ?)
+        IF NOT EXISTS
+    """,
+    "delete_conversation_metadata": """
+        DELETE FROM conversation_metadata WHERE conversation_id = ?
+    """,
+    "insert_conversation_index": """
+        INSERT INTO conversations_by_index (conversation_index, conversation_id)
+        VALUES (?, ?)
+    """,
+    "delete_conversation_index": """
+        DELETE FROM conversations_by_index WHERE conversation_index = ?
+    """,
+    "delete_conversation_participants": """
+        DELETE FROM conversation_participants WHERE conversation_id = ?
+    """,
+    "init_index_allocator": """
+        INSERT INTO index_allocators (name, next_index)
+        VALUES (?, ?)
+        IF NOT EXISTS
+    """,
+    "advance_index_allocator": """
+        UPDATE index_allocators SET next_index = ?
+        WHERE name = ?
+        IF next_index = ?
+    """,
+    "select_conversation_by_participants": """
+        SELECT conversation_id, conversation_index FROM conversations_by_participants
+        WHERE participants = ?
+    """,
+    "claim_conversation_by_participants": """
+        INSERT INTO conversations_by_participants (participants, conversation_id, conversation_index)
+        VALUES (?, ?, ?)
+        IF NOT EXISTS
+    """,
+    "set_participants_conversation_index": """
+        UPDATE conversations_by_participants SET conversation_index = ?
+        WHERE participants = ?
+    """,
+    "select_user_indexes_by_uuids": """
+        SELECT user_id, user_index FROM user_details WHERE user_id IN ?
+    """,
+    # Written with the message time as the write timestamp, so a late or
+    # repeated write never replaces a newer last message.
+    "upsert_conversation_summary": """
+        INSERT INTO conversation_summary_by_index (
+            conversation_index, conversation_id, participant_indexes, last_message, last_message_at
+        ) VALUES (?, ?, ?, ?, ?)
+        USING TIMESTAMP ?
+    """,
+    "select_conversation_summary": """
+        SELECT conversation_id, participant_indexes, last_message, last_message_at
+        FROM conversation_summary_by_index WHERE conversation_index = ?
+    """,
+    "scan_user_indexes": """
+        SELECT user_id, user_index FROM user_details
+    """,
+    "scan_conversation_indexes": """
+        SELECT conversation_id, conversation_index FROM conversation_metadata
+    """,
+}
+
+storage.register_statements(STATEMENTS)
+# Only prepared when the bucket tables exist, see scripts/setup_db.py
+if MESSAGE_BUCKETING == "day":
+    message_buckets.register_statements()
+
+# Index <-> UUID mappings never change once written, so they are cached in
+# both directions in front of the lookup queries.
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "100000"))
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "3600"))
+
+user_lookup_cache = BidirectionalLookupCache(LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL)
+conversation_lookup_cache = BidirectionalLookupCache(LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL)
+
+# Bounded in-flight inserts per bulk ingestion chunk
+BULK_WRITE_CONCURRENCY = int(os.getenv("BULK_WRITE_CONCURRENCY", "64"))
+
+# Sorted participant UUIDs -> conversation UUID, so repeat sends between the
+# same users need no reads or writes to find their conversation.
+participants_cache = LRUCache(LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL)
+
+# Conversation index -> summary row. Written through on every send in this
+# process; the TTL bounds how stale a summary written by another process can be.
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "10000"))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "5"))
+summary_cache = LRUCache(SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL)
+
+# Conversation UUID -> (content, timestamp) of its newest message, written
+# through by MessageModel once a message is stored, so the previous-activity
+# read of every send, the ETag check of message polls and the bulk endpoint
+# need no ORDER BY ... LIMIT 1 read. Misses fall back to Cassandra.
+# Messages sent through other workers are not seen until the entry expires,
+# so for up to LAST_MESSAGE_CACHE_TTL seconds a poll served here can get 304
+# for a changed conversation, and a send here can leave a second inbox row
+# (see stale_inbox_rows).
+LAST_MESSAGE_CACHE_SIZE = int(os.getenv("LAST_MESSAGE_CACHE_SIZE", "100000"))
+LAST_MESSAGE_CACHE_TTL = float(os.getenv("LAST_MESSAGE_CACHE_TTL", "5"))
+last_message_cache = LRUCache(LAST_MESSAGE_CACHE_SIZE, LAST_MESSAGE_CACHE_TTL)
+
+# Conversation UUID -> {(user UUID, last_updated_at)} of outdated inbox rows
+# noticed by inbox reads. Reads skip them; the next update_inbox of the
+# conversation in this process deletes them in its batches, at no extra query.
+STALE_INBOX_ROWS_CACHE_SIZE = int(os.getenv("STALE_INBOX_ROWS_CACHE_SIZE", "10000"))
+stale_inbox_rows = LRUCache(STALE_INBOX_ROWS_CACHE_SIZE)
+
+for _name, _cache in (
+    ("user_by_index", user_lookup_cache.by_key),
+    ("user_index_by_uuid", user_lookup_cache.by_value),
+    ("conversation_by_index", conversation_lookup_cache.by_key),
+    ("conversation_index_by_uuid", conversation_lookup_cache.by_value),
+    ("participants", participants_cache),
+    ("summary", summary_cache),
+    ("last_message", last_message_cache),
+    ("stale_inbox_rows", stale_inbox_rows),
+    ("known_buckets", message_buckets.known_buckets),
+):
+    metrics.register_cache(_name, _cache)
+
+# Last value seen in the 'conversation' row of index_allocators, used as the
+# expected value of the next compare-and-set. None until the first allocation.
+_next_conversation_index: Optional[int] = None
 
 class MessageModel:
     """
@@ -26,15 +243,30 @@ class MessageModel:
     # TODO: Implement the following methods
     
     @staticmethod
-    def create_message(conversation_id: uuid.UUID, sender_id: uuid.UUID, receiver_id: uuid.UUID, content: str) -> dict:
+    async def create_message(
+        conversation_id: uuid.UUID,
+        sender_id: uuid.UUID,
+        receiver_id: uuid.UUID,
+        content: str,
+        timestamp: Optional[datetime] = None
+    ) -> dict:
         message_id = uuid.uuid4()
-        timestamp = datetime.utcnow()
+        timestamp = timestamp or datetime.utcnow()
 
-        session.execute("""
-            INSERT INTO messages_by_conversation (
+        if WRITE_BUFFER:
+            await message_write_buffer.write(
                 conversation_id, timestamp, message_id, sender_id, receiver_id, content
-            ) VALUES (%s, %s, %s, %s, %s, %s)
-        """, (conversation_id, timestamp, message_id, sender_id, receiver_id, content))
+            )
+        elif MESSAGE_BUCKETING == "day":
+            await message_buckets.insert_message(
+                conversation_id, timestamp, message_id, sender_id, receiver_id, content
+            )
+        else:
+            await storage.execute_prepared_aio(
+                "insert_message",
+                (conversation_id, timestamp, message_id, sender_id, receiver_id, content)
+            )
+        _remember_last_message(conversation_id, content, timestamp)
 
         return {
             "id": message_id,
@@ -46,47 +278,344 @@ class MessageModel:
         }
     
     @staticmethod
-    def get_conversation_messages(conversation_id: uuid.UUID, limit: int = 20, page: int = 1) -> List[dict]:
+    async def create_messages(
+        messages: List[Tuple[uuid.UUID, uuid.UUID, uuid.UUID, str, datetime]]
+    ) -> List[Union[uuid.UUID, Exception]]:
+        """
+        Insert many messages with bounded concurrency. The writes go straight
+        to storage: they are already concurrent, so the write buffer is skipped.
+
+        Args:
+            messages: (conversation_id, sender_id, receiver_id, content, timestamp) tuples
+
+        Returns:
+            The message_id of each message written, or the exception that failed it, in order
+        """
+        params = [
+            (conversation_id, timestamp, uuid.uuid4(), sender_id, receiver_id, content)
+            for conversation_id, sender_id, receiver_id, content, timestamp in messages
+        ]
+        # execute_concurrent_with_args blocks until every write completes.
+        # to_thread (unlike run_in_executor) carries the request's query tracking along.
+        if MESSAGE_BUCKETING == "day":
+            results = await asyncio.to_thread(
+                message_buckets.insert_messages, params, BULK_WRITE_CONCURRENCY
+            )
+        else:
+            results = await asyncio.to_thread(
+                storage.execute_concurrent_prepared,
+                "insert_message", params, BULK_WRITE_CONCURRENCY
+            )
+        for (conversation_id, timestamp, _, _, _, content), (success, _) in zip(params, results):
+            if success:
+                _remember_last_message(conversation_id, content, timestamp)
+        return [
+            message_id if success else result
+            for (_, _, message_id, *_), (success, result) in zip(params, results)
+        ]
+
+    @staticmethod
+    async def get_conversation_messages(
+        conversation_id: uuid.UUID,
+        limit: int = 20,
+        page: int = 1,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Get one page of messages, newest first.
+
+        Returns:
+            The page of message rows and the cursor for the next page (None on the last page)
+        """
         try:
-            fetch_limit = page * limit
-            
-            query = """
-                SELECT * FROM messages_by_conversation
-                WHERE conversation_id = %s
-                LIMIT %s
-            """
-            print("Query:", query.strip())
-            print("Params:", conversation_id, fetch_limit)
-            
-            result = session.execute(query, (conversation_id, fetch_limit))
-            
-            all_messages = list(result)
-            start_idx = (page - 1) * limit
-            
-            return all_messages[start_idx:min(start_idx + limit, len(all_messages))]
+            logger.debug(
+                "select_messages_page conversation_id=%s limit=%s page=%s cursor=%s",
+                conversation_id, limit, page, cursor
+            )
+            if MESSAGE_BUCKETING == "day":
+                return await message_buckets.read_page(conversation_id, limit, page, cursor)
+            return await _read_page("select_messages_page", (conversation_id,), limit, page, cursor)
+        except InvalidCursorError:
+            # The client's mistake, reported to it as a 400
+            raise
         except Exception as e:
-            print("Cassandra query error:", str(e))
+            logger.error(f"Message page query failed: {str(e)}")
             raise
 
 
     
     @staticmethod
-    def get_messages_before_timestamp(conversation_id: uuid.UUID, before: datetime, limit: int = 20, page: int = 1) -> List[dict]:
-        offset = (page - 1) * limit
+    async def get_messages_before_timestamp(
+        conversation_id: uuid.UUID,
+        before: datetime,
+        limit: int = 20,
+        page: int = 1,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Get one page of messages older than a timestamp, newest first.
+
+        `timestamp` is the first clustering column, so this is a clustering-range
+        slice of the partition that starts at `before` and stops after `limit` rows.
+        With MESSAGE_BUCKETING=day the walk starts at the bucket holding `before`.
+
+        Returns:
+            The page of message rows and the cursor for the next page (None on the last page)
+        """
         try:
-            query = """
-                SELECT * FROM messages_by_conversation
-                WHERE conversation_id = %s AND timestamp < %s ALLOW FILTERING
-            """
-            print("Query:", query.strip())
-            print("Params:", conversation_id, before)
-            result = session.execute(query, (conversation_id, before))
-            return list(result)[offset:offset + limit]
+            logger.debug(
+                "select_messages_before conversation_id=%s before=%s limit=%s page=%s cursor=%s",
+                conversation_id, before, limit, page, cursor
+            )
+            if MESSAGE_BUCKETING == "day":
+                return await message_buckets.read_page(conversation_id, limit, page, cursor, before)
+            return await _read_page("select_messages_before", (conversation_id, before), limit, page, cursor)
+        except InvalidCursorError:
+            # The client's mistake, reported to it as a 400
+            raise
         except Exception as e:
-            print("Cassandra query error:", str(e))
+            logger.error(f"Message page query failed: {str(e)}")
             raise
 
 
+    @staticmethod
+    async def get_messages_after_many(
+        conversation_ids: List[uuid.UUID],
+        after: datetime,
+        limit: int,
+        until: Optional[datetime] = None
+    ) -> Dict[uuid.UUID, List[dict]]:
+        """
+        Get up to `limit` messages newer than `after`, and no newer than
+        `until` if given, of each conversation, oldest first.
+
+        One unpaged multi-partition read (plus one bucket list read with
+        MESSAGE_BUCKETING=day) for all the conversations, so callers should
+        pass them in bounded chunks.
+
+        Returns:
+            Conversation UUID -> its messages, for conversations that have any
+        """
+        if not conversation_ids:
+            return {}
+        if MESSAGE_BUCKETING == "day":
+            rows = await message_buckets.read_after_many(conversation_ids, after, limit, until)
+        elif until is None:
+            rows = (await storage.execute_prepared_aio(
+                "select_messages_after_in", (conversation_ids, after, limit), fetch_size=UNPAGED
+            )).current_rows
+        else:
+            rows = (await storage.execute_prepared_aio(
+                "select_messages_between_in", (conversation_ids, after, until, limit), fetch_size=UNPAGED
+            )).current_rows
+        return _group_by_conversation(rows, limit)
+
+    @staticmethod
+    async def iter_conversation_messages(
+        conversation_id: uuid.UUID,
+        fetch_size: int = 1000
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Yield every message of a conversation, newest first, one storage page
+        (at most `fetch_size` rows) at a time, following the driver paging state.
+        """
+        if MESSAGE_BUCKETING == "day":
+            async for bucket in message_buckets.iter_buckets(conversation_id):
+                async for rows in _iter_pages("select_bucket_messages", (conversation_id, bucket), fetch_size):
+                    yield rows
+        else:
+            async for rows in _iter_pages("select_messages_page", (conversation_id,), fetch_size):
+                yield rows
+
+
+def _group_by_conversation(rows: List[dict], limit: int) -> Dict[uuid.UUID, List[dict]]:
+    """Group message rows by conversation, each oldest first and cut to `limit`."""
+    grouped: Dict[uuid.UUID, List[dict]] = {}
+    for row in rows:
+        grouped.setdefault(row["conversation_id"], []).append(row)
+    for conversation_id, messages in grouped.items():
+        messages.sort(key=lambda m: m["timestamp"])
+        grouped[conversation_id] = messages[:limit]
+    return grouped
+
+
+def _note_stale_inbox_row(conversation_id: uuid.UUID, user_id: uuid.UUID, last_updated_at: datetime) -> None:
+    """Record an outdated inbox row for the next update_inbox of its conversation to delete."""
+    rows = stale_inbox_rows.peek(conversation_id) or set()
+    stale_inbox_rows.set(conversation_id, rows | {(user_id, last_updated_at)})
+
+
+def _remember_last_message(conversation_id: uuid.UUID, content: str, timestamp: datetime) -> None:
+    """Write a message through to last_message_cache unless a newer one is cached."""
+    timestamp = _stored_time(timestamp)
+    cached = last_message_cache.peek(conversation_id)
+    if cached is None or cached[1] <= timestamp:
+        last_message_cache.set(conversation_id, (content, timestamp))
+
+
+async def _read_last_message(conversation_id: uuid.UUID) -> Optional[dict]:
+    """Read the content and timestamp of a conversation's newest message from storage."""
+    if MESSAGE_BUCKETING == "day":
+        return await message_buckets.get_last_message(conversation_id)
+    return (await storage.execute_prepared_aio("select_last_message", (conversation_id,))).one()
+
+
+def _stored_time(moment: datetime) -> datetime:
+    """A timestamp as Cassandra stores it, truncated to milliseconds, so cached and read values compare equal."""
+    return moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+
+
+def _write_timestamp(moment: datetime) -> int:
+    """Cassandra write timestamp (microseconds since the epoch) for a naive UTC datetime."""
+    return int(moment.replace(tzinfo=timezone.utc).timestamp() * 1_000_000)
+
+
+async def _claim_next_conversation_index() -> int:
+    """
+    Take the next index from the 'conversation' row of index_allocators.
+
+    The row is advanced with a compare-and-set, so each index is handed out
+    once across all workers. A lost race retries with the value the failed
+    update returned, so an allocation never probes through taken indexes.
+    """
+    global _next_conversation_index
+    expected = _next_conversation_index
+    while True:
+        if expected is None:
+            row = (await storage.execute_prepared_aio("init_index_allocator", ("conversation", 2))).one()
+            if row["[applied]"]:
+                _next_conversation_index = 2
+                return 1
+            expected = row["next_index"]
+
+        row = (await storage.execute_prepared_aio(
+            "advance_index_allocator", (expected + 1, "conversation", expected)
+        )).one()
+        if row["[applied]"]:
+            _next_conversation_index = expected + 1
+            return expected
+        expected = row.get("next_index")
+
+
+async def _ensure_conversation_index(participants: List[uuid.UUID], row: dict) -> int:
+    """
+    Return the index of a conversations_by_participants row, caching it.
+
+    Rows written before the mapping carried the index fall back to
+    conversation_metadata, and the index is then copied into the row. A
+    conversation with no metadata at all (its creation stopped half way) is
+    repaired: it is given an index, claimed in conversation_metadata with a
+    lightweight transaction so concurrent repairs agree, and its participant
+    rows are rewritten.
+    """
+    conversation_id = row["conversation_id"]
+    index = row.get("conversation_index")
+    if index is not None:
+        conversation_lookup_cache.put(index, conversation_id)
+        return index
+
+    try:
+        index = await ConversationModel.get_conversation_index_by_uuid(conversation_id)
+    except ValueError:
+        logger.warning(f"Repairing conversation {conversation_id}, which has no index")
+        claimed = await _claim_next_conversation_index()
+        result = (await storage.execute_prepared_aio(
+            "claim_conversation_metadata", (conversation_id, claimed)
+        )).one()
+        index = claimed if result["[applied]"] else result["conversation_index"]
+        timestamp = datetime.utcnow()
+        await asyncio.gather(
+            storage.execute_prepared_aio("insert_conversation_index", (index, conversation_id)),
+            *(
+                storage.execute_prepared_aio(
+                    "insert_conversation_participant", (conversation_id, user_id, timestamp)
+                )
+                for user_id in participants
+            )
+        )
+        conversation_lookup_cache.put(index, conversation_id)
+
+    await storage.execute_prepared_aio("set_participants_conversation_index", (index, participants))
+    return index
+
+
+async def _discard_conversation(conversation_id: uuid.UUID, index: int) -> None:
+    """Remove the rows of a conversation that lost the race to be published."""
+    try:
+        await asyncio.gather(
+            storage.execute_prepared_aio("delete_conversation_index", (index,)),
+            storage.execute_prepared_aio("delete_conversation_metadata", (conversation_id,)),
+            storage.execute_prepared_aio("delete_conversation_participants", (conversation_id,))
+        )
+    except Exception as e:
+        # Unpublished, so the conversation is only reachable through its unused index
+        logger.warning(f"Failed to discard unpublished conversation {conversation_id}: {str(e)}")
+
+
+async def _iter_pages(statement: str, params: tuple, fetch_size: int) -> AsyncIterator[List[dict]]:
+    """
+    Yield the pages of a paged statement. The next page is requested before
+    the current one is handed to the caller, so its round trip overlaps the
+    caller's work.
+    """
+    result = await storage.execute_prepared_aio(statement, params, fetch_size=fetch_size)
+    while True:
+        next_page = None
+        if result.paging_state:
+            next_page = asyncio.ensure_future(storage.execute_prepared_aio(
+                statement, params, fetch_size=fetch_size, paging_state=result.paging_state
+            ))
+        try:
+            if result.current_rows:
+                yield list(result.current_rows)
+        except BaseException:
+            if next_page is not None:
+                next_page.cancel()
+            raise
+        if next_page is None:
+            return
+        result = await next_page
+
+
+async def _read_page(
+    statement: str,
+    params: tuple,
+    limit: int,
+    page: int,
+    cursor: Optional[str]
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Read one page of a paged statement.
+
+    With a cursor the page is a single bounded slice resumed from the driver
+    paging state. Without one, the legacy page number costs one more round
+    trip: a read of the (page - 1) * limit rows before the page, for the
+    paging state the page starts at.
+
+    Cursors are bound to the statement and its parameters.
+
+    Raises:
+        InvalidCursorError: For a cursor not issued for this query, or whose
+            paging state storage no longer accepts
+    """
+    scope = f"{statement}:{params!r}"
+    paging_state = decode_cursor(cursor, scope)
+    skip = 0 if cursor else max(page - 1, 0) * limit
+
+    if skip:
+        result = await storage.execute_prepared_aio(statement, params, fetch_size=skip)
+        paging_state = result.paging_state
+        if not paging_state:
+            # Asked for a page past the end of the result
+            return [], None
+
+    try:
+        result = await storage.execute_prepared_aio(
+            statement, params, fetch_size=limit, paging_state=paging_state
+        )
+    except InvalidPagingStateError:
+        raise InvalidCursorError("Expired or invalid pagination cursor")
+    return list(result.current_rows), encode_cursor(result.paging_state, scope)
 
 
 class ConversationModel:
@@ -103,101 +632,386 @@ class ConversationModel:
     # TODO: Implement the following methods
     
     @staticmethod
-    def get_user_conversations(user_id: uuid.UUID, limit: int = 20, page: int = 1) -> List[dict]:
-        result = session.execute("""
-            SELECT * FROM conversations_by_user
-            WHERE user_id = %s
-            LIMIT %s
-        """, (user_id, limit))
+    async def get_user_conversations(user_id: uuid.UUID, limit: int = 20, page: int = 1) -> List[dict]:
+        """
+        Return the user's `limit` most recently active conversations, newest first.
 
-        return list(result)
+        Concurrent sends on different workers can each leave an inbox row for
+        the same conversation. Only the newest is returned, and reading goes
+        on past the older ones until the page is full. They are recorded in
+        stale_inbox_rows for the next update_inbox to delete.
+        """
+        newest: Dict[uuid.UUID, dict] = {}
+        paging_state = None
+        while True:
+            result = await storage.execute_prepared_aio(
+                "select_user_conversations", (user_id,), fetch_size=limit, paging_state=paging_state
+            )
+            for row in result.current_rows:
+                conversation_id = row["conversation_id"]
+                if conversation_id in newest:
+                    _note_stale_inbox_row(conversation_id, user_id, row["last_updated_at"])
+                elif len(newest) < limit:
+                    newest[conversation_id] = row
+            paging_state = result.paging_state
+            if len(newest) >= limit or not paging_state:
+                return list(newest.values())
 
     
     @staticmethod
-    def get_conversation(conversation_id: uuid.UUID) -> Optional[List[uuid.UUID]]:
-        rows = session.execute("""
-            SELECT user_id FROM conversation_participants
-            WHERE conversation_id = %s
-        """, (conversation_id,))
-        return [r["user_id"] for r in rows]
+    async def get_conversations_updated_since(user_id: uuid.UUID, since: datetime) -> List[uuid.UUID]:
+        """
+        Return the user's conversations with a message newer than `since`,
+        most recently updated first, from a clustering-range slice of the inbox.
+        """
+        conversation_ids: Dict[uuid.UUID, None] = {}
+        async for rows in _iter_pages("select_conversations_updated_since", (user_id, since), 1000):
+            for row in rows:
+                conversation_ids.setdefault(row["conversation_id"])
+        return list(conversation_ids)
+
+    @staticmethod
+    async def get_conversation(conversation_id: uuid.UUID) -> Optional[List[uuid.UUID]]:
+        result = await storage.execute_prepared_aio("select_conversation_participants", (conversation_id,))
+        return [r["user_id"] for r in result.current_rows]
     
     @staticmethod
-    def create_or_get_conversation(user_ids: List[uuid.UUID]) -> uuid.UUID:
+    async def create_or_get_conversation(user_ids: List[uuid.UUID]) -> uuid.UUID:
+        """
+        Return the conversation between exactly these users, creating it on first use.
+
+        The participant set is looked up in the in-process cache, then in
+        conversations_by_participants. A new conversation gets its index and
+        participant rows first; only then is it published in
+        conversations_by_participants with a lightweight transaction, together
+        with its index. Concurrent first sends between the same users thus
+        agree on one conversation whose index already resolves, and a creation
+        that fails half way leaves no mapping behind. The loser of the race
+        removes the rows it wrote for its own conversation.
+
+        The index of the returned conversation is in conversation_lookup_cache.
+        """
+        participants = sorted(set(user_ids))
+        key = tuple(participants)
+
+        conversation_id = participants_cache.get(key)
+        if conversation_id is not None:
+            return conversation_id
+
+        row = (await storage.execute_prepared_aio(
+            "select_conversation_by_participants", (participants,)
+        )).one()
+        if row:
+            await _ensure_conversation_index(participants, row)
+            participants_cache.set(key, row["conversation_id"])
+            return row["conversation_id"]
+
         conversation_id = uuid.uuid4()
         timestamp = datetime.utcnow()
+        index, *_ = await asyncio.gather(
+            ConversationModel.allocate_conversation_index(conversation_id),
+            *(
+                storage.execute_prepared_aio(
+                    "insert_conversation_participant", (conversation_id, user_id, timestamp)
+                )
+                for user_id in participants
+            )
+        )
 
-        for user_id in user_ids:
-            session.execute("""
-                INSERT INTO conversation_participants (conversation_id, user_id, joined_at)
-                VALUES (%s, %s, %s)
-            """, (conversation_id, user_id, timestamp))
+        row = (await storage.execute_prepared_aio(
+            "claim_conversation_by_participants", (participants, conversation_id, index)
+        )).one()
+        if not row["[applied]"]:
+            # Another request created this conversation first
+            await _discard_conversation(conversation_id, index)
+            await _ensure_conversation_index(participants, row)
+            participants_cache.set(key, row["conversation_id"])
+            return row["conversation_id"]
 
+        conversation_lookup_cache.put(index, conversation_id)
+        participants_cache.set(key, conversation_id)
         return conversation_id
     
     @staticmethod
-    def get_last_message_and_time(conversation_id: uuid.UUID) -> Tuple[Optional[str], Optional[datetime]]:
-        row = session.execute("""
-            SELECT content, timestamp FROM messages_by_conversation
-            WHERE conversation_id = %s
-            ORDER BY timestamp DESC
-            LIMIT 1
-        """, (conversation_id,)).one()
+    async def update_inbox(
+        conversation_id: uuid.UUID,
+        participants: List[uuid.UUID],
+        last_message: str,
+        last_updated_at: datetime,
+        previous_updated_at: Optional[datetime] = None
+    ) -> None:
+        """
+        Move the conversation to the top of every participant's inbox.
 
+        last_updated_at is a clustering column of conversations_by_user, so the
+        previous row is deleted and a new one inserted, along with any outdated
+        rows recorded in stale_inbox_rows. The statements target the same user
+        partition and go out as one unlogged batch per participant; the
+        batches run concurrently.
+        """
+        stale = stale_inbox_rows.get(conversation_id) or set()
+        batches = []
+        for user_id in participants:
+            outdated = {updated_at for stale_user, updated_at in stale if stale_user == user_id}
+            if previous_updated_at is not None:
+                outdated.add(previous_updated_at)
+            outdated.discard(last_updated_at)
+            statements = [
+                ("delete_inbox_entry", (user_id, updated_at, conversation_id))
+                for updated_at in sorted(outdated)
+            ]
+            others = {u for u in participants if u != user_id}
+            statements.append((
+                "insert_inbox_entry",
+                (user_id, conversation_id, last_updated_at, last_message, others)
+            ))
+            batches.append(storage.execute_batch_aio(statements))
+        await asyncio.gather(*batches)
+        # Rows noted while the batches were in flight are kept for the next update
+        if stale and stale_inbox_rows.peek(conversation_id) is stale:
+            stale_inbox_rows.delete(conversation_id)
+
+    @staticmethod
+    async def get_last_message_time(conversation_id: uuid.UUID) -> Optional[datetime]:
+        """
+        Return the timestamp of the newest message, or None for an empty
+        conversation, from last_message_cache when possible.
+        """
+        cached = last_message_cache.get(conversation_id)
+        if cached is not None:
+            return cached[1]
+        row = await _read_last_message(conversation_id)
         if row:
+            _remember_last_message(conversation_id, row["content"], row["timestamp"])
+            return row["timestamp"]
+        return None
+
+    @staticmethod
+    async def get_last_message_and_time(conversation_id: uuid.UUID) -> Tuple[Optional[str], Optional[datetime]]:
+        """
+        Return the content and time of the newest message, from last_message_cache
+        when possible. An empty conversation gives (None, None).
+        """
+        cached = last_message_cache.get(conversation_id)
+        if cached is not None:
+            return cached
+
+        row = await _read_last_message(conversation_id)
+        if row:
+            _remember_last_message(conversation_id, row["content"], row["timestamp"])
             return row["content"], row["timestamp"]
-        return "", datetime.utcnow()
+        return None, None
 
     
     @staticmethod
-    def get_user_uuid_by_index(index: int) -> uuid.UUID:
-        row = session.execute(
-        "SELECT user_id FROM user_details WHERE user_index = %s ALLOW FILTERING", (index,)
-        ).one()
+    async def get_conversation_summary(conversation_index: int) -> Optional[dict]:
+        """
+        Return the summary row of a conversation (participant indexes and last
+        message), or None if it has none yet.
+        """
+        summary = summary_cache.get(conversation_index)
+        if summary is not None:
+            return summary
+        summary = (await storage.execute_prepared_aio(
+            "select_conversation_summary", (conversation_index,)
+        )).one()
+        if summary:
+            summary_cache.set(conversation_index, summary)
+        return summary
+
+    @staticmethod
+    async def update_conversation_summary(
+        conversation_index: int,
+        conversation_id: uuid.UUID,
+        participant_indexes: List[int],
+        last_message: str,
+        last_message_at: datetime
+    ) -> None:
+        """Write a conversation's summary row unless a newer message is already recorded."""
+        # Cached as read back from storage, so both compare and serialize the same
+        last_message_at = _stored_time(last_message_at)
+        summary = {
+            "conversation_id": conversation_id,
+            "participant_indexes": list(participant_indexes),
+            "last_message": last_message,
+            "last_message_at": last_message_at,
+        }
+        await storage.execute_prepared_aio(
+            "upsert_conversation_summary",
+            (conversation_index, conversation_id, summary["participant_indexes"],
+             last_message, last_message_at, _write_timestamp(last_message_at))
+        )
+        cached = summary_cache.peek(conversation_index)
+        if cached is None or cached["last_message_at"] <= last_message_at:
+            summary_cache.set(conversation_index, summary)
+
+    @staticmethod
+    async def get_user_uuid_by_index(index: int) -> uuid.UUID:
+        cached = user_lookup_cache.get_value(index)
+        if cached is not None:
+            return cached
+        row = (await storage.execute_prepared_aio("select_user_uuid_by_index", (index,))).one()
         if row:
+            user_lookup_cache.put(index, row["user_id"])
             return row["user_id"]
         raise ValueError(f"No user found for index {index}")
 
     @staticmethod
-    def get_user_index_by_uuid(user_uuid: uuid.UUID) -> int:
-        row = session.execute(
-            "SELECT user_index FROM user_details WHERE user_id = %s", (user_uuid,)
-        ).one()
+    async def get_user_uuids_by_indexes(indexes: Iterable[int]) -> Dict[int, uuid.UUID]:
+        """
+        Resolve many user indexes to UUIDs with at most one round trip.
+
+        Unknown indexes are left out of the result rather than raising, so
+        callers can report them individually.
+        """
+        uuids = {}
+        missing = []
+        for index in set(indexes):
+            cached = user_lookup_cache.get_value(index)
+            if cached is not None:
+                uuids[index] = cached
+            else:
+                missing.append(index)
+
+        if missing:
+            result = await storage.execute_prepared_aio("select_user_uuids_by_indexes", (missing,))
+            for row in result.current_rows:
+                user_lookup_cache.put(row["user_index"], row["user_id"])
+                uuids[row["user_index"]] = row["user_id"]
+
+        return uuids
+
+    @staticmethod
+    async def get_user_index_by_uuid(user_uuid: uuid.UUID) -> int:
+        cached = user_lookup_cache.get_key(user_uuid)
+        if cached is not None:
+            return cached
+        row = (await storage.execute_prepared_aio("select_user_index_by_uuid", (user_uuid,))).one()
         if row:
+            user_lookup_cache.put(row["user_index"], user_uuid)
             return row["user_index"]
         raise ValueError(f"No index found for UUID {user_uuid}")
 
+    @staticmethod
+    async def get_user_indexes_by_uuids(user_uuids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, int]:
+        """
+        Resolve many user UUIDs to indexes with at most one round trip.
+
+        Cached UUIDs are answered locally; the rest are fetched together with a
+        single IN query on the user_details partition key.
+
+        Returns:
+            UUID -> index for the UUIDs that have a user. The rest are left
+            out, so callers can skip or report them without losing the others.
+        """
+        indexes = {}
+        missing = []
+        for user_uuid in set(user_uuids):
+            cached = user_lookup_cache.get_key(user_uuid)
+            if cached is not None:
+                indexes[user_uuid] = cached
+            else:
+                missing.append(user_uuid)
+
+        if missing:
+            result = await storage.execute_prepared_aio("select_user_indexes_by_uuids", (missing,))
+            for row in result.current_rows:
+                user_lookup_cache.put(row["user_index"], row["user_id"])
+                indexes[row["user_id"]] = row["user_index"]
+
+        return indexes
 
     @staticmethod
-    def get_conversation_uuid_by_index(index: int) -> uuid.UUID:
+    async def get_conversation_uuid_by_index(index: int) -> uuid.UUID:
         try:
-            print(f"Looking up conversation_id for index {index}")
-            
-            # ALLOW FILTERING 
-            query = """
-                SELECT conversation_id FROM conversation_metadata 
-                WHERE conversation_index = %s
-                ALLOW FILTERING
-            """
-            
-            print(f"⚙️ Executing query: {query.strip()}")
-            result = session.execute(query, (index,))
+            cached = conversation_lookup_cache.get_value(index)
+            if cached is not None:
+                return cached
+
+            result = await storage.execute_prepared_aio("select_conversation_uuid_by_index", (index,))
             row = result.one()
             
             if row:
-                print(f"Found conversation_id: {row['conversation_id']}")
+                conversation_lookup_cache.put(index, row["conversation_id"])
                 return row["conversation_id"]
-            
-            print(f"No conversation found for index {index}")
+
             raise ValueError(f"No conversation found for index {index}")
         except Exception as e:
-            print(f"Error in get_conversation_uuid_by_index: {str(e)}")
+            logger.debug("Conversation lookup for index %s failed: %s", index, e)
             raise
 
     @staticmethod
-    def get_conversation_index_by_uuid(conv_uuid: uuid.UUID) -> int:
-        row = session.execute(
-            "SELECT conversation_index FROM conversation_metadata WHERE conversation_id = %s", (conv_uuid,)
-        ).one()
+    async def get_conversation_index_by_uuid(conv_uuid: uuid.UUID) -> int:
+        cached = conversation_lookup_cache.get_key(conv_uuid)
+        if cached is not None:
+            return cached
+        row = (await storage.execute_prepared_aio("select_conversation_index_by_uuid", (conv_uuid,))).one()
         if row:
+            conversation_lookup_cache.put(row["conversation_index"], conv_uuid)
             return row["conversation_index"]
         raise ValueError(f"No index found for UUID {conv_uuid}")
+
+    @staticmethod
+    async def get_conversation_indexes_by_uuids(conv_uuids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, int]:
+        """
+        Resolve many conversation UUIDs to indexes with at most one round trip.
+
+        Returns:
+            UUID -> index for the conversations that have one; the rest are left out
+        """
+        indexes = {}
+        missing = []
+        for conv_uuid in set(conv_uuids):
+            cached = conversation_lookup_cache.get_key(conv_uuid)
+            if cached is not None:
+                indexes[conv_uuid] = cached
+            else:
+                missing.append(conv_uuid)
+
+        if missing:
+            result = await storage.execute_prepared_aio("select_conversation_indexes_by_uuids", (missing,))
+            for row in result.current_rows:
+                if row["conversation_index"] is None:
+                    continue
+                conversation_lookup_cache.put(row["conversation_index"], row["conversation_id"])
+                indexes[row["conversation_id"]] = row["conversation_index"]
+
+        return indexes
+
+    @staticmethod
+    async def allocate_conversation_index(conv_uuid: uuid.UUID) -> int:
+        """
+        Assign the next index to a new conversation and record it in
+        conversations_by_index and conversation_metadata.
+
+        Returns:
+            The assigned index
+        """
+        index = await _claim_next_conversation_index()
+        await asyncio.gather(
+            storage.execute_prepared_aio("insert_conversation_index", (index, conv_uuid)),
+            storage.execute_prepared_aio("insert_conversation_metadata", (conv_uuid, index))
+        )
+        return index
+
+    @staticmethod
+    def warm_lookup_caches() -> Tuple[int, int]:
+        """
+        Bulk-load the index <-> UUID caches from user_details and conversation_metadata.
+
+        Stops once a cache is full, since further rows would only evict earlier ones.
+
+        Returns:
+            Number of users and conversations loaded
+        """
+        users = user_lookup_cache.put_many(
+            (row["user_index"], row["user_id"])
+            for row in islice(storage.execute_prepared("scan_user_indexes"), LOOKUP_CACHE_SIZE)
+        )
+        conversation_rows = list(
+            islice(storage.execute_prepared("scan_conversation_indexes"), LOOKUP_CACHE_SIZE)
+        )
+        conversations = conversation_lookup_cache.put_many(
+            (row["conversation_index"], row["conversation_id"]) for row in conversation_rows
+        )
+        return users, conversations
@@ -0,0 +1,322 @@
+"""
+Day-bucketed message storage, used when MESSAGE_BUCKETING=day.
+
+Messages live in messages_by_conversation_bucket, partitioned by
+(conversation_id, day_bucket), so a long-lived conversation is spread over
+one bounded partition per active day. message_buckets_by_conversation lists
+the non-empty buckets of a conversation, newest first.
+
+Reads walk the buckets newest-first until the page is filled. The first
+bucket is read alone, since it usually fills the page. Each time a bucket
+runs out, the following buckets are fetched concurrently, in a window that
+doubles up to MAX_BUCKET_PREFETCH, so sparse conversations do not pay one
+sequential round trip per day.
+"""
+import os
+import asyncio
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+
+from app.db.storage import storage
+from app.db.backend import UNPAGED, InvalidPagingStateError
+from app.db.cache import LRUCache
+from app.db.paging import encode_bucket_cursor, decode_bucket_cursor, InvalidCursorError
+from app.db.schema import day_bucket
+
+STATEMENTS = {
+    "insert_bucketed_message": """
+        INSERT INTO messages_by_conversation_bucket (
+            conversation_id, day_bucket, timestamp, message_id, sender_id, receiver_id, content
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    "insert_message_bucket": """
+        INSERT INTO message_buckets_by_conversation (conversation_id, day_bucket)
+        VALUES (?, ?)
+    """,
+    "select_message_buckets": """
+        SELECT day_bucket FROM message_buckets_by_conversation
+        WHERE conversation_id = ? AND day_bucket <= ?
+    """,
+    "select_bucket_messages": """
+        SELECT * FROM messages_by_conversation_bucket
+        WHERE conversation_id = ? AND day_bucket = ?
+    """,
+    "select_bucket_messages_before": """
+        SELECT * FROM messages_by_conversation_bucket
+        WHERE conversation_id = ? AND day_bucket = ? AND timestamp < ?
+    """,
+    # Unpaged, like select_messages_after_in
+    "select_message_buckets_from_in": """
+        SELECT conversation_id, day_bucket FROM message_buckets_by_conversation
+        WHERE conversation_id IN ? AND day_bucket >= ?
+    """,
+    "select_bucket_messages_after_in": """
+        SELECT * FROM messages_by_conversation_bucket
+        WHERE conversation_id IN ? AND day_bucket IN ? AND timestamp > ?
+        ORDER BY timestamp ASC
+        PER PARTITION LIMIT ?
+    """,
+    "select_bucket_messages_between_in": """
+        SELECT * FROM messages_by_conversation_bucket
+        WHERE conversation_id IN ? AND day_bucket IN ? AND timestamp > ? AND timestamp <= ?
+        ORDER BY timestamp ASC
+        PER PARTITION LIMIT ?
+    """,
+    "select_last_bucket_message": """
+        SELECT content, timestamp FROM messages_by_conversation_bucket
+        WHERE conversation_id = ? AND day_bucket = ?
+        LIMIT 1
+    """,
+}
+
+# Maximum buckets read concurrently while filling one page
+MAX_BUCKET_PREFETCH = int(os.getenv("MAX_BUCKET_PREFETCH", "8"))
+# Bucket numbers read per page of message_buckets_by_conversation
+BUCKET_LIST_FETCH_SIZE = 64
+# Newest possible bucket, for reads with no upper bound
+_LAST_BUCKET = 2 ** 31 - 1
+
+# (conversation_id, bucket) pairs already recorded in message_buckets_by_conversation
+known_buckets = LRUCache(int(os.getenv("KNOWN_BUCKETS_CACHE_SIZE", "100000")))
+
+
+def register_statements() -> None:
+    storage.register_statements(STATEMENTS)
+
+
+async def insert_message(
+    conversation_id: uuid.UUID,
+    timestamp: datetime,
+    message_id: uuid.UUID,
+    sender_id: uuid.UUID,
+    receiver_id: uuid.UUID,
+    content: str
+) -> None:
+    """Write a message to its day bucket, recording the bucket on first use."""
+    bucket = day_bucket(timestamp)
+    writes = [storage.execute_prepared_aio(
+        "insert_bucketed_message",
+        (conversation_id, bucket, timestamp, message_id, sender_id, receiver_id, content)
+    )]
+    if known_buckets.get((conversation_id, bucket)) is None:
+        writes.append(storage.execute_prepared_aio("insert_message_bucket", (conversation_id, bucket)))
+    await asyncio.gather(*writes)
+    known_buckets.set((conversation_id, bucket), True)
+
+
+async def insert_bucket_messages(conversation_id: uuid.UUID, bucket: int, rows: List[tuple]) -> None:
+    """
+    Write (timestamp, message_id, sender_id, receiver_id, content) rows of one
+    bucket as a single batch, or a plain insert for one row, recording the
+    bucket on first use.
+    """
+    if len(rows) == 1:
+        writes = [storage.execute_prepared_aio("insert_bucketed_message", (conversation_id, bucket) + rows[0])]
+    else:
+        writes = [storage.execute_batch_aio([
+            ("insert_bucketed_message", (conversation_id, bucket) + row) for row in rows
+        ])]
+    if known_buckets.get((conversation_id, bucket)) is None:
+        writes.append(storage.execute_prepared_aio("insert_message_bucket", (conversation_id, bucket)))
+    await asyncio.gather(*writes)
+    known_buckets.set((conversation_id, bucket), True)
+
+
+def insert_messages(params: List[tuple], concurrency: int) -> List[Tuple[bool, object]]:
+    """
+    Blocking bulk write of (conversation_id, timestamp, message_id, sender_id,
+    receiver_id, content) tuples, with their buckets recorded first.
+
+    Returns:
+        (success, result or exception) per message, in order
+    """
+    new_buckets = {
+        (conversation_id, day_bucket(timestamp))
+        for conversation_id, timestamp, *_ in params
+    }
+    new_buckets = [key for key in new_buckets if known_buckets.get(key) is None]
+    bucket_results = storage.execute_concurrent_prepared("insert_message_bucket", new_buckets, concurrency)
+    failed = {key for key, (success, _) in zip(new_buckets, bucket_results) if not success}
+    for key, (success, _) in zip(new_buckets, bucket_results):
+        if success:
+            known_buckets.set(key, True)
+
+    results = storage.execute_concurrent_prepared(
+        "insert_bucketed_message",
+        [(c, day_bucket(t), t, m, s, r, content) for c, t, m, s, r, content in params],
+        concurrency
+    )
+    # A message whose bucket was not recorded would be invisible to reads
+    for i, (conversation_id, timestamp, *_) in enumerate(params):
+        if (conversation_id, day_bucket(timestamp)) in failed:
+            results[i] = (False, RuntimeError("Failed to record message bucket"))
+    return results
+
+
+async def iter_buckets(conversation_id: uuid.UUID, newest: int = _LAST_BUCKET) -> AsyncIterator[int]:
+    """Yield the conversation's non-empty buckets up to `newest`, newest first."""
+    paging_state = None
+    while True:
+        result = await storage.execute_prepared_aio(
+            "select_message_buckets", (conversation_id, newest),
+            fetch_size=BUCKET_LIST_FETCH_SIZE, paging_state=paging_state
+        )
+        for row in result.current_rows:
+            yield row["day_bucket"]
+        paging_state = result.paging_state
+        if not paging_state:
+            return
+
+
+async def read_after_many(
+    conversation_ids: List[uuid.UUID],
+    after: datetime,
+    limit: int,
+    until: Optional[datetime] = None
+) -> List[dict]:
+    """
+    Read up to `limit` messages newer than `after` (and no newer than `until`)
+    from every bucket of the conversations that can hold them: one read of
+    the bucket lists, then one read of all those buckets.
+
+    The buckets are addressed as conversations x bucket numbers, so pass the
+    conversations in bounded chunks. Rows are not grouped or cut to `limit`
+    per conversation; see MessageModel.get_messages_after_many.
+    """
+    listed = await storage.execute_prepared_aio(
+        "select_message_buckets_from_in", (conversation_ids, day_bucket(after)), fetch_size=UNPAGED
+    )
+    last = day_bucket(until) if until is not None else _LAST_BUCKET
+    buckets = sorted({row["day_bucket"] for row in listed.current_rows if row["day_bucket"] <= last})
+    if not buckets:
+        return []
+    if until is None:
+        result = await storage.execute_prepared_aio(
+            "select_bucket_messages_after_in", (conversation_ids, buckets, after, limit), fetch_size=UNPAGED
+        )
+    else:
+        result = await storage.execute_prepared_aio(
+            "select_bucket_messages_between_in", (conversation_ids, buckets, after, until, limit),
+            fetch_size=UNPAGED
+        )
+    return list(result.current_rows)
+
+
+async def get_last_message(conversation_id: uuid.UUID) -> Optional[dict]:
+    """Return the newest message's content and timestamp, or None for an empty conversation."""
+    async for bucket in iter_buckets(conversation_id):
+        row = (await storage.execute_prepared_aio(
+            "select_last_bucket_message", (conversation_id, bucket)
+        )).one()
+        if row:
+            return row
+    return None
+
+
+async def read_page(
+    conversation_id: uuid.UUID,
+    limit: int,
+    page: int,
+    cursor: Optional[str],
+    before: Optional[datetime] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Read one page of messages, newest first, optionally older than `before`.
+
+    Without a cursor, the legacy page number is honoured by first reading the
+    (page - 1) * limit rows before the page in one walk, for the cursor the
+    page starts at.
+    """
+    skip = 0 if cursor else max(page - 1, 0) * limit
+    if skip:
+        _, cursor = await _read_one_page(conversation_id, skip, None, before)
+        if cursor is None:
+            return [], None
+    return await _read_one_page(conversation_id, limit, cursor, before)
+
+
+async def _read_one_page(
+    conversation_id: uuid.UUID,
+    limit: int,
+    cursor: Optional[str],
+    before: Optional[datetime]
+) -> Tuple[List[dict], Optional[str]]:
+    # Cursors are bound to the conversation and the upper bound of the walk
+    scope = f"buckets:{conversation_id}:{before!r}"
+    position = decode_bucket_cursor(cursor, scope)
+    newest = _LAST_BUCKET if before is None else day_bucket(before)
+    if position is not None:
+        newest = min(newest, position[0])
+
+    if before is None:
+        statement, extra = "select_bucket_messages", ()
+    else:
+        statement, extra = "select_bucket_messages_before", (before,)
+
+    def fetch(bucket: int, paging_state: Optional[bytes], size: int):
+        return asyncio.ensure_future(storage.execute_prepared_aio(
+            statement, (conversation_id, bucket) + extra,
+            fetch_size=size, paging_state=paging_state
+        ))
+
+    buckets = iter_buckets(conversation_id, newest)
+    # (bucket, paging state the read started at, rows to drop, pending read)
+    pending: Deque[Tuple[int, Optional[bytes], int, asyncio.Future]] = deque()
+
+    async def schedule(count: int) -> None:
+        while len(pending) < count:
+            bucket = await anext(buckets, None)
+            if bucket is None:
+                return
+            if position is not None and bucket == position[0] and not pending and not rows:
+                _, skip, paging_state = position
+            else:
+                skip, paging_state = 0, None
+            pending.append((bucket, paging_state, skip, fetch(bucket, paging_state, skip + limit)))
+
+    def cancel_pending() -> None:
+        for *_, future in pending:
+            future.cancel()
+
+    rows: List[dict] = []
+    window = 1
+    await schedule(window)
+    try:
+        while pending:
+            bucket, paging_state, skip, future = pending.popleft()
+            try:
+                result = await future
+            except InvalidPagingStateError:
+                raise InvalidCursorError("Expired or invalid pagination cursor")
+            batch = list(result.current_rows)[skip:]
+            needed = limit - len(rows)
+
+            if len(batch) > needed:
+                # The page ends inside this read; resume after the rows taken
+                rows.extend(batch[:needed])
+                return rows, encode_bucket_cursor(bucket, skip + needed, paging_state, scope)
+
+            rows.extend(batch)
+            if result.paging_state:
+                if len(rows) == limit:
+                    return rows, encode_bucket_cursor(bucket, 0, result.paging_state, scope)
+                # Short page from the server; continue this bucket before the prefetched ones
+                pending.appendleft((bucket, result.paging_state, 0, fetch(bucket, result.paging_state, limit - len(rows))))
+                continue
+
+            if len(rows) == limit:
+                # Page filled on a bucket boundary; point at the next bucket, if any
+                next_bucket = pending[0][0] if pending else await anext(buckets, None)
+                if next_bucket is None:
+                    return rows, None
+                return rows, encode_bucket_cursor(next_bucket, 0, None, scope)
+
+            # Bucket exhausted with the page still short: widen the read-ahead
+            window = min(window * 2, MAX_BUCKET_PREFETCH)
+            await schedule(window)
+        return rows, None
+    finally:
+        cancel_pending()
+        await buckets.aclose()
@@ -0,0 +1,181 @@
+"""
+Send pipeline: writes a message and fans it out to every participant's inbox.
+"""
+import time
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.models.cassandra_models import MessageModel, ConversationModel
+from app.models.unread import unread_tracker
+from app.db.metrics import metrics, LatencyMetric
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationState:
+    """The inbox lock of one conversation and the time its newest inbox rows were written at."""
+
+    __slots__ = ("lock", "senders", "last_activity")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.senders = 0
+        self.last_activity: Optional[datetime] = None
+
+
+class ConversationLocks:
+    """One ConversationState per conversation, kept while any send to it is in flight."""
+
+    def __init__(self):
+        self._states: Dict[uuid.UUID, ConversationState] = {}
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: uuid.UUID) -> AsyncIterator[ConversationState]:
+        """Register a send for the whole of its run; the caller takes state.lock where it needs it."""
+        state = self._states.setdefault(conversation_id, ConversationState())
+        state.senders += 1
+        try:
+            yield state
+        finally:
+            state.senders -= 1
+            if not state.senders:
+                del self._states[conversation_id]
+
+
+# Latency of each pipeline stage, exported at /metrics
+stage_latency = metrics.register_latency(
+    LatencyMetric("messenger_send_stage", "Send pipeline stage", ("stage",))
+)
+
+
+async def _timed(coro) -> Tuple[object, float]:
+    """Await coro and return its result with the elapsed milliseconds."""
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000
+
+
+class SendPipeline:
+    """
+    Writes a message to messages_by_conversation, upserts the conversation
+    into conversations_by_user for each participant and rewrites the
+    conversation's summary row.
+
+    Stages:
+        previous_activity: read the conversation's previous last-message time,
+            needed to delete the old inbox rows
+        message_insert: the messages_by_conversation insert
+        inbox_fanout: one unlogged delete+insert batch per participant partition
+        summary_update: the conversation_summary_by_index upsert
+    Each stage's latency, plus the end-to-end "total", is recorded in
+    messenger_send_stage_duration_seconds.
+    The message insert, the inbox fan-out and the summary update run concurrently.
+    Sends to the same conversation take the conversation's lock in this
+    process only for the previous activity read and the inbox fan-out.
+    Otherwise two of them would read the same previous activity time, each
+    replace only that inbox row, and leave two rows for the conversation.
+    The message insert and the summary update finish outside the lock, so
+    concurrent sends to one conversation can share a write buffer batch. While
+    sends to a conversation are in flight its previous activity time is taken
+    from the last of them rather than read, since their inserts may not have
+    landed yet. Duplicates left by sends on other workers are skipped when
+    the inbox is read and deleted by a later update_inbox of the conversation.
+    Every participant but the sender then gets an unread increment, which is
+    accumulated in memory (see app/models/unread.py).
+    """
+
+    def __init__(self):
+        self.locks = ConversationLocks()
+
+    async def send(
+        self,
+        conversation_id: uuid.UUID,
+        sender_id: uuid.UUID,
+        receiver_id: uuid.UUID,
+        participants: List[uuid.UUID],
+        content: str,
+        conversation_index: int,
+        participant_indexes: List[int]
+    ) -> dict:
+        """
+        Run the pipeline for one message.
+
+        Args:
+            participants: Participant UUIDs
+            conversation_index: The conversation's API id, which keys its summary row
+            participant_indexes: Participant API ids, ordered by participant UUID
+
+        Returns:
+            The created message, as returned by MessageModel.create_message
+        """
+        start = time.perf_counter()
+        async with self.locks.hold(conversation_id) as state:
+            async with state.lock:
+                # Taken under the lock, so each send is newer than the one before it
+                timestamp = datetime.utcnow()
+
+                if state.last_activity is not None:
+                    previous_updated_at, previous_ms = state.last_activity, 0.0
+                else:
+                    previous_updated_at, previous_ms = await _timed(
+                        ConversationModel.get_last_message_time(conversation_id)
+                    )
+
+                # Neither depends on the inbox rows, so they need not hold the lock
+                writes = asyncio.gather(
+                    _timed(MessageModel.create_message(
+                        conversation_id=conversation_id,
+                        sender_id=sender_id,
+                        receiver_id=receiver_id,
+                        content=content,
+                        timestamp=timestamp
+                    )),
+                    _timed(ConversationModel.update_conversation_summary(
+                        conversation_index=conversation_index,
+                        conversation_id=conversation_id,
+                        participant_indexes=participant_indexes,
+                        last_message=content,
+                        last_message_at=timestamp
+                    ))
+                )
+                try:
+                    _, inbox_ms = await _timed(ConversationModel.update_inbox(
+                        conversation_id=conversation_id,
+                        participants=participants,
+                        last_message=content,
+                        last_updated_at=timestamp,
+                        previous_updated_at=previous_updated_at
+                    ))
+                except Exception:
+                    await asyncio.gather(writes, return_exceptions=True)
+                    raise
+                state.last_activity = timestamp
+
+            (message, message_ms), (_, summary_ms) = await writes
+
+        for participant in participants:
+            if participant != sender_id:
+                unread_tracker.increment(participant, conversation_id)
+
+        total_ms = (time.perf_counter() - start) * 1000
+        for stage, elapsed_ms in (
+            ("previous_activity", previous_ms),
+            ("message_insert", message_ms),
+            ("inbox_fanout", inbox_ms),
+            ("summary_update", summary_ms),
+            ("total", total_ms),
+        ):
+            stage_latency.observe((stage,), elapsed_ms / 1000)
+
+        logger.debug(
+            f"send pipeline: previous_activity={previous_ms:.1f}ms message_insert={message_ms:.1f}ms "
+            f"inbox_fanout={inbox_ms:.1f}ms summary_update={summary_ms:.1f}ms total={total_ms:.1f}ms"
+        )
+        return message
+
+
+send_pipeline = SendPipeline()
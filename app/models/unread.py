@@ -0,0 +1,159 @@
+"""
+Per-user unread message counts, kept in the unread_counts counter table.
+
+The send path only bumps an in-process accumulator. Increments for the same
+(user, conversation) are summed and written as one counter update every
+UNREAD_FLUSH_INTERVAL seconds, or sooner once UNREAD_MAX_PENDING pairs are
+waiting, so a hot conversation costs one write per interval rather than one
+per message. Reads add the increments still pending in this process.
+
+Counts are advisory: increments pending in a worker that crashes are lost,
+and a failed counter write is not retried, since counter updates are not
+idempotent and a retry could count a message twice.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.db.storage import storage
+from app.db.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS = {
+    "increment_unread": """
+        UPDATE unread_counts SET unread = unread + ?
+        WHERE user_id = ? AND conversation_id = ?
+    """,
+    "decrement_unread": """
+        UPDATE unread_counts SET unread = unread - ?
+        WHERE user_id = ? AND conversation_id = ?
+    """,
+    "select_unread_count": """
+        SELECT unread FROM unread_counts
+        WHERE user_id = ? AND conversation_id = ?
+    """,
+    "select_unread_counts": """
+        SELECT conversation_id, unread FROM unread_counts
+        WHERE user_id = ? AND conversation_id IN ?
+    """,
+}
+
+storage.register_statements(STATEMENTS)
+
+# Seconds between flushes of the accumulated increments
+UNREAD_FLUSH_INTERVAL = float(os.getenv("UNREAD_FLUSH_INTERVAL", "0.5"))
+# Pending (user, conversation) pairs that trigger a flush before the interval is up
+UNREAD_MAX_PENDING = int(os.getenv("UNREAD_MAX_PENDING", "10000"))
+# In-flight counter updates per flush
+UNREAD_FLUSH_CONCURRENCY = 64
+
+
+class UnreadTracker:
+    """Coalesces unread increments in memory and flushes them to unread_counts."""
+
+    def __init__(self, flush_interval: float = UNREAD_FLUSH_INTERVAL, max_pending: int = UNREAD_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[uuid.UUID, uuid.UUID], int] = {}
+        self._wakeup = asyncio.Event()
+        # Held while counter writes are in flight, so mark_read never reads a
+        # count that a flush is about to raise
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def increment(self, user_id: uuid.UUID, conversation_id: uuid.UUID, count: int = 1) -> None:
+        """Count `count` new messages for a user in a conversation."""
+        key = (user_id, conversation_id)
+        self._pending[key] = self._pending.get(key, 0) + count
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """Start the periodic flush task."""
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the flush task and write out what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Unread counter flush failed: {str(e)}")
+
+    async def flush(self) -> None:
+        """Write every pending increment as one counter update per (user, conversation)."""
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            items = list(pending.items())
+            for start in range(0, len(items), UNREAD_FLUSH_CONCURRENCY):
+                chunk = items[start:start + UNREAD_FLUSH_CONCURRENCY]
+                results = await asyncio.gather(*(
+                    storage.execute_prepared_aio("increment_unread", (count, user_id, conversation_id))
+                    for (user_id, conversation_id), count in chunk
+                ), return_exceptions=True)
+                failed = sum(1 for result in results if isinstance(result, Exception))
+                if failed:
+                    logger.warning(f"Dropped {failed} unread counter increments after write errors")
+
+    async def get_counts(self, user_id: uuid.UUID, conversation_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, int]:
+        """Return the user's unread count for each conversation, in one read."""
+        conversation_ids = list(set(conversation_ids))
+        if not conversation_ids:
+            return {}
+        result = await storage.execute_prepared_aio("select_unread_counts", (user_id, conversation_ids))
+        counts = {conversation_id: 0 for conversation_id in conversation_ids}
+        for row in result.current_rows:
+            counts[row["conversation_id"]] = row["unread"] or 0
+        for conversation_id in conversation_ids:
+            counts[conversation_id] = max(0, counts[conversation_id] + self._pending.get((user_id, conversation_id), 0))
+        return counts
+
+    async def mark_read(self, user_id: uuid.UUID, conversation_id: uuid.UUID) -> int:
+        """
+        Reset a user's unread count for a conversation.
+
+        A counter cannot be set, so it is decremented by the value just read;
+        messages counted concurrently by another worker stay unread.
+
+        Returns:
+            The number of messages that were unread
+        """
+        async with self._lock:
+            pending = self._pending.pop((user_id, conversation_id), 0)
+            row = (await storage.execute_prepared_aio(
+                "select_unread_count", (user_id, conversation_id)
+            )).one()
+            stored = (row["unread"] or 0) if row else 0
+            if stored:
+                await storage.execute_prepared_aio("decrement_unread", (stored, user_id, conversation_id))
+        return max(0, stored + pending)
+
+
+unread_tracker = UnreadTracker()
+
+metrics.register_value(
+    "messenger_unread_pending", "gauge", "Conversations with unread increments waiting to be flushed.",
+    lambda: unread_tracker.pending
+)
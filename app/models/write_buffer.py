@@ -0,0 +1,230 @@
+"""
+Group commit of message inserts, used when WRITE_BUFFER=1.
+
+Instead of one insert per POST /api/messages/, create_message hands its row
+to the buffer and awaits a future. Rows are grouped by partition (the
+conversation, or its day bucket with MESSAGE_BUCKETING=day) and written as
+one unlogged batch per partition, all partitions concurrently. A partition's
+rows are split into batches of at most WRITE_BUFFER_MAX_BATCH rows and about
+WRITE_BUFFER_MAX_BATCH_BYTES of encoded data, which keeps each batch under
+Cassandra's batch_size_fail_threshold (50KB by default). A flush starts
+once WRITE_BUFFER_MAX_BATCH rows are waiting or WRITE_BUFFER_MAX_DELAY
+seconds after the first of them arrived. Rows that arrive while a flush is in
+flight form the next one, so batches grow with load.
+
+Each caller's future resolves only after the batch holding its row was
+acknowledged, or fails with the batch's error, so a send is as durable as
+with direct writes. The cost is up to WRITE_BUFFER_MAX_DELAY of added latency
+when traffic is light; the flush latency and batch size histograms at
+/metrics show where that trade-off sits.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+import contextvars
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.db.storage import storage
+from app.db.metrics import metrics, Histogram
+from app.db.schema import MESSAGE_BUCKETING, day_bucket
+from app.models import message_buckets
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER = os.getenv("WRITE_BUFFER", "0") == "1"
+# Waiting rows that start a flush straight away; also the most rows per partition batch
+WRITE_BUFFER_MAX_BATCH = int(os.getenv("WRITE_BUFFER_MAX_BATCH", "64"))
+# Longest a row waits for others before it is flushed, in seconds
+WRITE_BUFFER_MAX_DELAY = float(os.getenv("WRITE_BUFFER_MAX_DELAY", "0.002"))
+# Most estimated bytes per partition batch; below the server's 50KB batch_size_fail_threshold
+WRITE_BUFFER_MAX_BATCH_BYTES = int(os.getenv("WRITE_BUFFER_MAX_BATCH_BYTES", "40960"))
+
+# Estimated encoded bytes of a message row besides its content: three UUIDs,
+# the timestamp and per-cell overhead
+ROW_OVERHEAD_BYTES = 100
+
+# Upper bounds of the rows-per-flush histogram
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class MessageWriteBuffer:
+    """Coalesces concurrent message inserts into partition-grouped batches."""
+
+    def __init__(
+        self,
+        max_batch: int = WRITE_BUFFER_MAX_BATCH,
+        max_delay: float = WRITE_BUFFER_MAX_DELAY,
+        max_batch_bytes: int = WRITE_BUFFER_MAX_BATCH_BYTES
+    ):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_batch_bytes = max_batch_bytes
+        # Partition key -> (insert params, future of the caller) in arrival order
+        self._pending: Dict[tuple, List[Tuple[tuple, asyncio.Future]]] = {}
+        self._count = 0
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.flush_latency = Histogram()
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+
+    @property
+    def pending(self) -> int:
+        return self._count
+
+    async def start(self) -> None:
+        """Start the flush task."""
+        if self._task is None:
+            self._closing = False
+            # A fresh context, so flushes are not counted towards the request
+            # that happened to start the task (see metrics.track_queries)
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def close(self) -> None:
+        """Stop the flush task once its current flush is done, then write out what is still pending."""
+        if self._task is not None:
+            self._closing = True
+            # Wake the task without waiting out the delay
+            self._has_pending.set()
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def write(
+        self,
+        conversation_id: uuid.UUID,
+        timestamp: datetime,
+        message_id: uuid.UUID,
+        sender_id: uuid.UUID,
+        receiver_id: uuid.UUID,
+        content: str
+    ) -> None:
+        """
+        Queue a message insert and wait until it is written.
+
+        Raises:
+            Exception: The error of the batch that carried the message
+        """
+        await self.start()
+        if MESSAGE_BUCKETING == "day":
+            key = (conversation_id, day_bucket(timestamp))
+        else:
+            key = (conversation_id,)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, []).append(
+            ((timestamp, message_id, sender_id, receiver_id, content), future)
+        )
+        self._count += 1
+        self._has_pending.set()
+        if self._count >= self.max_batch:
+            self._full.set()
+        await future
+
+    async def _run(self) -> None:
+        while not self._closing:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Message write buffer flush failed: {str(e)}")
+
+    async def flush(self) -> None:
+        """Write every waiting message, one batch per partition, and resolve the callers."""
+        pending, self._pending, count = self._pending, {}, self._count
+        self._count = 0
+        self._has_pending.clear()
+        self._full.clear()
+        if not count:
+            return
+
+        start = time.perf_counter()
+        writes, groups = [], []
+        for key, entries in pending.items():
+            for group in self._split(entries):
+                writes.append(_write_partition(key, [params for params, _ in group]))
+                groups.append(group)
+        written = asyncio.gather(*writes, return_exceptions=True)
+        try:
+            results = await asyncio.shield(written)
+        except asyncio.CancelledError:
+            # Cancelled mid-flush: the writes carry on, so tell each caller
+            # what happened to its row before stopping
+            _resolve(groups, await written)
+            raise
+        self.flush_latency.observe(time.perf_counter() - start)
+        self.batch_size.observe(count)
+        _resolve(groups, results)
+
+    def _split(self, entries: List[Tuple[tuple, asyncio.Future]]) -> List[List[Tuple[tuple, asyncio.Future]]]:
+        """Split one partition's entries into batches within both the row and the byte limit."""
+        groups, group, size = [], [], 0
+        for entry in entries:
+            row_size = _row_size(entry[0])
+            if group and (len(group) >= self.max_batch or size + row_size > self.max_batch_bytes):
+                groups.append(group)
+                group, size = [], 0
+            group.append(entry)
+            size += row_size
+        if group:
+            groups.append(group)
+        return groups
+
+
+def _row_size(row: tuple) -> int:
+    """Estimated encoded bytes of a (timestamp, message_id, sender_id, receiver_id, content) row."""
+    return ROW_OVERHEAD_BYTES + len(row[4].encode("utf-8"))
+
+
+def _resolve(groups: List[List[Tuple[tuple, asyncio.Future]]], results: List[object]) -> None:
+    """Resolve each caller's future with the outcome of the batch that carried its row."""
+    for group, result in zip(groups, results):
+        for _, future in group:
+            # The caller may have given up waiting; its row was written anyway
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(None)
+
+
+async def _write_partition(key: tuple, rows: List[tuple]) -> None:
+    """Write (timestamp, message_id, sender_id, receiver_id, content) rows of one partition."""
+    if MESSAGE_BUCKETING == "day":
+        conversation_id, bucket = key
+        await message_buckets.insert_bucket_messages(conversation_id, bucket, rows)
+    elif len(rows) == 1:
+        # A lone row, possibly one too large to share a batch, is a plain insert
+        conversation_id, = key
+        await storage.execute_prepared_aio("insert_message", (conversation_id,) + rows[0])
+    else:
+        conversation_id, = key
+        await storage.execute_batch_aio([
+            ("insert_message", (conversation_id,) + row) for row in rows
+        ])
+
+
+# The buffer used by MessageModel.create_message when WRITE_BUFFER=1
+message_write_buffer = MessageWriteBuffer()
+
+metrics.register_value(
+    "messenger_write_buffer_pending", "gauge", "Message inserts waiting for the next group commit.",
+    lambda: message_write_buffer.pending
+)
+metrics.register_histogram(
+    "messenger_write_buffer_flush_duration_seconds", "Time to write one group commit of messages.",
+    message_write_buffer.flush_latency
+)
+metrics.register_histogram(
+    "messenger_write_buffer_batch_messages", "Messages written per group commit.",
+    message_write_buffer.batch_size
+)
@@ -0,0 +1,82 @@
+"""
+Broadcast backends for the push hub.
+
+A message sent on one API worker must reach clients connected to any worker.
+The hub hands every event to a BroadcastBackend, which delivers it to the
+hub of every worker (including its own) through the handler it was started
+with. LocalBroadcast delivers in-process only, which is enough for a single
+worker and for tests.
+
+The backend is chosen with the PUSH_BROADCAST variable: "local" (the
+default) or the import path of a BroadcastBackend subclass, e.g.
+"mypackage.redis_broadcast:RedisBroadcast".
+"""
+import os
+import importlib
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional
+
+# Called with the recipient user indexes and the encoded event
+DeliveryHandler = Callable[[List[int], bytes], None]
+
+
+class BroadcastBackend(ABC):
+    """Carries encoded push events to the hubs of every API worker."""
+
+    name: str = "broadcast"
+
+    @abstractmethod
+    async def start(self, deliver: DeliveryHandler) -> None:
+        """Start receiving events, passing each one to `deliver` on the event loop."""
+
+    @abstractmethod
+    async def publish(self, recipients: List[int], payload: bytes) -> None:
+        """
+        Send an event to every worker.
+
+        Args:
+            recipients: User indexes the event is for
+            payload: The encoded event, sent to clients as is
+        """
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Stop receiving events and release connections."""
+
+
+class LocalBroadcast(BroadcastBackend):
+    """Delivers events to this process only."""
+
+    name = "local"
+
+    def __init__(self):
+        self._deliver: Optional[DeliveryHandler] = None
+
+    async def start(self, deliver: DeliveryHandler) -> None:
+        self._deliver = deliver
+
+    async def publish(self, recipients: List[int], payload: bytes) -> None:
+        if self._deliver is not None:
+            self._deliver(recipients, payload)
+
+    async def close(self) -> None:
+        self._deliver = None
+
+
+def create_broadcast_backend(kind: Optional[str] = None) -> BroadcastBackend:
+    """
+    Create the broadcast backend selected by `kind` or the PUSH_BROADCAST variable.
+
+    Args:
+        kind: "local" or "module.path:ClassName"; defaults to PUSH_BROADCAST, then "local"
+    """
+    kind = kind or os.getenv("PUSH_BROADCAST", "local")
+    if kind.lower() == "local":
+        return LocalBroadcast()
+    module_name, _, class_name = kind.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown PUSH_BROADCAST {kind!r}; expected 'local' or 'module:Class'")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    if not issubclass(backend_class, BroadcastBackend):
+        raise ValueError(f"PUSH_BROADCAST {kind!r} is not a BroadcastBackend")
+    return backend_class()
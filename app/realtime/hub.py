@@ -0,0 +1,130 @@
+"""
+In-process fan-out of new messages to connected clients.
+
+Each WebSocket or SSE connection subscribes for one user and gets a bounded
+queue. Publishing goes through the broadcast backend (app/realtime/broadcast.py)
+so events reach the connections held by every API worker. A connection that
+falls PUSH_QUEUE_SIZE events behind is dropped rather than buffered without
+bound or silently skipped; the client reconnects and catches up over the
+message endpoints.
+"""
+import os
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from app.db.metrics import metrics
+from app.realtime.broadcast import BroadcastBackend, create_broadcast_backend
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before it counts as a slow consumer
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "256"))
+
+
+class Subscription:
+    """One connection's queue of encoded events."""
+
+    def __init__(self, user_index: int, queue_size: int):
+        self.user_index = user_index
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.dropped = False
+
+    def offer(self, payload: bytes) -> bool:
+        """Queue an event; returns False (and drops the subscription) if the queue is full."""
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.close()
+            return False
+
+    def close(self) -> None:
+        """Discard queued events and wake the consumer up with the None sentinel."""
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Next event, or None once the subscription was dropped.
+
+        Raises:
+            asyncio.TimeoutError: No event arrived within `timeout` seconds
+        """
+        if timeout is None:
+            return await self.queue.get()
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class PushHub:
+    """Tracks the connections of each user and fans published events out to them."""
+
+    def __init__(self, backend: BroadcastBackend, queue_size: int = PUSH_QUEUE_SIZE):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        await self.backend.start(self.deliver)
+
+    async def close(self) -> None:
+        await self.backend.close()
+        for subscriptions in list(self._subscriptions.values()):
+            for subscription in list(subscriptions):
+                subscription.close()
+        self._subscriptions.clear()
+
+    @property
+    def connections(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def subscribe(self, user_index: int) -> Subscription:
+        subscription = Subscription(user_index, self.queue_size)
+        self._subscriptions.setdefault(user_index, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.user_index)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.user_index]
+
+    async def publish(self, recipients: List[int], payload: bytes) -> None:
+        """Send an encoded event to the connections of `recipients` on every worker."""
+        await self.backend.publish(recipients, payload)
+
+    def deliver(self, recipients: List[int], payload: bytes) -> None:
+        """Queue an event on this worker's connections for `recipients`."""
+        for user_index in set(recipients):
+            for subscription in list(self._subscriptions.get(user_index, ())):
+                if subscription.offer(payload):
+                    self.delivered += 1
+                else:
+                    self.dropped += 1
+                    self.unsubscribe(subscription)
+                    logger.warning(f"Dropped slow push consumer for user {user_index}")
+
+
+# The hub used by the API
+push_hub = PushHub(create_broadcast_backend())
+
+metrics.register_value(
+    "messenger_push_connections", "gauge", "Open push connections on this worker.",
+    lambda: push_hub.connections
+)
+metrics.register_value(
+    "messenger_push_delivered_total", "counter", "Events queued on push connections.",
+    lambda: push_hub.delivered
+)
+metrics.register_value(
+    "messenger_push_dropped_total", "counter", "Push connections dropped as slow consumers.",
+    lambda: push_hub.dropped
+)
@@ -7,8 +7,9 @@ class ConversationResponse(BaseModel):
     id: int = Field(..., description="Unique ID of the conversation")
     user1_id: int = Field(..., description="ID of the first user")
     user2_id: int = Field(..., description="ID of the second user")
-    last_message_at: datetime = Field(..., description="Timestamp of the last message")
+    last_message_at: Optional[datetime] = Field(None, description="Timestamp of the last message; null until the first message")
     last_message_content: Optional[str] = Field(None, description="Content of the last message")
+    unread_count: Optional[int] = Field(None, description="Messages the user has not read yet; only set in a user's conversation list")
 
 class ConversationDetail(ConversationResponse):
     messages: List[MessageResponse] = Field(..., description="List of messages in conversation")
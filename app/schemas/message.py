@@ -1,3 +1,4 @@
+import uuid
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
@@ -11,6 +12,7 @@ class MessageCreate(MessageBase):
 
 class MessageResponse(MessageBase):
     id: int = Field(..., description="Unique ID of the message")
+    message_id: uuid.UUID = Field(..., description="ID of the stored message; the same message delivered twice (sync overlap, push) has the same message_id")
     sender_id: int = Field(..., description="ID of the sender")
     receiver_id: int = Field(..., description="ID of the receiver")
     created_at: datetime = Field(..., description="Timestamp when message was created")
@@ -25,4 +27,17 @@ class PaginatedMessageResponse(BaseModel):
     total: int = Field(..., description="Total number of messages")
     page: int = Field(..., description="Current page number")
     limit: int = Field(..., description="Number of items per page")
-    data: List[MessageResponse] = Field(..., description="List of messages") 
\ No newline at end of file
+    data: List[MessageResponse] = Field(..., description="List of messages")
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page") 
+
+class BulkMessageResult(BaseModel):
+    line: int = Field(..., description="1-based line number in the NDJSON request body")
+    status: str = Field(..., description="ok or error")
+    conversation_id: Optional[int] = Field(None, description="ID of the conversation the message was written to")
+    created_at: Optional[datetime] = Field(None, description="Timestamp when message was created")
+    detail: Optional[str] = Field(None, description="Why the line failed")
+
+class SyncResponse(BaseModel):
+    data: List[MessageResponse] = Field(..., description="Messages newer than the since cursor across the user's conversations, oldest first. Messages from the last few seconds before the cursor are sent again, to catch writes that landed late; deduplicate them by message_id")
+    next_cursor: str = Field(..., description="Cursor to pass as since on the next sync")
+    has_more: bool = Field(..., description="True if more messages are waiting; sync again right away with next_cursor")
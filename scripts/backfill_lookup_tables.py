@@ -0,0 +1,103 @@
+"""
+One-shot backfill of the users_by_index and conversations_by_index lookup
+tables from user_details and conversation_metadata. Also starts the
+'conversation' index allocator after the highest existing index.
+
+Safe to re-run: the lookup rows are plain upserts keyed by index, and the
+allocator is only ever moved forward.
+Run scripts/setup_db.py first so the lookup tables exist.
+"""
+import os
+import logging
+from cassandra.cluster import Cluster
+from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.query import SimpleStatement, dict_factory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cassandra connection settings
+CASSANDRA_HOST = os.getenv("CASSANDRA_HOST", "localhost")
+CASSANDRA_KEYSPACE = os.getenv("CASSANDRA_KEYSPACE", "messenger")
+
+PAGE_SIZE = 1000  # Rows read per page of the source table scan
+CONCURRENCY = 100  # In-flight lookup-table writes
+
+
+def backfill(session, source_query, insert_query, key_column, value_column):
+    """
+    Copy (index, uuid) pairs from a source table scan into a lookup table.
+
+    Returns:
+        Number of rows written and the highest index seen
+    """
+    insert = session.prepare(insert_query)
+    rows = session.execute(SimpleStatement(source_query, fetch_size=PAGE_SIZE))
+
+    written = 0
+    highest = 0
+    while True:
+        page = [
+            (row[key_column], row[value_column])
+            for row in rows.current_rows
+            if row[key_column] is not None
+        ]
+        results = execute_concurrent_with_args(
+            session, insert, page, concurrency=CONCURRENCY, raise_on_first_error=True
+        )
+        written += len(results)
+        highest = max([highest] + [key for key, _ in page])
+
+        if not rows.has_more_pages:
+            break
+        rows.fetch_next_page()
+
+    return written, highest
+
+
+def advance_allocator(session, name, next_index):
+    """Move an index_allocators row forward to at least next_index."""
+    insert = session.prepare("INSERT INTO index_allocators (name, next_index) VALUES (?, ?) IF NOT EXISTS")
+    update = session.prepare("UPDATE index_allocators SET next_index = ? WHERE name = ? IF next_index = ?")
+    row = session.execute(insert, (name, next_index)).one()
+    while not row["[applied]"] and row["next_index"] < next_index:
+        row = session.execute(update, (next_index, name, row["next_index"])).one()
+
+
+def main():
+    """Backfill both lookup tables."""
+    cluster = None
+
+    try:
+        cluster = Cluster([CASSANDRA_HOST])
+        session = cluster.connect(CASSANDRA_KEYSPACE)
+        session.row_factory = dict_factory
+
+        users, _ = backfill(
+            session,
+            "SELECT user_id, user_index FROM user_details",
+            "INSERT INTO users_by_index (user_index, user_id) VALUES (?, ?)",
+            "user_index", "user_id"
+        )
+        logger.info(f"Backfilled {users} rows into users_by_index")
+
+        conversations, highest = backfill(
+            session,
+            "SELECT conversation_id, conversation_index FROM conversation_metadata",
+            "INSERT INTO conversations_by_index (conversation_index, conversation_id) VALUES (?, ?)",
+            "conversation_index", "conversation_id"
+        )
+        logger.info(f"Backfilled {conversations} rows into conversations_by_index")
+
+        advance_allocator(session, "conversation", highest + 1)
+        logger.info(f"New conversations start at index {highest + 1} or later")
+    except Exception as e:
+        logger.error(f"Backfill failed: {str(e)}")
+        raise
+    finally:
+        if cluster:
+            cluster.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Concurrency benchmark for the asyncio data path.
+
+Drives the FastAPI app in-process (a single worker, one event loop) with an
+async HTTP client and measures throughput as the number of in-flight
+requests grows. With a non-blocking data layer, throughput should scale with
+concurrency until Cassandra or the CPU saturates. With blocking calls it
+stays flat.
+
+Needs a keyspace populated by scripts/generate_test_data.py.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def run_level(client, path, concurrency, requests):
+    """Issue `requests` GETs with `concurrency` in flight and return req/s."""
+    remaining = requests
+    errors = 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            response = await client.get(path)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        logger.warning(f"{errors} requests failed at concurrency {concurrency}")
+    return requests / elapsed
+
+
+async def main_async(args):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        # Warm up prepared statements and lookup caches
+        await client.get(args.path)
+
+        baseline = None
+        for concurrency in args.concurrency:
+            rate = await run_level(client, args.path, concurrency, args.requests)
+            baseline = baseline or rate
+            logger.info(
+                f"in-flight={concurrency:<4} {rate:>9,.0f} req/s  ({rate / baseline:.2f}x vs {args.concurrency[0]})"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--path", default="/api/messages/conversation/1?limit=20",
+        help="Endpoint to request"
+    )
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per concurrency level")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64],
+        help="In-flight request counts to measure"
+    )
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark bulk NDJSON ingestion against the single-message route.
+
+Sends the same set of messages once through POST /api/messages/ (with
+bounded client concurrency) and once as a streamed NDJSON body to
+POST /api/messages/bulk, and reports messages/sec for each.
+The app runs in-process; user IDs must exist (see scripts/generate_test_data.py).
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def make_messages(count, num_users):
+    """Random sender/receiver pairs over user IDs 0..num_users-1."""
+    messages = []
+    for i in range(count):
+        sender, receiver = random.sample(range(num_users), 2)
+        messages.append({"sender_id": sender, "receiver_id": receiver, "content": f"bulk benchmark {i}"})
+    return messages
+
+
+async def single_route(client, messages, concurrency):
+    """POST each message individually with `concurrency` requests in flight."""
+    queue = list(messages)
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        while queue:
+            response = await client.post("/api/messages/", json=queue.pop())
+            if response.status_code != 201:
+                failures += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return failures
+
+
+async def bulk_route(client, messages, body_chunk_lines):
+    """Stream all messages as one NDJSON body and consume the NDJSON results."""
+
+    async def body():
+        for start in range(0, len(messages), body_chunk_lines):
+            lines = messages[start:start + body_chunk_lines]
+            yield "".join(json.dumps(m) + "\n" for m in lines).encode()
+
+    failures = 0
+    async with client.stream("POST", "/api/messages/bulk", content=body()) as response:
+        async for line in response.aiter_lines():
+            if line and json.loads(line)["status"] != "ok":
+                failures += 1
+    return failures
+
+
+async def main_async(args):
+    messages = make_messages(args.messages, args.users)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for label, run in (
+            ("single-message route", lambda: single_route(client, messages, args.concurrency)),
+            ("bulk NDJSON route", lambda: bulk_route(client, messages, args.body_chunk_lines)),
+        ):
+            start = time.perf_counter()
+            failures = await run()
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"{label:<22} {len(messages)} messages in {elapsed:.2f}s -> "
+                f"{len(messages) / elapsed:,.0f} msg/s ({failures} failed)"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000, help="Messages per route")
+    parser.add_argument("--users", type=int, default=10, help="User IDs to pick senders/receivers from")
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests for the single route")
+    parser.add_argument("--body-chunk-lines", type=int, default=200, help="NDJSON lines per streamed body chunk")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
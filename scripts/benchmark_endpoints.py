@@ -0,0 +1,285 @@
+"""
+End-to-end latency benchmark for the API endpoints.
+
+Drives the FastAPI app in-process with an async HTTP client and measures,
+for each endpoint, p50/p95/p99 latency, throughput and storage round trips
+per request:
+
+    send_message                    POST /api/messages/
+    get_conversation_messages       GET  /api/messages/conversation/{id}
+    get_messages_before_timestamp   GET  /api/messages/conversation/{id}/before
+    get_user_conversations          GET  /api/conversations/user/{id}
+    get_conversation                GET  /api/conversations/{id}
+
+The dataset is seeded through the API, so the benchmark runs against either
+storage backend. STORAGE_BACKEND=memory needs no database:
+
+    STORAGE_BACKEND=memory python scripts/benchmark_endpoints.py \\
+        --users 200 --conversations 500 --messages 40 --output bench.json
+
+Results are written as JSON. Pass a previous result file with --baseline to
+print the change per endpoint. Add --max-regression to exit non-zero when
+p95 latency or throughput regress by more than the given percentage.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+import platform
+from datetime import datetime
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.db.storage import storage
+from app.db.metrics import track_queries
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEED_STATEMENTS = {
+    "benchmark_insert_user_details": """
+        INSERT INTO user_details (user_id, user_index, username, full_name, email)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    "benchmark_insert_user_index": """
+        INSERT INTO users_by_index (user_index, user_id)
+        VALUES (?, ?)
+    """,
+}
+
+ENDPOINTS = [
+    "send_message",
+    "get_conversation_messages",
+    "get_messages_before_timestamp",
+    "get_user_conversations",
+    "get_conversation",
+]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def seed(client, args, rng):
+    """
+    Create users 0..users-1 and conversations between random user pairs.
+
+    Returns:
+        Conversation indexes created, one per pair
+    """
+    params = []
+    for i in range(args.users):
+        user_id = uuid.uuid4()
+        params.append(("benchmark_insert_user_details", (user_id, i, f"user{i+1}", f"Test User {i+1}", f"user{i+1}@example.com")))
+        params.append(("benchmark_insert_user_index", (i, user_id)))
+    for name, values in params:
+        await storage.execute_prepared_aio(name, values)
+
+    pairs = set()
+    while len(pairs) < args.conversations:
+        pairs.add(tuple(sorted(rng.sample(range(args.users), 2))))
+
+    conversations = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def fill(pair):
+        async with semaphore:
+            conversation_id = None
+            for j in range(args.messages):
+                sender, receiver = pair if j % 2 == 0 else pair[::-1]
+                response = await client.post(
+                    "/api/messages/",
+                    json={"sender_id": sender, "receiver_id": receiver, "content": f"seed {j}"}
+                )
+                response.raise_for_status()
+                conversation_id = response.json()["conversation_id"]
+            conversations.append(conversation_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(fill(pair) for pair in pairs))
+    logger.info(
+        f"Seeded {args.users} users, {len(conversations)} conversations, "
+        f"{len(conversations) * args.messages} messages in {time.perf_counter() - start:.1f}s"
+    )
+    return conversations
+
+
+def make_request(endpoint, client, args, rng, conversations):
+    """Build one request coroutine for an endpoint with random arguments."""
+    if endpoint == "send_message":
+        sender, receiver = rng.sample(range(args.users), 2)
+        return client.post(
+            "/api/messages/",
+            json={"sender_id": sender, "receiver_id": receiver, "content": "benchmark"}
+        )
+    if endpoint == "get_conversation_messages":
+        return client.get(
+            f"/api/messages/conversation/{rng.choice(conversations)}",
+            params={"limit": args.page_size}
+        )
+    if endpoint == "get_messages_before_timestamp":
+        return client.get(
+            f"/api/messages/conversation/{rng.choice(conversations)}/before",
+            params={"before_timestamp": datetime.utcnow().isoformat(), "limit": args.page_size}
+        )
+    if endpoint == "get_user_conversations":
+        return client.get(
+            f"/api/conversations/user/{rng.randrange(args.users)}",
+            params={"limit": args.page_size}
+        )
+    return client.get(f"/api/conversations/{rng.choice(conversations)}")
+
+
+async def run_endpoint(endpoint, client, args, rng, conversations):
+    """Issue args.requests requests with args.concurrency in flight and return the stats."""
+    for _ in range(args.warmup):
+        await make_request(endpoint, client, args, rng, conversations)
+
+    remaining = args.requests
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            request = make_request(endpoint, client, args, rng, conversations)
+            start = time.perf_counter()
+            response = await request
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    # Counted by the storage backend itself, as for the X-DB-Queries header
+    with track_queries() as queries:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "mean_ms": sum(latencies) / len(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "round_trips_per_request": queries.queries / len(latencies),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """
+    Log the change of each endpoint against a baseline run.
+
+    Returns:
+        Endpoints whose p95 latency or throughput regressed by more than max_regression percent
+    """
+    regressions = []
+    for endpoint, current in results.items():
+        previous = baseline.get("results", {}).get(endpoint)
+        if not previous:
+            logger.info(f"{endpoint:<30} not in baseline")
+            continue
+        p95_change = (current["p95_ms"] / previous["p95_ms"] - 1) * 100 if previous["p95_ms"] else 0.0
+        rps_change = (current["throughput_rps"] / previous["throughput_rps"] - 1) * 100
+        trips_change = current["round_trips_per_request"] - previous["round_trips_per_request"]
+        logger.info(
+            f"{endpoint:<30} p95 {p95_change:+7.1f}%  throughput {rps_change:+7.1f}%  "
+            f"round trips {trips_change:+.2f}/req"
+        )
+        if max_regression is not None and (p95_change > max_regression or -rps_change > max_regression):
+            regressions.append(endpoint)
+    return regressions
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    storage.register_statements(SEED_STATEMENTS)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        if args.no_seed:
+            conversations = list(range(1, args.conversations + 1))
+        else:
+            conversations = await seed(client, args, rng)
+
+        results = {}
+        for endpoint in args.endpoints:
+            stats = await run_endpoint(endpoint, client, args, rng, conversations)
+            results[endpoint] = stats
+            logger.info(
+                f"{endpoint:<30} p50={stats['p50_ms']:7.2f}ms p95={stats['p95_ms']:7.2f}ms "
+                f"p99={stats['p99_ms']:7.2f}ms {stats['throughput_rps']:>8,.0f} req/s "
+                f"{stats['round_trips_per_request']:5.2f} trips/req ({stats['errors']} errors)"
+            )
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Messenger API endpoints")
+    parser.add_argument("--users", type=int, default=100, help="Users in the dataset (IDs 0..users-1)")
+    parser.add_argument("--conversations", type=int, default=200, help="Conversations in the dataset")
+    parser.add_argument("--messages", type=int, default=30, help="Messages seeded per conversation")
+    parser.add_argument("--no-seed", action="store_true",
+                        help="Use existing data (users 0..users-1, conversations 1..conversations) instead of seeding")
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="In-flight requests")
+    parser.add_argument("--page-size", type=int, default=20, help="limit parameter for read endpoints")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS, help="Endpoints to measure")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the dataset and request mix")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="With --baseline, exit 1 if p95 or throughput regress by more than this percent")
+    args = parser.parse_args(argv)
+    if args.users < 2:
+        parser.error("--users must be at least 2")
+    if args.conversations > args.users * (args.users - 1) // 2:
+        parser.error("--conversations exceeds the number of distinct user pairs")
+    return args
+
+
+def main():
+    args = parse_args()
+    results = asyncio.run(main_async(args))
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "backend": storage.name,
+            "python": platform.python_version(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "max_regression")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            logger.error(f"Regressed beyond {args.max_regression}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark unprepared vs prepared CQL for the hot message queries.
+
+Measures requests/sec for the message insert and the message page read,
+first with the raw %s-interpolated query strings the models used to send,
+then with the prepared statements registered by the models.
+Run against a keyspace created by scripts/setup_db.py.
+"""
+import os
+import sys
+import time
+import uuid
+import logging
+import argparse
+from datetime import datetime
+
+from cassandra.cluster import Cluster
+from cassandra.query import SimpleStatement, dict_factory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.cassandra_models import STATEMENTS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cassandra connection settings
+CASSANDRA_HOST = os.getenv("CASSANDRA_HOST", "localhost")
+CASSANDRA_KEYSPACE = os.getenv("CASSANDRA_KEYSPACE", "messenger")
+
+RAW_INSERT = """
+    INSERT INTO messages_by_conversation (
+        conversation_id, timestamp, message_id, sender_id, receiver_id, content
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+RAW_PAGE_READ = """
+    SELECT * FROM messages_by_conversation
+    WHERE conversation_id = %s
+"""
+
+
+def run(label, iterations, fn):
+    """Call fn iterations times and log the achieved requests/sec."""
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed if elapsed else float("inf")
+    logger.info(f"{label:<28} {iterations} requests in {elapsed:.2f}s -> {rate:,.0f} req/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=5000, help="Requests per scenario")
+    parser.add_argument("--page-size", type=int, default=20, help="Fetch size for the page read")
+    args = parser.parse_args()
+
+    cluster = Cluster([CASSANDRA_HOST])
+    session = cluster.connect(CASSANDRA_KEYSPACE)
+    session.row_factory = dict_factory
+
+    # Benchmark rows go to a throwaway conversation partition
+    conversation_id = uuid.uuid4()
+    sender_id = uuid.uuid4()
+    receiver_id = uuid.uuid4()
+
+    def insert_params(i):
+        return (conversation_id, datetime.utcnow(), uuid.uuid4(), sender_id, receiver_id, f"bench {i}")
+
+    prepared_insert = session.prepare(STATEMENTS["insert_message"])
+    prepared_page_read = session.prepare(STATEMENTS["select_messages_page"])
+    raw_page_read = SimpleStatement(RAW_PAGE_READ, fetch_size=args.page_size)
+
+    def bind_page(prepared):
+        statement = prepared.bind((conversation_id,))
+        statement.fetch_size = args.page_size
+        return statement
+
+    try:
+        results = {
+            "insert (raw)": run(
+                "insert (raw)", args.iterations,
+                lambda i: session.execute(RAW_INSERT, insert_params(i))
+            ),
+            "insert (prepared)": run(
+                "insert (prepared)", args.iterations,
+                lambda i: session.execute(prepared_insert, insert_params(i))
+            ),
+            "page read (raw)": run(
+                "page read (raw)", args.iterations,
+                lambda i: session.execute(raw_page_read, (conversation_id,)).current_rows
+            ),
+            "page read (prepared)": run(
+                "page read (prepared)", args.iterations,
+                lambda i: session.execute(bind_page(prepared_page_read)).current_rows
+            ),
+        }
+
+        for query in ("insert", "page read"):
+            speedup = results[f"{query} (prepared)"] / results[f"{query} (raw)"]
+            logger.info(f"{query}: prepared is {speedup:.2f}x the raw throughput")
+    finally:
+        session.execute("DELETE FROM messages_by_conversation WHERE conversation_id = %s", (conversation_id,))
+        cluster.shutdown()
+
+
+if __name__ == "__main__":
+    main()
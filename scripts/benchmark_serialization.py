@@ -0,0 +1,97 @@
+"""
+Microbenchmark of message page serialization cost per page size.
+
+Compares, for the same formatted page, the default path (MessageResponse
+models validated again against the route's response_model and dumped by
+FastAPI) with the FAST_SERIALIZATION path (plain dicts encoded by
+app.api.responses.dumps). Storage reads and user lookups are excluded. Also
+checks that both paths produce the same bytes:
+
+    python scripts/benchmark_serialization.py --sizes 20 100 250 500
+"""
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+from fastapi.routing import APIRoute, serialize_response
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.routes import message_router
+from app.controllers import message_controller
+from app.api.responses import orjson
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROUTE_PATH = "/api/messages/conversation/{conversation_id}"
+
+
+def make_page(size):
+    """A formatted page of `size` messages, as _format_messages returns it."""
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "content": f"Message {i} {uuid.uuid4()}",
+            "id": 1,
+            "message_id": uuid.uuid4(),
+            "sender_id": i % 7,
+            "receiver_id": (i + 1) % 7,
+            # Millisecond precision, as Cassandra returns timestamps
+            "created_at": start + timedelta(milliseconds=1234 * i),
+            "conversation_id": 42
+        }
+        for i in range(size)
+    ]
+
+
+async def default_body(route, messages):
+    message_controller.FAST_SERIALIZATION = False
+    page = message_controller._message_page(messages, 1, len(messages), "cursor")
+    return await serialize_response(field=route.response_field, response_content=page, dump_json=True)
+
+
+async def fast_body(route, messages):
+    message_controller.FAST_SERIALIZATION = True
+    return message_controller._message_page(messages, 1, len(messages), "cursor").body
+
+
+async def measure(fn, route, messages, iterations):
+    """Mean milliseconds per call."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn(route, messages)
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+async def main_async(args):
+    route = next(r for r in message_router.routes if isinstance(r, APIRoute) and r.path == ROUTE_PATH)
+    logger.info(f"Fast path encoder: {'orjson' if orjson is not None else 'pydantic-core'}")
+    logger.info(f"{'page size':>9} {'default ms':>11} {'fast ms':>9} {'speedup':>8} {'bytes':>8}")
+
+    for size in args.sizes:
+        messages = make_page(size)
+        body = await default_body(route, messages)
+        if body != await fast_body(route, messages):
+            raise SystemExit(f"Serialization paths disagree for a page of {size}")
+
+        default_ms = await measure(default_body, route, messages, args.iterations)
+        fast_ms = await measure(fast_body, route, messages, args.iterations)
+        logger.info(f"{size:>9} {default_ms:>11.3f} {fast_ms:>9.3f} {default_ms / fast_ms:>7.1f}x {len(body):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 250, 500], help="Page sizes to measure")
+    parser.add_argument("--iterations", type=int, default=200, help="Serializations per page size and path")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Check every endpoint against a declared storage query budget.
+
+Seeds a small dataset, then calls each endpoint in-process with cold lookup
+caches (the worst case) inside app.db.query_budget.query_budget. Exits
+non-zero if an endpoint issues more round trips than its budget or any
+ALLOW FILTERING statement, so a fan-out regression fails CI instead of
+production. Uses the in-memory backend unless STORAGE_BACKEND is set:
+
+    python scripts/check_query_budgets.py
+
+When an endpoint legitimately needs more queries, raise its budget in
+BUDGETS in the same change.
+"""
+import os
+import sys
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+
+import httpx
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.db.storage import storage
+from app.db.query_budget import query_budget, QueryBudgetExceeded
+from app.db.schema import MESSAGE_BUCKETING
+from app.db.paging import encode_sync_cursor
+from app.models.message_buckets import known_buckets
+from app.models.unread import unread_tracker
+from app.models.cassandra_models import (
+    user_lookup_cache, conversation_lookup_cache, participants_cache, summary_cache, last_message_cache
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEED_STATEMENTS = {
+    "budget_insert_user_details": """
+        INSERT INTO user_details (user_id, user_index, username, full_name, email)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    "budget_insert_user_index": """
+        INSERT INTO users_by_index (user_index, user_id)
+        VALUES (?, ?)
+    """,
+}
+
+# Users 0..NUM_USERS-1; user 0 has a conversation with every other user
+NUM_USERS = 6
+MESSAGES_PER_CONVERSATION = 3
+# Reading the bucket list of a day-bucketed conversation is one extra round trip
+BUCKET_WALK = 1 if MESSAGE_BUCKETING == "day" else 0
+
+# (name, method, path, request kwargs, max storage round trips with cold caches).
+# None grows with NUM_USERS, so a lookup per listed item fails the check.
+BUDGETS = [
+    ("send_message", "POST", "/api/messages/",
+     {"json": {"sender_id": 0, "receiver_id": 1, "content": "budget"}}, 8 + 2 * BUCKET_WALK),
+    ("get_conversation_messages", "GET", "/api/messages/conversation/1",
+     {"params": {"limit": 20}}, 3 + BUCKET_WALK),
+    ("get_messages_before_timestamp", "GET", "/api/messages/conversation/1/before",
+     {"params": {"before_timestamp": "2100-01-01T00:00:00", "limit": 20}}, 3 + BUCKET_WALK),
+    ("get_user_conversations", "GET", "/api/conversations/user/0",
+     {"params": {"limit": 20}}, 5),
+    ("get_conversation", "GET", "/api/conversations/1", {}, 1),
+    ("mark_conversation_read", "POST", "/api/conversations/1/read", {"params": {"user_id": 1}}, 4),
+    # Constant up to SYNC_READ_BATCH changed conversations, which are read together
+    ("sync_messages", "GET", "/api/sync/0",
+     {"params": {"since": encode_sync_cursor(datetime(2000, 1, 1))}}, 5 + BUCKET_WALK),
+    # A cursor whose re-read window covers every message: the conversations are read twice
+    ("sync_messages_overlap", "GET", "/api/sync/0",
+     {"params": {"since": encode_sync_cursor(datetime(2100, 1, 1), datetime(2000, 1, 1))}},
+     6 + 2 * BUCKET_WALK),
+]
+
+
+def clear_caches():
+    for cache in (
+        user_lookup_cache, conversation_lookup_cache, participants_cache, summary_cache, last_message_cache,
+        known_buckets
+    ):
+        cache.clear()
+
+
+async def seed(client):
+    storage.register_statements(SEED_STATEMENTS)
+    for i in range(NUM_USERS):
+        user_id = uuid.uuid4()
+        await storage.execute_prepared_aio(
+            "budget_insert_user_details",
+            (user_id, i, f"user{i+1}", f"Test User {i+1}", f"user{i+1}@example.com")
+        )
+        await storage.execute_prepared_aio("budget_insert_user_index", (i, user_id))
+
+    for receiver in range(1, NUM_USERS):
+        for j in range(MESSAGES_PER_CONVERSATION):
+            response = await client.post(
+                "/api/messages/",
+                json={"sender_id": 0, "receiver_id": receiver, "content": f"seed {j}"}
+            )
+            response.raise_for_status()
+    # Write the accumulated unread increments, as the flush task would
+    await unread_tracker.flush()
+
+
+async def main_async():
+    failures = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://budget") as client:
+        await seed(client)
+
+        for name, method, path, kwargs, max_queries in BUDGETS:
+            clear_caches()
+            try:
+                with query_budget(max_queries) as stats:
+                    response = await client.request(method, path, **kwargs)
+                response.raise_for_status()
+                logger.info(f"{name:<30} {stats.queries:>3} / {max_queries} queries  ok")
+            except QueryBudgetExceeded as e:
+                failures += 1
+                logger.error(f"{name:<30} over budget: {e}")
+            except httpx.HTTPStatusError as e:
+                failures += 1
+                logger.error(f"{name:<30} failed: {e}")
+    return failures
+
+
+def main():
+    failures = asyncio.run(main_async())
+    if failures:
+        logger.error(f"{failures} endpoint(s) failed their query budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
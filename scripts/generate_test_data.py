@@ -1,13 +1,28 @@
 """
 Script to generate test data for the Messenger application.
-This script is a skeleton for students to implement.
+
+Scale is configurable from the command line, so the same script seeds a
+development keyspace (the defaults) or generates millions of messages for
+capacity testing, e.g.:
+
+    python scripts/generate_test_data.py --users 100000 --conversations 500000 \\
+        --messages zipf:1.3:1:20000 --days 365 --processes 8
 """
 import os
+import sys
+import time
 import uuid
 import logging
 import random
+import argparse
+import multiprocessing
 from datetime import datetime, timedelta
 from cassandra.cluster import Cluster
+from cassandra.concurrent import execute_concurrent_with_args
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.schema import MESSAGE_BUCKETING, day_bucket
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,11 +32,151 @@ CASSANDRA_HOST = os.getenv("CASSANDRA_HOST", "localhost")
 CASSANDRA_PORT = int(os.getenv("CASSANDRA_PORT", "9042"))
 CASSANDRA_KEYSPACE = os.getenv("CASSANDRA_KEYSPACE", "messenger")
 
-# Test data configuration
+# Test data configuration (defaults for the command-line flags)
 NUM_USERS = 10  # Number of users to create
 NUM_CONVERSATIONS = 15  # Number of conversations to create
 MAX_MESSAGES_PER_CONVERSATION = 50  # Maximum number of messages per conversation
 
+FLUSH_ROWS = 5000  # Rows buffered per statement before they are written
+PROGRESS_INTERVAL = 5.0  # Seconds between progress log lines
+
+STATEMENTS = {
+    "user_details": """
+        INSERT INTO user_details (user_id, user_index, username, full_name, email)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    "users_by_index": """
+        INSERT INTO users_by_index (user_index, user_id)
+        VALUES (?, ?)
+    """,
+    "conversation_participants": """
+        INSERT INTO conversation_participants (conversation_id, user_id, joined_at)
+        VALUES (?, ?, ?)
+    """,
+    "conversation_metadata": """
+        INSERT INTO conversation_metadata (conversation_id, conversation_index)
+        VALUES (?, ?)
+    """,
+    "conversations_by_index": """
+        INSERT INTO conversations_by_index (conversation_index, conversation_id)
+        VALUES (?, ?)
+    """,
+    "conversations_by_participants": """
+        INSERT INTO conversations_by_participants (participants, conversation_id, conversation_index)
+        VALUES (?, ?, ?)
+    """,
+    "index_allocators": """
+        INSERT INTO index_allocators (name, next_index)
+        VALUES (?, ?)
+    """,
+    "messages_by_conversation": """
+        INSERT INTO messages_by_conversation (
+            conversation_id, timestamp, message_id, sender_id, receiver_id, content
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    "conversation_summary_by_index": """
+        INSERT INTO conversation_summary_by_index (
+            conversation_index, conversation_id, participant_indexes, last_message, last_message_at
+        ) VALUES (?, ?, ?, ?, ?)
+    """,
+    "conversations_by_user": """
+        INSERT INTO conversations_by_user (
+            user_id, conversation_id, last_updated_at, last_message, other_participants
+        ) VALUES (?, ?, ?, ?, ?)
+    """,
+}
+
+# With MESSAGE_BUCKETING=day messages go to the day-bucketed tables instead
+if MESSAGE_BUCKETING == "day":
+    del STATEMENTS["messages_by_conversation"]
+    STATEMENTS["messages_by_conversation_bucket"] = """
+        INSERT INTO messages_by_conversation_bucket (
+            conversation_id, day_bucket, timestamp, message_id, sender_id, receiver_id, content
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    STATEMENTS["message_buckets_by_conversation"] = """
+        INSERT INTO message_buckets_by_conversation (conversation_id, day_bucket)
+        VALUES (?, ?)
+    """
+
+
+def parse_distribution(spec):
+    """
+    Parse a message-count distribution and return a sampler(rng) -> int.
+
+    Formats:
+        uniform:MIN:MAX          every count in [MIN, MAX] equally likely
+        zipf:ALPHA:MIN:MAX       heavy tail: most conversations short, a few huge
+        fixed:N                  exactly N messages per conversation
+    """
+    kind, *args = spec.split(":")
+    try:
+        if kind == "uniform":
+            low, high = int(args[0]), int(args[1])
+            return lambda rng: rng.randint(low, high)
+        if kind == "zipf":
+            alpha, low, high = float(args[0]), int(args[1]), int(args[2])
+            # Pareto draw scaled to MIN and clamped to MAX
+            return lambda rng: min(high, int(low * rng.paretovariate(alpha)))
+        if kind == "fixed":
+            count = int(args[0])
+            return lambda rng: count
+    except (IndexError, ValueError):
+        pass
+    raise argparse.ArgumentTypeError(f"Invalid message distribution: {spec!r}")
+
+
+class Progress:
+    """Counts written rows and periodically logs throughput."""
+
+    def __init__(self, label):
+        self.label = label
+        self.rows = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def add(self, rows):
+        self.rows += rows
+        now = time.perf_counter()
+        if now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        rate = self.rows / elapsed if elapsed else 0.0
+        logger.info(f"[{self.label}] {self.rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
+
+class Writer:
+    """Buffers rows per prepared statement and writes them with bounded concurrency."""
+
+    def __init__(self, session, concurrency, progress):
+        self.session = session
+        self.concurrency = concurrency
+        self.progress = progress
+        self.prepared = {name: session.prepare(query) for name, query in STATEMENTS.items()}
+        self.buffers = {name: [] for name in STATEMENTS}
+
+    def add(self, table, params):
+        buffer = self.buffers[table]
+        buffer.append(params)
+        if len(buffer) >= FLUSH_ROWS:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in [table] if table else list(self.buffers):
+            rows = self.buffers[name]
+            if not rows:
+                continue
+            execute_concurrent_with_args(
+                self.session, self.prepared[name], rows,
+                concurrency=self.concurrency, raise_on_first_error=True
+            )
+            self.progress.add(len(rows))
+            self.buffers[name] = []
+
+
 def connect_to_cassandra():
     """Connect to Cassandra cluster."""
     logger.info("Connecting to Cassandra...")
@@ -34,106 +189,183 @@ def connect_to_cassandra():
         logger.error(f"Failed to connect to Cassandra: {str(e)}")
         raise
 
-def generate_test_data(session):
-    """
-    Generate test data in Cassandra.
-    
-    Students should implement this function to generate test data based on their schema design.
-    The function should create:
-    - Users (with IDs 1-NUM_USERS)
-    - Conversations between random pairs of users
-    - Messages in each conversation with realistic timestamps
-    """
-    logger.info("Generating test data...")
-    
+
+def generate_users(session, args):
+    """Create users with indexes 0..users-1 and return their UUIDs in index order."""
+    progress = Progress("users")
+    writer = Writer(session, args.concurrency, progress)
+
     user_ids = []
-    for i in range(NUM_USERS):
+    for i in range(args.users):
         user_id = uuid.uuid4()
         user_ids.append(user_id)
-        session.execute(
-            """
-            INSERT INTO user_details (user_id, user_index,username, full_name, email)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (user_id, i,f"user{i+1}", f"Test User {i+1}", f"user{i+1}@example.com")
-        )
-    logger.info(f"Created {NUM_USERS} users.")
-    for index, user_id in enumerate(user_ids):
-        logger.info(f"USER_INDEX_MAP[{index}] = uuid.UUID('{user_id}')")
+        writer.add("user_details", (user_id, i, f"user{i+1}", f"Test User {i+1}", f"user{i+1}@example.com"))
+        writer.add("users_by_index", (i, user_id))
+    writer.flush()
+    progress.report()
 
-    for i in range(NUM_CONVERSATIONS):
-        participants = random.sample(user_ids, random.randint(2, 4))
-        conversation_id = uuid.uuid4()
-        logger.info(f"Creating conversation {i+1} with ID {conversation_id} and {len(participants)} participants")
+    logger.info(f"Created {args.users} users.")
+    if args.users <= 20:
+        for index, user_id in enumerate(user_ids):
+            logger.info(f"USER_INDEX_MAP[{index}] = uuid.UUID('{user_id}')")
+    return user_ids
 
-        for user_id in participants:
-            session.execute(
-                """
-                INSERT INTO conversation_participants (conversation_id, user_id, joined_at)
-                VALUES (%s, %s, %s)
-                """,
-                (conversation_id, user_id, datetime.utcnow())
-            )
 
-        session.execute(
-            """
-            INSERT INTO conversation_metadata (conversation_id, conversation_index)
-            VALUES (%s, %s)
-            """,
-            (conversation_id, i + 1)
-        )
+def generate_conversations(session, args, user_ids, first_index, last_index, label):
+    """
+    Create conversations with indexes first_index..last_index (inclusive),
+    each with its messages and inbox rows.
 
+    Returns:
+        Number of rows written
+    """
+    rng = random.Random(f"{args.seed}:{first_index}")
+    sample_messages = parse_distribution(args.messages)
+    progress = Progress(label)
+    writer = Writer(session, args.concurrency, progress)
+    now = datetime.utcnow()
+    span_seconds = args.days * 86400
+    user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+
+    for index in range(first_index, last_index + 1):
+        participants = rng.sample(user_ids, rng.randint(2, min(4, len(user_ids))))
+        conversation_id = uuid.uuid4()
+        # Per-sender receiver choices, computed once per conversation
+        others_of = {u: [o for o in participants if o != u] for u in participants}
 
-        num_messages = random.randint(5, MAX_MESSAGES_PER_CONVERSATION)
-        timestamp = datetime.utcnow()
-        messages = []
+        joined_at = datetime.utcnow()
+        for user_id in participants:
+            writer.add("conversation_participants", (conversation_id, user_id, joined_at))
+        writer.add("conversation_metadata", (conversation_id, index))
+        writer.add("conversations_by_index", (index, conversation_id))
+        writer.add("conversations_by_participants", (sorted(participants), conversation_id, index))
+
+        num_messages = max(1, sample_messages(rng))
+        # Messages are spread evenly from a random start inside the time span
+        start = now - timedelta(seconds=rng.uniform(0, span_seconds))
+        step = (now - start).total_seconds() / num_messages
+        buckets = set()
 
         for j in range(num_messages):
-            sender = random.choice(participants)
-            receiver = random.choice([u for u in participants if u != sender])
-            content = f"Message {j+1} in convo {i+1}"
-            message_id = uuid.uuid4()
-            timestamp = timestamp + timedelta(seconds=random.randint(10, 60))
-
-            session.execute(
-                """
-                INSERT INTO messages_by_conversation (
-                    conversation_id, timestamp, message_id, sender_id, receiver_id, content
-                ) VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (conversation_id, timestamp, message_id, sender, receiver, content)
-            )
+            sender = rng.choice(participants)
+            receiver = rng.choice(others_of[sender])
+            content = f"Message {j+1} in convo {index}"
+            timestamp = start + timedelta(seconds=step * (j + rng.random()))
+            if MESSAGE_BUCKETING == "day":
+                bucket = day_bucket(timestamp)
+                writer.add(
+                    "messages_by_conversation_bucket",
+                    (conversation_id, bucket, timestamp, uuid.uuid4(), sender, receiver, content)
+                )
+                buckets.add(bucket)
+            else:
+                writer.add(
+                    "messages_by_conversation",
+                    (conversation_id, timestamp, uuid.uuid4(), sender, receiver, content)
+                )
 
-            messages.append((sender, content, timestamp))
+        for bucket in buckets:
+            writer.add("message_buckets_by_conversation", (conversation_id, bucket))
 
-        last_sender, last_content, last_timestamp = messages[-1]
         for user_id in participants:
-            others = set(participants)
-            others.discard(user_id)
-            session.execute(
-                """
-                INSERT INTO conversations_by_user (
-                    user_id, conversation_id, last_updated_at, last_message, other_participants
-                ) VALUES (%s, %s, %s, %s, %s)
-                """,
-                (user_id, conversation_id,last_timestamp, last_content, others)
+            writer.add(
+                "conversations_by_user",
+                (user_id, conversation_id, timestamp, content, set(others_of[user_id]))
             )
-    
-    logger.info(f"Generated {NUM_CONVERSATIONS} conversations with messages")
-    logger.info(f"User IDs range from 1 to {NUM_USERS}")
+        writer.add(
+            "conversation_summary_by_index",
+            (index, conversation_id, [user_index[u] for u in sorted(participants)], content, timestamp)
+        )
+
+    writer.flush()
+    progress.report()
+    return progress.rows
+
+
+def _generate_shard(shard_args):
+    """Worker entry point: one process, its own cluster connection, one index range."""
+    args, user_ids, first_index, last_index, shard = shard_args
+    cluster, session = connect_to_cassandra()
+    try:
+        return generate_conversations(session, args, user_ids, first_index, last_index, f"shard {shard}")
+    finally:
+        cluster.shutdown()
+
+
+def generate_test_data(session, args):
+    """
+    Generate test data in Cassandra.
+
+    Creates users (indexes 0..users-1), conversations (indexes 1..conversations)
+    between random groups of 2-4 users, and messages in each conversation with
+    timestamps inside the configured time span.
+    """
+    logger.info("Generating test data...")
+    start = time.perf_counter()
+
+    user_ids = generate_users(session, args)
+
+    processes = max(1, min(args.processes, args.conversations))
+    if processes == 1:
+        rows = generate_conversations(session, args, user_ids, 1, args.conversations, "conversations")
+    else:
+        per_shard = -(-args.conversations // processes)
+        shards = []
+        for shard in range(processes):
+            first = shard * per_shard + 1
+            last = min(args.conversations, first + per_shard - 1)
+            if first <= last:
+                shards.append((args, user_ids, first, last, shard))
+        with multiprocessing.Pool(len(shards)) as pool:
+            rows = sum(pool.map(_generate_shard, shards))
+
+    # Conversations created through the API continue after the generated ones
+    session.execute(
+        session.prepare(STATEMENTS["index_allocators"]), ("conversation", args.conversations + 1)
+    )
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Generated {args.conversations} conversations with messages: "
+        f"{rows:,} conversation rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)"
+    )
+    logger.info(f"User IDs range from 0 to {args.users - 1}")
     logger.info("Use these IDs for testing the API endpoints")
 
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Messenger test data")
+    parser.add_argument("--users", type=int, default=NUM_USERS, help="Number of users")
+    parser.add_argument("--conversations", type=int, default=NUM_CONVERSATIONS, help="Number of conversations")
+    parser.add_argument(
+        "--messages", default=f"uniform:5:{MAX_MESSAGES_PER_CONVERSATION}",
+        help="Messages per conversation: uniform:MIN:MAX, zipf:ALPHA:MIN:MAX or fixed:N"
+    )
+    parser.add_argument("--days", type=float, default=1.0, help="Time span messages are spread over, in days")
+    parser.add_argument("--concurrency", type=int, default=100, help="In-flight writes per process")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to shard conversations across")
+    parser.add_argument("--seed", default=None, help="Random seed for reproducible data")
+    args = parser.parse_args(argv)
+    if args.users < 2:
+        parser.error("--users must be at least 2")
+    parse_distribution(args.messages)
+    if args.seed is None:
+        args.seed = random.randrange(2 ** 32)
+    return args
+
+
 def main():
     """Main function to generate test data."""
+    args = parse_args()
     cluster = None
-    
+
     try:
         # Connect to Cassandra
         cluster, session = connect_to_cassandra()
-        
+
         # Generate test data
-        generate_test_data(session)
-        
+        generate_test_data(session, args)
+
         logger.info("Test data generation completed successfully!")
     except Exception as e:
         logger.error(f"Error generating test data: {str(e)}")
@@ -143,4 +375,4 @@ def main():
             logger.info("Cassandra connection closed")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
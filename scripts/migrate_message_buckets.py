@@ -0,0 +1,126 @@
+"""
+Copy messages from messages_by_conversation into the day-bucketed layout
+(messages_by_conversation_bucket and message_buckets_by_conversation).
+
+Safe to re-run: every row is a plain upsert keyed by its primary key. To
+switch a live deployment, run this once, restart the API with
+MESSAGE_BUCKETING=day, then run it again to copy messages written in between.
+Run MESSAGE_BUCKETING=day scripts/setup_db.py first so the tables exist.
+
+A scan interrupted part way can be continued from the paging state logged
+after each page:
+
+    python scripts/migrate_message_buckets.py --resume <hex paging state>
+"""
+import os
+import sys
+import logging
+import argparse
+from cassandra.cluster import Cluster
+from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.query import SimpleStatement, dict_factory
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.schema import day_bucket
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cassandra connection settings
+CASSANDRA_HOST = os.getenv("CASSANDRA_HOST", "localhost")
+CASSANDRA_KEYSPACE = os.getenv("CASSANDRA_KEYSPACE", "messenger")
+
+PAGE_SIZE = 1000  # Rows read per page of the source table scan
+CONCURRENCY = 100  # In-flight bucket-table writes
+
+SOURCE_QUERY = """
+    SELECT conversation_id, timestamp, message_id, sender_id, receiver_id, content
+    FROM messages_by_conversation
+"""
+INSERT_MESSAGE = """
+    INSERT INTO messages_by_conversation_bucket (
+        conversation_id, day_bucket, timestamp, message_id, sender_id, receiver_id, content
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+INSERT_BUCKET = """
+    INSERT INTO message_buckets_by_conversation (conversation_id, day_bucket)
+    VALUES (?, ?)
+"""
+
+
+def migrate(session, page_size, concurrency, paging_state=None):
+    """
+    Re-bucket every message, one page of the source scan at a time.
+
+    Buckets are recorded before their messages, so a reader switched to the
+    bucketed layout never misses a copied message.
+
+    Returns:
+        (messages written, bucket index rows written)
+    """
+    insert_message = session.prepare(INSERT_MESSAGE)
+    insert_bucket = session.prepare(INSERT_BUCKET)
+    rows = session.execute(SimpleStatement(SOURCE_QUERY, fetch_size=page_size), paging_state=paging_state)
+
+    messages = buckets = 0
+    while True:
+        page = [
+            (
+                row["conversation_id"], day_bucket(row["timestamp"]), row["timestamp"],
+                row["message_id"], row["sender_id"], row["receiver_id"], row["content"]
+            )
+            for row in rows.current_rows
+        ]
+        # Each bucket is written once per page, not once per message
+        page_buckets = sorted({(params[0], params[1]) for params in page})
+        execute_concurrent_with_args(
+            session, insert_bucket, page_buckets, concurrency=concurrency, raise_on_first_error=True
+        )
+        execute_concurrent_with_args(
+            session, insert_message, page, concurrency=concurrency, raise_on_first_error=True
+        )
+        messages += len(page)
+        buckets += len(page_buckets)
+
+        if not rows.has_more_pages:
+            break
+        logger.info(f"Copied {messages} messages; resume from {rows.paging_state.hex()}")
+        rows.fetch_next_page()
+
+    return messages, buckets
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="rows read per page of the scan")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="in-flight writes")
+    parser.add_argument("--resume", help="hex paging state logged by an interrupted run")
+    return parser.parse_args(argv)
+
+
+def main():
+    """Re-bucket all messages."""
+    args = parse_args()
+    cluster = None
+
+    try:
+        cluster = Cluster([CASSANDRA_HOST])
+        session = cluster.connect(CASSANDRA_KEYSPACE)
+        session.row_factory = dict_factory
+
+        messages, buckets = migrate(
+            session, args.page_size, args.concurrency,
+            bytes.fromhex(args.resume) if args.resume else None
+        )
+        logger.info(f"Migrated {messages} messages with {buckets} bucket index writes")
+    except Exception as e:
+        logger.error(f"Migration failed: {str(e)}")
+        raise
+    finally:
+        if cluster:
+            cluster.shutdown()
+
+
+if __name__ == "__main__":
+    main()
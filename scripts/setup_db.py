@@ -2,11 +2,17 @@
 Script to initialize Cassandra keyspace and tables for the Messenger application.
 """
 import os
+import sys
 import time
 import logging
 from cassandra.cluster import Cluster
+from cassandra import InvalidRequest
 from cassandra.auth import PlainTextAuthProvider
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.schema import TABLES, ADDED_COLUMNS, BUCKETED_MESSAGE_TABLES, MESSAGE_BUCKETING
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -56,68 +62,22 @@ def create_tables(session):
     """
     logger.info("Creating tables...")
     
-    session.execute("""
-        CREATE TABLE IF NOT EXISTS messages_by_conversation (
-            conversation_id UUID,
-            timestamp TIMESTAMP,
-            message_id UUID,
-            sender_id UUID,
-            receiver_id UUID,
-            content TEXT,
-            PRIMARY KEY ((conversation_id), timestamp, message_id)
-        ) WITH CLUSTERING ORDER BY (timestamp DESC, message_id ASC);
-    """)
-
-    session.execute("""
-        CREATE TABLE IF NOT EXISTS conversations_by_user (
-            user_id UUID,
-            conversation_id UUID,
-            last_updated_at TIMESTAMP,
-            last_message TEXT,
-            other_participants SET<UUID>,
-            PRIMARY KEY ((user_id), last_updated_at, conversation_id)
-        ) WITH CLUSTERING ORDER BY (last_updated_at DESC, conversation_id ASC);
-    """)
-
-    session.execute("""
-        CREATE TABLE IF NOT EXISTS conversation_participants (
-            conversation_id UUID,
-            user_id UUID,
-            joined_at TIMESTAMP,
-            PRIMARY KEY ((conversation_id), user_id)
-        );
-    """)
+    for table in TABLES:
+        session.execute(table)
 
-    session.execute("""
-        CREATE TABLE IF NOT EXISTS user_details (
-            user_id UUID,
-            user_index INT,
-            username TEXT,
-            full_name TEXT,
-            email TEXT,
-            PRIMARY KEY (user_id)
-        );
-    """)
+    for statement in ADDED_COLUMNS:
+        try:
+            session.execute(statement)
+        except InvalidRequest:
+            # The table already has the column
+            pass
 
-    session.execute("""
-       CREATE TABLE IF NOT EXISTS conversation_metadata (
-            conversation_id UUID,
-            conversation_index INT,
-            PRIMARY KEY (conversation_id)
-        );       
-    """)
-    
-    session.execute("""
-        CREATE INDEX IF NOT EXISTS idx_conversation_index 
-        ON conversation_metadata (conversation_index);
-    """)
-    
-    session.execute("""
-        CREATE INDEX IF NOT EXISTS idx_user_index 
-        ON user_details (user_index);
-    """)
+    if MESSAGE_BUCKETING == "day":
+        logger.info("Creating day-bucketed message tables...")
+        for table in BUCKETED_MESSAGE_TABLES:
+            session.execute(table)
     
-    logger.info("Tables and indexes created successfully.")
+    logger.info("Tables created successfully.")
 
 def main():
     """Initialize the database."""
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests run against the in-memory storage backend; it must be chosen before app.db.storage is imported
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+"""
+get_messages_before_timestamp must read a bounded slice of the partition,
+however much history lies before the requested timestamp.
+"""
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.storage import storage
+from app.db.schema import MESSAGE_BUCKETING
+from app.models.cassandra_models import MessageModel
+
+PARTITION_ROWS = 100_000
+LIMIT = 20
+START = datetime(2024, 1, 1)
+
+pytestmark = pytest.mark.skipif(
+    storage.name != "memory" or MESSAGE_BUCKETING != "none",
+    reason="counts rows read by the in-memory backend in the default message layout"
+)
+
+
+@pytest.fixture(scope="module")
+def conversation_id():
+    """One conversation with PARTITION_ROWS messages, one second apart."""
+    conversation_id = uuid.uuid4()
+    sender, receiver = uuid.uuid4(), uuid.uuid4()
+    params = [
+        (conversation_id, START + timedelta(seconds=i), uuid.uuid4(), sender, receiver, f"Message {i}")
+        for i in range(PARTITION_ROWS)
+    ]
+    results = storage.execute_concurrent_prepared("insert_message", params)
+    assert all(success for success, _ in results)
+    return conversation_id
+
+
+def read_before(conversation_id, before, cursor=None):
+    """One call, with the rows the backend read to answer it."""
+    rows_read = storage.rows_read
+    rows, next_cursor = asyncio.run(MessageModel.get_messages_before_timestamp(
+        conversation_id, before, limit=LIMIT, cursor=cursor
+    ))
+    return rows, next_cursor, storage.rows_read - rows_read
+
+
+@pytest.mark.parametrize("older_rows", [LIMIT, 1_000, 50_000, PARTITION_ROWS - 1])
+def test_rows_read_do_not_depend_on_history(conversation_id, older_rows):
+    before = START + timedelta(seconds=older_rows)
+
+    rows, next_cursor, rows_read = read_before(conversation_id, before)
+
+    assert [row["timestamp"] for row in rows] == [
+        before - timedelta(seconds=i) for i in range(1, LIMIT + 1)
+    ]
+    # The page plus the one row that shows another page follows
+    assert rows_read <= LIMIT + 1
+    assert (next_cursor is not None) == (older_rows > LIMIT)
+
+
+def test_cursor_pages_stay_bounded(conversation_id):
+    before = START + timedelta(seconds=PARTITION_ROWS // 2)
+    cursor, seen = None, []
+    for _ in range(5):
+        rows, cursor, rows_read = read_before(conversation_id, before, cursor)
+        assert len(rows) == LIMIT
+        assert rows_read <= LIMIT + 1
+        seen.extend(row["timestamp"] for row in rows)
+
+    assert seen == [before - timedelta(seconds=i) for i in range(1, 5 * LIMIT + 1)]
+
+
+def test_oldest_page_ends_the_walk(conversation_id):
+    rows, next_cursor, rows_read = read_before(conversation_id, START + timedelta(seconds=5))
+
+    assert len(rows) == 5
+    assert next_cursor is None
+    assert rows_read <= 5
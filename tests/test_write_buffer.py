@@ -0,0 +1,39 @@
+"""
+With WRITE_BUFFER=1, concurrent sends to one conversation must share
+group commits rather than reach the buffer one at a time.
+"""
+import uuid
+import asyncio
+
+from app.models import cassandra_models
+from app.models.cassandra_models import ConversationModel
+from app.models.send_pipeline import send_pipeline
+from app.models.write_buffer import MessageWriteBuffer
+
+SENDS = 200
+
+
+def test_burst_to_one_conversation_shares_batches(monkeypatch):
+    buffer = MessageWriteBuffer()
+    monkeypatch.setattr(cassandra_models, "WRITE_BUFFER", True)
+    monkeypatch.setattr(cassandra_models, "message_write_buffer", buffer)
+    sender, receiver = uuid.uuid4(), uuid.uuid4()
+
+    async def burst():
+        conversation_id = await ConversationModel.create_or_get_conversation([sender, receiver])
+        await asyncio.gather(*(
+            send_pipeline.send(
+                conversation_id, sender, receiver, sorted([sender, receiver]), f"Message {i}", 1, [1, 2]
+            )
+            for i in range(SENDS)
+        ))
+        await buffer.close()
+        return conversation_id
+
+    conversation_id = asyncio.run(burst())
+
+    assert buffer.batch_size.sum == SENDS
+    assert buffer.batch_size.sum / buffer.batch_size.count > 1
+    inbox = asyncio.run(ConversationModel.get_user_conversations(receiver))
+    assert [row["conversation_id"] for row in inbox] == [conversation_id]
+    assert inbox[0]["last_message"] == f"Message {SENDS - 1}"